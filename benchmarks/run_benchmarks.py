@@ -0,0 +1,301 @@
+"""Pathfinding benchmarks with machine-readable results and a regression check.
+
+    python benchmarks/run_benchmarks.py --output baseline.json
+    python benchmarks/run_benchmarks.py --quick --compare baseline.json
+    python benchmarks/run_benchmarks.py --only simulate --huge
+
+Every benchmark is seeded, so runs of the same suite do the same work and
+their timings can be compared. ``--compare`` matches results by name and
+exits with status 1 when a primary metric got worse by more than
+``--threshold``. The 10,000 agent simulate case takes minutes and only
+runs with ``--huge``.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import advanced_pathfinding  # noqa: E402
+from advanced_pathfinding import AdvancedPathPlanner  # noqa: E402
+import scenarios  # noqa: E402
+
+RESULTS_FORMAT = "advanced-pathfinding-benchmarks"
+RESULTS_VERSION = 1
+DEFAULT_SEED = 7
+DEFAULT_THRESHOLD = 0.2
+
+# Parameters of each benchmark for the full suite and for --quick
+SUITES = {
+    "full": {
+        "find_path": {"sizes": [50, 200, 500, 1000, 2000], "terrains": list(scenarios.TERRAIN_MIXES),
+                      "queries": 10},
+        "replan_storm": {"obstacles": [0, 20, 100], "vehicles": 100, "ticks": 200},
+        "simulate": {"agents": [10, 100, 1000], "ticks": 100, "emergency_ticks": 600},
+        "export": {"frames": 100, "agents": 100, "formats": ["gif", "raw"]},
+    },
+    "quick": {
+        "find_path": {"sizes": [50, 200], "terrains": list(scenarios.TERRAIN_MIXES), "queries": 10},
+        "replan_storm": {"obstacles": [0, 50], "vehicles": 40, "ticks": 100},
+        "simulate": {"agents": [10, 100, 1000], "ticks": 50, "emergency_ticks": 100},
+        "export": {"frames": 20, "agents": 40, "formats": ["gif", "raw"]},
+    },
+}
+# Fleet sizes added to the simulate benchmark by --huge
+HUGE_AGENTS = [10000]
+# Tiny runs of each benchmark that load its compiled kernels and lazy imports before timing
+WARMUP = {
+    "find_path": {"sizes": [50], "terrains": ["generated"], "queries": 2},
+    "replan_storm": {"obstacles": [5], "vehicles": 5, "ticks": 5},
+    "simulate": {"agents": [10], "ticks": 10, "emergency_ticks": 10},
+    "export": {"frames": 3, "agents": 5, "formats": ["gif", "raw"]},
+}
+
+
+def result(benchmark: str, params: Dict, metrics: Dict, primary: str,
+           higher_is_better: bool = False) -> Dict:
+    name = benchmark + "[" + ",".join(f"{key}={value}" for key, value in params.items()) + "]"
+    return {"name": name, "benchmark": benchmark, "params": params, "metrics": metrics,
+            "primary": primary, "higher_is_better": higher_is_better}
+
+
+def timing_metrics(samples: List[float], prefix: str = "") -> Dict[str, float]:
+    """Mean, median, p95 and max of ``samples`` seconds, in milliseconds"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    if len(ms) == 0:
+        return {}
+    return {
+        f"{prefix}mean_ms": float(ms.mean()),
+        f"{prefix}p50_ms": float(np.percentile(ms, 50)),
+        f"{prefix}p95_ms": float(np.percentile(ms, 95)),
+        f"{prefix}max_ms": float(ms.max()),
+    }
+
+
+async def bench_find_path(config: Dict, seed: int) -> List[Dict]:
+    """Long queries across map sizes and terrain mixes; the first query pays for setup"""
+    results = []
+    for size in config["sizes"]:
+        for terrain in config["terrains"]:
+            planner = AdvancedPathPlanner((size, size), seed=seed, headless=True)
+            scenarios.apply_terrain(planner, terrain, seed)
+            max_cost = 5 if terrain == "walls" else 20
+            constraints = {"max_cost": max_cost}
+            queries = scenarios.path_queries(planner, config["queries"] + 1, seed, max_cost)
+            samples, lengths, found = [], [], 0
+            for start, goal in queries:
+                began = time.perf_counter()
+                path = await planner.find_path(start, goal, constraints)
+                samples.append(time.perf_counter() - began)
+                if path:
+                    found += 1
+                    lengths.append(len(path))
+            metrics = {"cold_ms": samples[0] * 1000, **timing_metrics(samples[1:]),
+                       "queries": len(samples) - 1, "found": found,
+                       "mean_path_length": float(np.mean(lengths)) if lengths else 0.0}
+            planner.close()
+            results.append(result("find_path", {"size": size, "terrain": terrain}, metrics, "mean_ms"))
+    return results
+
+
+async def bench_replan_storm(config: Dict, seed: int) -> List[Dict]:
+    """Rush hour traffic with obstacles drifting through it; measures whole update() ticks"""
+    results = []
+    for count in config["obstacles"]:
+        planner = AdvancedPathPlanner(scenarios.DENSE_TRAFFIC_SIZE, seed=seed, headless=True)
+        for obstacle in scenarios.construction_sites():
+            planner.add_dynamic_obstacle(obstacle)
+        await scenarios.route(planner, scenarios.rush_hour_vehicles(config["vehicles"], seed))
+        for obstacle in scenarios.storm_obstacles(count, planner.grid_size, seed):
+            planner.add_dynamic_obstacle(obstacle)
+
+        versions = planner.fleet.path_version.sum()
+        samples = []
+        for _ in range(config["ticks"]):
+            began = time.perf_counter()
+            await planner.update(0.1)
+            samples.append(time.perf_counter() - began)
+        metrics = {**timing_metrics(samples, "tick_"), "ticks": len(samples),
+                   "path_updates": int(planner.fleet.path_version.sum() - versions)}
+        planner.close()
+        results.append(result("replan_storm", {"vehicles": config["vehicles"], "obstacles": count},
+                              metrics, "tick_mean_ms"))
+    return results
+
+
+async def bench_simulate(config: Dict, seed: int) -> List[Dict]:
+    """simulate() throughput for rush hour fleets of growing size and the emergency example"""
+    results = []
+    ticks = config["ticks"]
+    for count in config["agents"]:
+        # Stretch the map so each 80x80 block of it holds at most about 400 commuters
+        scale = max(1, int(np.ceil(np.sqrt(count / 400))))
+        size = scenarios.DENSE_TRAFFIC_SIZE
+        planner = AdvancedPathPlanner((size[0] * scale, size[1] * scale), seed=seed, headless=True)
+        for obstacle in scenarios.construction_sites(scale):
+            planner.add_dynamic_obstacle(obstacle)
+        began = time.perf_counter()
+        routed = await scenarios.route(planner, scenarios.rush_hour_vehicles(count, seed, scale))
+        setup = time.perf_counter() - began
+        metrics = await _simulate_metrics(planner, ticks)
+        metrics.update({"routed": routed, "setup_s": setup, "grid": planner.grid_size[0]})
+        planner.close()
+        results.append(result("simulate", {"scenario": "rush_hour", "agents": count},
+                              metrics, "ticks_per_s", higher_is_better=True))
+
+    planner = await scenarios.emergency_scenario(seed)
+    metrics = await _simulate_metrics(planner, config["emergency_ticks"])
+    planner.close()
+    results.append(result("simulate", {"scenario": "emergency", "agents": len(planner.agents)},
+                          metrics, "ticks_per_s", higher_is_better=True))
+    return results
+
+
+async def _simulate_metrics(planner: AdvancedPathPlanner, ticks: int) -> Dict:
+    dt = 0.1
+    began = time.perf_counter()
+    frames = await planner.simulate(duration=ticks * dt + dt / 2, dt=dt)
+    elapsed = time.perf_counter() - began
+    finished = sum(agent.status == "finished" for agent in planner.agents.values())
+    return {"ticks": len(frames), "elapsed_s": elapsed, "ticks_per_s": len(frames) / elapsed,
+            "finished": finished}
+
+
+async def bench_export(config: Dict, seed: int) -> List[Dict]:
+    """Headless in-process export of a recorded rush hour run"""
+    planner = AdvancedPathPlanner(scenarios.DENSE_TRAFFIC_SIZE, seed=seed, headless=True)
+    for obstacle in scenarios.construction_sites():
+        planner.add_dynamic_obstacle(obstacle)
+    await scenarios.route(planner, scenarios.rush_hour_vehicles(config["agents"], seed))
+    frames = await planner.simulate(duration=config["frames"] * 0.1 + 0.05)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in config["formats"]:
+            path = os.path.join(directory, f"export.{fmt}")
+            began = time.perf_counter()
+            written = planner.export_animation(frames, path, workers=0, fmt=fmt)
+            elapsed = time.perf_counter() - began
+            metrics = {"frames": written, "elapsed_s": elapsed, "ms_per_frame": elapsed * 1000 / written,
+                       "bytes": os.path.getsize(path)}
+            results.append(result("export", {"format": fmt, "agents": config["agents"]},
+                                  metrics, "ms_per_frame"))
+    planner.close()
+    return results
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "find_path": bench_find_path,
+    "replan_storm": bench_replan_storm,
+    "simulate": bench_simulate,
+    "export": bench_export,
+}
+
+
+def run(suite: str = "full", only: Optional[List[str]] = None, seed: int = DEFAULT_SEED,
+        huge: bool = False) -> Dict:
+    """Run the selected benchmarks of a suite and return the results document"""
+    selected = [name for name in BENCHMARKS if not only or name in only]
+    for name in selected:
+        asyncio.run(BENCHMARKS[name](WARMUP[name], seed))
+    results = []
+    for name in selected:
+        config = SUITES[suite][name]
+        if huge and name == "simulate":
+            config = {**config, "agents": config["agents"] + HUGE_AGENTS}
+        print(f"running {name} ...", file=sys.stderr, flush=True)
+        results.extend(asyncio.run(BENCHMARKS[name](config, seed)))
+    return {
+        "format": RESULTS_FORMAT,
+        "version": RESULTS_VERSION,
+        "meta": {
+            "suite": suite,
+            "seed": seed,
+            "huge": huge,
+            "package_version": advanced_pathfinding.__version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "numba": importlib.util.find_spec("numba") is not None,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """Primary metric of every current result against the baseline result of the same name.
+
+    ``change`` is the relative slowdown (positive is worse whichever way the
+    metric points); ``status`` is ``regression`` or ``improvement`` past
+    ``threshold``, ``ok`` within it, or ``new`` without a baseline.
+    """
+    previous = {entry["name"]: entry for entry in baseline["results"]}
+    rows = []
+    for entry in current["results"]:
+        primary = entry["primary"]
+        value = entry["metrics"].get(primary)
+        old = previous.get(entry["name"], {}).get("metrics", {}).get(primary)
+        row = {"name": entry["name"], "metric": primary, "baseline": old, "current": value,
+               "change": None, "status": "new"}
+        if old and value:
+            change = old / value - 1 if entry["higher_is_better"] else value / old - 1
+            row["change"] = change
+            row["status"] = ("regression" if change > threshold
+                             else "improvement" if change < -threshold else "ok")
+        rows.append(row)
+    return rows
+
+
+def print_results(document: Dict):
+    for entry in document["results"]:
+        value = entry["metrics"].get(entry["primary"])
+        print(f"{entry['name']:<55} {entry['primary']:>14} {value:12.3f}")
+
+
+def print_comparison(rows: List[Dict]):
+    for row in rows:
+        change = "" if row["change"] is None else f"{row['change']:+8.1%}"
+        baseline = "-" if row["baseline"] is None else f"{row['baseline']:.3f}"
+        print(f"{row['name']:<55} {baseline:>12} {row['current']:12.3f} {change:>9}  {row['status']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="run the small suite")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--huge", action="store_true",
+                        help=f"also simulate fleets of {', '.join(map(str, HUGE_AGENTS))} agents")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown counted as a regression (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    document = run("quick" if args.quick else "full", args.only, args.seed, args.huge)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    if not args.compare:
+        print_results(document)
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    rows = compare(document, baseline, args.threshold)
+    print_comparison(rows)
+    return 1 if any(row["status"] == "regression" for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Seeded scenario generators shared by the benchmarks.
+
+The traffic setups are the ones from ``examples/``; everything random is
+drawn from a seed so two runs of the same suite do the same work.
+"""
+from typing import List, Sequence, Tuple
+import os
+import random
+import sys
+import numpy as np
+from advanced_pathfinding import AdvancedPathPlanner, Agent, DynamicObstacle
+from advanced_pathfinding.core.grid import TERRAIN_CODES, TerrainType
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+if EXAMPLES_DIR not in sys.path:
+    sys.path.insert(0, EXAMPLES_DIR)
+
+import dense_traffic_scenario as dense_traffic  # noqa: E402
+import emergency_vehicle_scenario as emergency  # noqa: E402
+
+# Grid the rush hour setup was written for
+DENSE_TRAFFIC_SIZE = (80, 80)
+EMERGENCY_SIZE = (100, 100)
+TERRAIN_MIXES = ("generated", "open", "walls")
+# Share of cells turned into walls by the "walls" mix
+WALL_DENSITY = 0.3
+
+
+def apply_terrain(planner: AdvancedPathPlanner, mix: str, seed: int):
+    """Rewrite the planner's generated terrain into one of ``TERRAIN_MIXES``.
+
+    ``open`` is urban everywhere; ``walls`` scatters restricted cells over
+    the generated map, which queries with ``max_cost`` below 10 cannot enter.
+    """
+    if mix not in TERRAIN_MIXES:
+        raise ValueError(f"Unknown terrain mix: {mix!r}")
+    grid = planner.grid
+    if mix == "open":
+        grid.terrain[:] = TERRAIN_CODES[TerrainType.URBAN]
+    elif mix == "walls":
+        rng = np.random.default_rng(seed)
+        grid.terrain[rng.random(grid.terrain.shape) < WALL_DENSITY] = TERRAIN_CODES[TerrainType.RESTRICTED]
+    width, height = grid.grid_size
+    grid.mark_dirty(0, 0, width, height)
+
+
+def path_queries(planner: AdvancedPathPlanner, count: int, seed: int,
+                 max_cost: float) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """``count`` start/goal pairs on cells cheaper than ``max_cost``, at least half the map apart"""
+    rng = np.random.default_rng(seed)
+    planner.cost_field.refresh()
+    cells = np.argwhere(planner.cost_field.costs <= max_cost)
+    span = min(planner.grid_size) // 2
+    queries = []
+    while len(queries) < count:
+        start, goal = cells[rng.integers(len(cells), size=2)]
+        if max(abs(int(start[0]) - int(goal[0])), abs(int(start[1]) - int(goal[1]))) >= span:
+            queries.append((tuple(start.tolist()), tuple(goal.tolist())))
+    return queries
+
+
+def rush_hour_vehicles(count: int, seed: int, scale: int = 1) -> List[Agent]:
+    """The dense traffic example's commuters, with the example's map stretched ``scale`` times"""
+    random.seed(seed)
+    vehicles = dense_traffic.create_rush_hour_vehicles(count)
+    if scale == 1:
+        return vehicles
+    return [
+        Agent(id=v.id, start=_scaled(v.start, scale), goal=_scaled(v.goal, scale), speed=v.speed,
+              position=_scaled(v.start, scale), path=[], constraints=dict(v.constraints))
+        for v in vehicles
+    ]
+
+
+def construction_sites(scale: int = 1) -> List[DynamicObstacle]:
+    return [DynamicObstacle(o.id, _scaled(o.position, scale), (0, 0), o.radius * scale)
+            for o in dense_traffic.create_construction_sites()]
+
+
+async def emergency_scenario(seed: int) -> AdvancedPathPlanner:
+    """The emergency vehicle example: regular traffic, road blocks and an ambulance, routed"""
+    planner = AdvancedPathPlanner(EMERGENCY_SIZE, seed=seed, headless=True)
+    await route(planner, await emergency.create_regular_vehicles())
+    for obstacle in emergency.create_obstacles():
+        planner.add_dynamic_obstacle(obstacle)
+    await route(planner, [emergency.create_emergency_vehicle()])
+    return planner
+
+
+def storm_obstacles(count: int, grid_size: Tuple[int, int], seed: int) -> List[DynamicObstacle]:
+    """Obstacles drifting across the map in random directions, forcing replans as they go"""
+    rng = np.random.default_rng(seed)
+    width, height = grid_size
+    obstacles = []
+    for i in range(count):
+        angle = rng.uniform(0, 2 * np.pi)
+        speed = rng.uniform(0.5, 2.0)
+        obstacles.append(DynamicObstacle(
+            f"storm_{i}", (float(rng.uniform(0, width)), float(rng.uniform(0, height))),
+            (float(speed * np.cos(angle)), float(speed * np.sin(angle))), float(rng.uniform(1.0, 3.0))
+        ))
+    return obstacles
+
+
+async def route(planner: AdvancedPathPlanner, agents: Sequence[Agent]) -> int:
+    """Add the agents, then give each its ``find_path`` route; returns how many got one.
+
+    The whole fleet is added first so goal regions are counted once, not
+    again after every agent.
+    """
+    for agent in agents:
+        planner.add_agent(agent)
+    routed = 0
+    for agent in agents:
+        path = await planner.find_path(agent.start, agent.goal, agent.constraints)
+        if path:
+            agent.path = path
+            routed += 1
+    return routed
+
+
+def _scaled(pos, scale: int):
+    return type(pos)(v * scale for v in pos)
@@ -27,11 +27,14 @@ setup(
     python_requires=">=3.8",
     install_requires=[
         "numpy>=1.21.0",
-        "matplotlib>=3.4.0",
+        "matplotlib>=3.6.0",
         "rich>=10.0.0",
         "asyncio>=3.4.3",
     ],
     extras_require={
+        "fast": [
+            "numba>=0.53.0",
+        ],
         "dev": [
             "pytest>=6.0",
             "pytest-asyncio>=0.15.0",
@@ -1,47 +1,384 @@
-from dataclasses import dataclass
-from typing import Tuple, List, Dict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
 
+AGENT_STATUSES = ("active", "waiting", "finished")
+STATUS_CODES = {status: code for code, status in enumerate(AGENT_STATUSES)}
+ACTIVE, WAITING, FINISHED = range(len(AGENT_STATUSES))
 
-@dataclass
-class Agent:
-    id: str
-    start: Tuple[int, int]
-    goal: Tuple[int, int]
-    speed: float
-    position: Tuple[float, float]
-    path: List[Tuple[int, int]]
-    constraints: Dict[str, float]
-    status: str = "active"  # active, waiting, finished
-    priority: int = 1
 
-    def update_position(self, dt: float):
-        """Update agent's position based on current path and speed"""
-        if not self.path or self.status != "active":
+class PathView(list):
+    """List snapshot of an agent's remaining ``(x, y)`` waypoints.
+
+    It is a real ``list``, so code written against the old list-valued
+    ``Agent.path`` keeps working. While the agent's path has not changed
+    since the snapshot was taken, in-place edits (``pop(0)``, ``append``,
+    item assignment, ...) are written through to the fleet as well. Once
+    the agent has moved on or been given a new path, the snapshot is
+    detached and edits only change the copy, as with a list that was
+    replaced. Pickling and copying give a plain list.
+    """
+
+    __slots__ = ("_agent", "_token")
+
+    def __init__(self, agent: 'Agent'):
+        fleet, slot = agent._fleet, agent._slot
+        super().__init__(map(tuple, fleet.waypoints[fleet.cursor[slot]:fleet.path_end[slot]].tolist()))
+        self._agent = agent
+        self._token = fleet.path_token(slot)
+
+    def _attached(self) -> bool:
+        agent = self._agent
+        return self._token == agent._fleet.path_token(agent._slot)
+
+    def _write_back(self):
+        agent = self._agent
+        agent._fleet.set_path(agent._slot, list(self))
+        self._token = agent._fleet.path_token(agent._slot)
+
+    def append(self, cell: Tuple[int, int]):
+        self.extend([cell])
+
+    def extend(self, cells):
+        cells = [tuple(cell) for cell in cells]
+        attached = self._attached()
+        super().extend(cells)
+        if attached:
+            agent = self._agent
+            agent._fleet.extend_path(agent._slot, cells)
+            self._token = agent._fleet.path_token(agent._slot)
+
+    def __iadd__(self, cells):
+        self.extend(cells)
+        return self
+
+    def pop(self, index: int = -1) -> Tuple[int, int]:
+        attached = self._attached()
+        first = index in (0, -len(self))
+        cell = super().pop(index)
+        if attached and first:
+            # Consuming the next waypoint is a cursor increment, as in FleetStore.step
+            agent = self._agent
+            agent._fleet.cursor[agent._slot] += 1
+            self._token = agent._fleet.path_token(agent._slot)
+        elif attached:
+            self._write_back()
+        return cell
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    def __copy__(self) -> List[Tuple[int, int]]:
+        return list(self)
+
+
+def _writes_through(name: str):
+    method = getattr(list, name)
+
+    def edit(self, *args):
+        attached = self._attached()
+        result = method(self, *args)
+        if attached:
+            self._write_back()
+        return self if result is self else result
+
+    edit.__name__ = name
+    return edit
+
+
+for _name in ("insert", "remove", "clear", "sort", "reverse", "__setitem__", "__delitem__", "__imul__"):
+    setattr(PathView, _name, _writes_through(_name))
+
+
+class FleetStore:
+    """Struct-of-arrays storage for agent kinematics.
+
+    Positions, speeds, statuses and waypoint cursors live in arrays, and all
+    paths share one int waypoint buffer: agent ``i`` still has to visit
+    ``waypoints[cursor[i]:path_end[i]]``. ``step`` advances every active
+    agent at once with the same rules as ``Agent.update_position``, so
+    consuming a waypoint is a cursor increment rather than a list pop.
+
+    With ``land_within_step`` an agent that is within one step of its
+    waypoint, but outside ``ARRIVAL_RADIUS``, lands on it and consumes it on
+    the next step. Under the original rule it stays put instead, which
+    stalls it until something else moves it. Cooperative planning turns
+    landing on, because its move timings count on it.
+    """
+
+    # Waypoints within this distance count as reached
+    ARRIVAL_RADIUS = 0.1
+
+    def __init__(self, capacity: int = 16, waypoint_capacity: int = 1024, land_within_step: bool = False):
+        self.land_within_step = land_within_step
+        self.position = np.zeros((capacity, 2), dtype=np.float64)
+        self.speed = np.zeros(capacity, dtype=np.float64)
+        self.status = np.full(capacity, FINISHED, dtype=np.int8)
+        self.goal = np.zeros((capacity, 2), dtype=np.int32)
+        self.cursor = np.zeros(capacity, dtype=np.int64)
+        self.path_end = np.zeros(capacity, dtype=np.int64)
+        # Bumped whenever a path is replaced or extended
+        self.path_version = np.zeros(capacity, dtype=np.int64)
+        self.waypoints = np.zeros((waypoint_capacity, 2), dtype=np.int32)
+        self.used = np.zeros(capacity, dtype=bool)
+        # Bumped whenever an agent moves into or out of a slot
+        self.membership_version = 0
+        self._filled = 0
+        self._views: List[Optional['Agent']] = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return int(self.used.sum())
+
+    def add(self, agent: 'Agent') -> 'Agent':
+        """Move the agent's state into a free slot and make it a view of that slot"""
+        if agent._fleet is not self:
+            self._take(agent)
+        return agent
+
+    def remove(self, agent: 'Agent'):
+        """Release the agent's slot; the agent keeps its state in a private one-slot fleet"""
+        if agent._fleet is self:
+            FleetStore(capacity=1, waypoint_capacity=max(agent.waypoints_left, 1),
+                       land_within_step=self.land_within_step)._take(agent)
+
+    def _take(self, agent: 'Agent'):
+        """Copy the view's state into a free slot here and release its old slot"""
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        source, source_slot = agent._fleet, agent._slot
+        self.position[slot] = source.position[source_slot]
+        self.speed[slot] = source.speed[source_slot]
+        self.status[slot] = source.status[source_slot]
+        self.goal[slot] = source.goal[source_slot]
+        self.used[slot] = True
+        self._views[slot] = agent
+        path = source.waypoints[source.cursor[source_slot]:source.path_end[source_slot]]
+        agent._fleet, agent._slot = self, slot
+        self.set_path(slot, path)
+        source._views[source_slot] = None
+        source.used[source_slot] = False
+        source.status[source_slot] = FINISHED
+        source.cursor[source_slot] = source.path_end[source_slot]
+        source._free.append(source_slot)
+        self.membership_version += 1
+        source.membership_version += 1
+
+    def active_slots(self) -> np.ndarray:
+        return np.flatnonzero(self.used & (self.status == ACTIVE))
+
+    def views(self, slots: Iterable[int]) -> List['Agent']:
+        return [self._views[slot] for slot in slots]
+
+    def path_token(self, slot: int) -> Tuple['FleetStore', int, int, int]:
+        """Changes whenever the slot's remaining waypoints do"""
+        return self, int(self.path_version[slot]), int(self.cursor[slot]), int(self.path_end[slot])
+
+    def set_path(self, slot: int, path):
+        cells = np.asarray(path, dtype=np.int32).reshape(-1, 2)
+        self._reserve(len(cells))
+        start = self._filled
+        self.waypoints[start:start + len(cells)] = cells
+        self._filled += len(cells)
+        self.cursor[slot] = start
+        self.path_end[slot] = start + len(cells)
+        self.path_version[slot] += 1
+
+    def extend_path(self, slot: int, cells):
+        """Append waypoints; in place when the path already ends the buffer"""
+        cells = np.asarray(cells, dtype=np.int32).reshape(-1, 2)
+        if self.path_end[slot] != self._filled or self.cursor[slot] == self.path_end[slot]:
+            remaining = self.waypoints[self.cursor[slot]:self.path_end[slot]]
+            self.set_path(slot, np.concatenate([remaining, cells]))
+            return
+        self._reserve(len(cells))
+        self.waypoints[self._filled:self._filled + len(cells)] = cells
+        self._filled += len(cells)
+        self.path_end[slot] = self._filled
+        self.path_version[slot] += 1
+
+    def next_waypoints(self, slots: np.ndarray) -> np.ndarray:
+        """Next waypoint of each given slot; only meaningful where ``cursor < path_end``"""
+        return self.waypoints[np.minimum(self.cursor[slots], len(self.waypoints) - 1)]
+
+    def step(self, dt: float) -> np.ndarray:
+        """Advance every active agent; returns the slots that were active before the step"""
+        slots = self.active_slots()
+        self._step(slots, dt)
+        return slots
+
+    def _step(self, slots: np.ndarray, dt: float):
+        slots = slots[self.cursor[slots] < self.path_end[slots]]
+        if len(slots) == 0:
             return
+        target = self.waypoints[self.cursor[slots]].astype(np.float64)
+        position = self.position[slots]
+        delta = target - position
+        distance = (delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1]) ** 0.5
 
-        target = self.path[0]
-        dx = target[0] - self.position[0]
-        dy = target[1] - self.position[1]
-        distance = (dx * dx + dy * dy) ** 0.5
+        reached = distance < self.ARRIVAL_RADIUS
+        arrived = slots[reached]
+        self.position[arrived] = target[reached]
+        self.cursor[arrived] += 1
+        self.status[arrived[self.cursor[arrived] == self.path_end[arrived]]] = FINISHED
 
-        if distance < 0.1:  # Reached waypoint
-            self.position = target
-            self.path.pop(0)
-            if not self.path:
-                self.status = "finished"
+        speed = self.speed[slots] * dt
+        moving = ~reached & (distance > speed)
+        # Same operation order as the scalar update, so positions match it bit for bit
+        self.position[slots[moving]] = (position[moving] + delta[moving] * speed[moving, None]
+                                        / distance[moving, None])
+        if self.land_within_step:
+            # A waypoint within one step is landed on, then consumed on the next step
+            landing = ~reached & ~moving
+            self.position[slots[landing]] = target[landing]
+
+    def _reserve(self, count: int):
+        if self._filled + count <= len(self.waypoints):
             return
+        # Compact live paths to the front, growing the buffer if they still do not fit
+        live = np.flatnonzero(self.used)
+        lengths = self.path_end[live] - self.cursor[live]
+        needed = int(lengths.sum()) + count
+        capacity = len(self.waypoints)
+        while needed * 2 > capacity:
+            capacity *= 2
+        waypoints = np.zeros((capacity, 2), dtype=np.int32)
+        filled = 0
+        for slot, length in zip(live.tolist(), lengths.tolist()):
+            waypoints[filled:filled + length] = self.waypoints[self.cursor[slot]:self.path_end[slot]]
+            self.cursor[slot] = filled
+            self.path_end[slot] = filled + length
+            filled += length
+        self.waypoints = waypoints
+        self._filled = filled
+
+    def _grow(self):
+        capacity = len(self.speed)
+        extra = max(capacity, 1)
+        self.position = np.concatenate([self.position, np.zeros((extra, 2))])
+        self.speed = np.concatenate([self.speed, np.zeros(extra)])
+        self.status = np.concatenate([self.status, np.full(extra, FINISHED, dtype=np.int8)])
+        self.goal = np.concatenate([self.goal, np.zeros((extra, 2), dtype=np.int32)])
+        self.cursor = np.concatenate([self.cursor, np.zeros(extra, dtype=np.int64)])
+        self.path_end = np.concatenate([self.path_end, np.zeros(extra, dtype=np.int64)])
+        self.path_version = np.concatenate([self.path_version, np.zeros(extra, dtype=np.int64)])
+        self.used = np.concatenate([self.used, np.zeros(extra, dtype=bool)])
+        self._views.extend([None] * extra)
+        self._free.extend(range(capacity + extra - 1, capacity - 1, -1))
+
+
+class Agent:
+    """View of one agent in a FleetStore.
+
+    Constructing an Agent directly gives it a private one-slot fleet; the
+    planner moves it into its own fleet when it is added. ``path`` returns
+    a ``PathView`` list of the remaining waypoints that writes in-place
+    edits through to the fleet, and assigning it replaces them. Agents
+    compare equal when all their fields do.
+    """
+    __slots__ = ("id", "start", "constraints", "priority", "_fleet", "_slot")
+
+    def __init__(self, id: str, start: Tuple[int, int], goal: Tuple[int, int], speed: float,
+                 position: Tuple[float, float], path: List[Tuple[int, int]],
+                 constraints: Dict[str, float], status: str = "active", priority: int = 1):
+        self.id = id
+        self.start = start
+        self.constraints = constraints
+        self.priority = priority
+        self._fleet = FleetStore(capacity=1, waypoint_capacity=max(len(path), 1))
+        self._slot = self._fleet._free.pop()
+        self._fleet.used[self._slot] = True
+        self._fleet._views[self._slot] = self
+        self.goal = goal
+        self.speed = speed
+        self.position = position
+        self.path = path
+        self.status = status
+
+    def __repr__(self) -> str:
+        return (f"Agent(id={self.id!r}, start={self.start}, goal={self.goal}, speed={self.speed}, "
+                f"position={self.position}, path={self.path}, constraints={self.constraints}, "
+                f"status={self.status!r}, priority={self.priority})")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Agent):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
 
-        # Move towards target
-        speed = self.speed * dt
-        if distance > speed:
-            self.position = (
-                self.position[0] + dx * speed / distance,
-                self.position[1] + dy * speed / distance
-            )
+    def to_dict(self) -> Dict:
+        """The constructor arguments as a dict, with ``path`` as a list"""
+        return {"id": self.id, "start": self.start, "goal": self.goal, "speed": self.speed,
+                "position": self.position, "path": list(self.path),
+                "constraints": dict(self.constraints), "status": self.status, "priority": self.priority}
+
+    @property
+    def position(self) -> Tuple[float, float]:
+        x, y = self._fleet.position[self._slot].tolist()
+        return x, y
+
+    @position.setter
+    def position(self, value: Tuple[float, float]):
+        self._fleet.position[self._slot] = value
+
+    @property
+    def goal(self) -> Tuple[int, int]:
+        x, y = self._fleet.goal[self._slot].tolist()
+        return x, y
+
+    @goal.setter
+    def goal(self, value: Tuple[int, int]):
+        self._fleet.goal[self._slot] = value
+
+    @property
+    def speed(self) -> float:
+        return float(self._fleet.speed[self._slot])
+
+    @speed.setter
+    def speed(self, value: float):
+        self._fleet.speed[self._slot] = value
+
+    @property
+    def status(self) -> str:
+        return AGENT_STATUSES[self._fleet.status[self._slot]]
+
+    @status.setter
+    def status(self, value: str):
+        self._fleet.status[self._slot] = STATUS_CODES[value]
+
+    @property
+    def path(self) -> PathView:
+        return PathView(self)
+
+    @path.setter
+    def path(self, value: List[Tuple[int, int]]):
+        self._fleet.set_path(self._slot, value)
+
+    @property
+    def waypoints_left(self) -> int:
+        return int(self._fleet.path_end[self._slot] - self._fleet.cursor[self._slot])
+
+    @property
+    def next_waypoint(self) -> Optional[Tuple[int, int]]:
+        fleet, slot = self._fleet, self._slot
+        if fleet.cursor[slot] >= fleet.path_end[slot]:
+            return None
+        x, y = fleet.waypoints[fleet.cursor[slot]].tolist()
+        return x, y
+
+    def extend_path(self, cells: List[Tuple[int, int]]):
+        self._fleet.extend_path(self._slot, cells)
+
+    def update_position(self, dt: float):
+        """Update agent's position based on current path and speed"""
+        if self.status == "active":
+            self._fleet._step(np.array([self._slot]), dt)
 
     def calculate_path_metrics(self) -> Dict[str, float]:
         """Calculate metrics for the agent's current path"""
-        if not self.path:
+        path = self.path
+        if not path:
             return {
                 "distance": 0,
                 "optimal_distance": 0,
@@ -50,7 +387,7 @@ class Agent:
 
         actual_distance = sum(
             ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
-            for p1, p2 in zip(self.path[:-1], self.path[1:])
+            for p1, p2 in zip(path[:-1], path[1:])
         )
         optimal_distance = ((self.start[0] - self.goal[0]) ** 2 +
                             (self.start[1] - self.goal[1]) ** 2) ** 0.5
@@ -61,4 +398,4 @@ class Agent:
             "distance": actual_distance,
             "optimal_distance": optimal_distance,
             "efficiency": efficiency
-        }
\ No newline at end of file
+        }
@@ -1,7 +1,8 @@
 from enum import Enum
 from dataclasses import dataclass
-from typing import List, Optional
-import random
+from typing import Callable, List, Optional, Tuple
+import os
+import zipfile
 import numpy as np
 
 class TerrainType(Enum):
@@ -23,6 +24,11 @@ class TerrainType(Enum):
             cls.RESTRICTED: '#FF0000'  # Red
         }[terrain_type]
 
+# Terrain is stored as a small integer code indexing into these tables
+TERRAIN_TYPES: Tuple[TerrainType, ...] = tuple(TerrainType)
+TERRAIN_CODES = {terrain: code for code, terrain in enumerate(TERRAIN_TYPES)}
+TERRAIN_COSTS = np.array([terrain.value for terrain in TERRAIN_TYPES], dtype=np.float64)
+
 @dataclass
 class WeatherCondition:
     rain_intensity: float
@@ -30,68 +36,303 @@ class WeatherCondition:
     wind_speed: float
     temperature: float
 
+def weather_costs(rain: np.ndarray, visibility: np.ndarray, wind: np.ndarray) -> np.ndarray:
+    """Weather term of the traversal cost for arrays of rain, visibility and wind"""
+    rain = rain.astype(np.float64)
+    visibility = visibility.astype(np.float64)
+    wind = wind.astype(np.float64)
+    return rain * 2 + (1 - visibility) * 3 + np.maximum(0, (wind - 10) * 0.5)
+
+class Grid:
+    """Struct-of-arrays city grid; ``grid[x][y]`` yields a GridCell view"""
+
+    def __init__(self, grid_size: Tuple[int, int]):
+        self.grid_size = (int(grid_size[0]), int(grid_size[1]))
+        shape = self.grid_size
+        self.terrain = np.zeros(shape, dtype=np.int8)
+        self.elevation = np.zeros(shape, dtype=np.float64)
+        self.risk = np.zeros(shape, dtype=np.float32)
+        self.congestion = np.zeros(shape, dtype=np.float32)
+        # Weather channels are only meaningful where has_weather is set
+        self.has_weather = np.zeros(shape, dtype=bool)
+        self.rain = np.zeros(shape, dtype=np.float32)
+        self.visibility = np.ones(shape, dtype=np.float32)
+        self.wind = np.zeros(shape, dtype=np.float32)
+        self.temperature = np.zeros(shape, dtype=np.float32)
+        # Sparse per-cell obstacle lists, only allocated for cells that use them
+        self.cell_obstacles = {}
+        self._observers: List[Callable[[int, int, int, int], None]] = []
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.grid_size
+
+    def __len__(self) -> int:
+        return self.grid_size[0]
+
+    def __getitem__(self, x: int) -> '_GridRow':
+        if x < 0:
+            x += self.grid_size[0]
+        if not 0 <= x < self.grid_size[0]:
+            raise IndexError("grid row index out of range")
+        return _GridRow(self, x)
+
+    def __iter__(self):
+        for x in range(self.grid_size[0]):
+            yield _GridRow(self, x)
+
+    def add_observer(self, callback: Callable[[int, int, int, int], None]):
+        """Register a callback receiving (x0, y0, x1, y1) for every changed rectangle"""
+        self._observers.append(callback)
+
+    def mark_dirty(self, x0: int, y0: int, x1: int, y1: int):
+        """Announce that cost-relevant channels changed inside [x0:x1, y0:y1]"""
+        for callback in self._observers:
+            callback(x0, y0, x1, y1)
+
+    def mark_cells_dirty(self, xs: np.ndarray, ys: np.ndarray, max_rects: int = 64):
+        """``mark_dirty`` the cells ``(xs[i], ys[i])``.
+
+        Up to ``max_rects`` scattered cells are cheaper to refresh one by one;
+        more are marked as their bounding box.
+        """
+        if len(xs) == 0:
+            return
+        if len(xs) <= max_rects:
+            for x, y in zip(xs.tolist(), ys.tolist()):
+                self.mark_dirty(x, y, x + 1, y + 1)
+        else:
+            self.mark_dirty(int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+
+    def cell(self, x: int, y: int) -> 'GridCell':
+        return GridCell._view(self, x, y)
+
+    def terrain_at(self, x: int, y: int) -> TerrainType:
+        return TERRAIN_TYPES[self.terrain[x, y]]
+
+    def traversal_costs(self, x0: int = 0, y0: int = 0,
+                        x1: Optional[int] = None, y1: Optional[int] = None) -> np.ndarray:
+        """Vectorized GridCell.traversal_cost over the rectangle [x0:x1, y0:y1]"""
+        region = (slice(x0, x1), slice(y0, y1))
+        base_cost = TERRAIN_COSTS[self.terrain[region]]
+        elevation_cost = np.maximum(0, self.elevation[region] * 0.1)
+
+        weather_cost = weather_costs(self.rain[region], self.visibility[region], self.wind[region])
+        weather_cost[~self.has_weather[region]] = 0
+
+        congestion_cost = self.congestion[region].astype(np.float64) * 0.2
+        risk_cost = self.risk[region].astype(np.float64) * 5
+
+        return base_cost + elevation_cost + weather_cost + congestion_cost + risk_cost
+
+    def traversal_cost(self, x: int, y: int) -> float:
+        base_cost = float(TERRAIN_COSTS[self.terrain[x, y]])
+        elevation_cost = max(0, float(self.elevation[x, y]) * 0.1)
+
+        weather_cost = 0
+        if self.has_weather[x, y]:
+            weather_cost += float(self.rain[x, y]) * 2
+            weather_cost += (1 - float(self.visibility[x, y])) * 3
+            weather_cost += max(0, (float(self.wind[x, y]) - 10) * 0.5)
+
+        congestion_cost = float(self.congestion[x, y]) * 0.2
+        risk_cost = float(self.risk[x, y]) * 5
+
+        return base_cost + elevation_cost + weather_cost + congestion_cost + risk_cost
+
+class _GridRow:
+    __slots__ = ("_grid", "_x")
+
+    def __init__(self, grid: Grid, x: int):
+        self._grid = grid
+        self._x = x
+
+    def __len__(self) -> int:
+        return self._grid.grid_size[1]
+
+    def __getitem__(self, y: int) -> 'GridCell':
+        if y < 0:
+            y += self._grid.grid_size[1]
+        if not 0 <= y < self._grid.grid_size[1]:
+            raise IndexError("grid column index out of range")
+        return GridCell._view(self._grid, self._x, y)
+
+    def __iter__(self):
+        for y in range(self._grid.grid_size[1]):
+            yield GridCell._view(self._grid, self._x, y)
+
 class GridCell:
+    """Lightweight view of one cell of a Grid.
+
+    Constructing a GridCell directly gives it a private 1x1 backing grid, so
+    standalone cells behave as before.
+    """
+    __slots__ = ("x", "y", "_grid", "_gx", "_gy")
+
     def __init__(self, x: int, y: int, terrain: TerrainType):
         self.x = x
         self.y = y
+        self._grid = Grid((1, 1))
+        self._gx = 0
+        self._gy = 0
         self.terrain = terrain
-        self.elevation = 0.0
-        self.dynamic_obstacles: List['DynamicObstacle'] = []
-        self.weather: Optional[WeatherCondition] = None
-        self.risk_factor = 0.0
-        self.congestion = 0
 
-    def traversal_cost(self, time: float) -> float:
-        base_cost = self.terrain.value
-        elevation_cost = max(0, self.elevation * 0.1)
+    @classmethod
+    def _view(cls, grid: Grid, x: int, y: int) -> 'GridCell':
+        cell = cls.__new__(cls)
+        cell.x = cell._gx = x
+        cell.y = cell._gy = y
+        cell._grid = grid
+        return cell
 
-        weather_cost = 0
-        if self.weather:
-            weather_cost += self.weather.rain_intensity * 2
-            weather_cost += (1 - self.weather.visibility) * 3
-            weather_cost += max(0, (self.weather.wind_speed - 10) * 0.5)
+    def _changed(self):
+        self._grid.mark_dirty(self._gx, self._gy, self._gx + 1, self._gy + 1)
 
-        congestion_cost = self.congestion * 0.2
-        risk_cost = self.risk_factor * 5
+    @property
+    def terrain(self) -> TerrainType:
+        return TERRAIN_TYPES[self._grid.terrain[self._gx, self._gy]]
 
-        return base_cost + elevation_cost + weather_cost + congestion_cost + risk_cost
+    @terrain.setter
+    def terrain(self, value: TerrainType):
+        self._grid.terrain[self._gx, self._gy] = TERRAIN_CODES[value]
+        self._changed()
+
+    @property
+    def elevation(self) -> float:
+        return float(self._grid.elevation[self._gx, self._gy])
+
+    @elevation.setter
+    def elevation(self, value: float):
+        self._grid.elevation[self._gx, self._gy] = value
+        self._changed()
+
+    @property
+    def risk_factor(self) -> float:
+        return float(self._grid.risk[self._gx, self._gy])
 
-def initialize_grid(grid_size, seed=None):
-    if seed is not None:
-        np.random.seed(seed)
-        random.seed(seed)
-
-    grid = []
-    for x in range(grid_size[0]):
-        row = []
-        for y in range(grid_size[1]):
-            if _is_highway(x, y):
-                terrain = TerrainType.HIGHWAY
-            elif _is_park(x, y):
-                terrain = TerrainType.PARK
-            elif _is_restricted(x, y):
-                terrain = TerrainType.RESTRICTED
-            elif random.random() < 0.1:
-                terrain = TerrainType.CONSTRUCTION
-            else:
-                terrain = TerrainType.URBAN if random.random() < 0.7 else TerrainType.RESIDENTIAL
-
-            cell = GridCell(x, y, terrain)
-            cell.elevation = _generate_elevation(x, y)
-            row.append(cell)
-        grid.append(row)
+    @risk_factor.setter
+    def risk_factor(self, value: float):
+        self._grid.risk[self._gx, self._gy] = value
+        self._changed()
+
+    @property
+    def congestion(self) -> float:
+        return float(self._grid.congestion[self._gx, self._gy])
+
+    @congestion.setter
+    def congestion(self, value: float):
+        self._grid.congestion[self._gx, self._gy] = value
+        self._changed()
+
+    @property
+    def weather(self) -> Optional[WeatherCondition]:
+        g, x, y = self._grid, self._gx, self._gy
+        if not g.has_weather[x, y]:
+            return None
+        return WeatherCondition(
+            rain_intensity=float(g.rain[x, y]),
+            visibility=float(g.visibility[x, y]),
+            wind_speed=float(g.wind[x, y]),
+            temperature=float(g.temperature[x, y])
+        )
+
+    @weather.setter
+    def weather(self, value: Optional[WeatherCondition]):
+        g, x, y = self._grid, self._gx, self._gy
+        g.has_weather[x, y] = value is not None
+        if value is not None:
+            g.rain[x, y] = value.rain_intensity
+            g.visibility[x, y] = value.visibility
+            g.wind[x, y] = value.wind_speed
+            g.temperature[x, y] = value.temperature
+        self._changed()
+
+    @property
+    def dynamic_obstacles(self) -> List['DynamicObstacle']:
+        return self._grid.cell_obstacles.setdefault((self._gx, self._gy), [])
+
+    def traversal_cost(self, time: float) -> float:
+        return self._grid.traversal_cost(self._gx, self._gy)
+
+# Bump whenever generate_map changes its output for a given size and seed
+GENERATOR_VERSION = 1
+# Highways run along every HIGHWAY_SPACING-th row and column
+HIGHWAY_SPACING = 10
+PARK_BLOCK = (15, 25)  # Inclusive x/y range of the park block
+RESTRICTED_CENTER = (40, 40)
+RESTRICTED_RADIUS_SQ = 25
+
+def initialize_grid(grid_size, seed=None, cache_dir: Optional[str] = None) -> Grid:
+    """Grid with generated terrain and elevation.
+
+    With ``cache_dir`` and a seed, the arrays are stored in an ``.npz``
+    named after the size, seed and ``GENERATOR_VERSION`` and loaded from
+    there on later calls. A cached file that cannot be read, or whose
+    arrays have the wrong shape or dtype, is regenerated and overwritten.
+    """
+    grid = Grid(grid_size)
+    path = map_cache_path(cache_dir, grid.grid_size, seed) if cache_dir and seed is not None else None
+    cached = _load_map(path, grid) if path is not None else None
+    if cached is not None:
+        terrain, elevation = cached
+    else:
+        terrain, elevation = generate_map(grid.grid_size, seed)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            partial = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(partial, terrain=terrain, elevation=elevation)
+            os.replace(partial, path)  # Readers never see a half-written map
+    grid.terrain = terrain
+    grid.elevation = elevation
     return grid
 
-def _is_highway(x: int, y: int) -> bool:
-    return (x % 10 == 0) or (y % 10 == 0)
+def _load_map(path: str, grid: Grid) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Terrain and elevation from a cached map, or None if it is missing or does not fit ``grid``"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as cached:
+            terrain, elevation = cached["terrain"], cached["elevation"]
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+    for array, expected in ((terrain, grid.terrain), (elevation, grid.elevation)):
+        if array.shape != grid.grid_size or array.dtype != expected.dtype:
+            return None
+    return terrain, elevation
+
+def map_cache_path(cache_dir: str, grid_size: Tuple[int, int], seed: int) -> str:
+    return os.path.join(cache_dir, f"map-{grid_size[0]}x{grid_size[1]}-seed{seed}-v{GENERATOR_VERSION}.npz")
+
+def generate_map(grid_size: Tuple[int, int], seed=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Terrain codes and elevation for a map, drawn from ``np.random.default_rng(seed)``.
+
+    Highways run along every 10th row and column. Cells in the park block
+    are parks with probability 0.7 and cells in the restricted disc are
+    restricted with probability 0.8; everything else is construction
+    (0.1), urban (0.9 * 0.7) or residential. One uniform draw per cell
+    picks the category.
+    """
+    width, height = int(grid_size[0]), int(grid_size[1])
+    rng = np.random.default_rng(seed)
+    xs = np.arange(width)[:, None]
+    ys = np.arange(height)[None, :]
+    u = rng.random((width, height), dtype=np.float32)
 
-def _is_park(x: int, y: int) -> bool:
-    return (15 <= x <= 25 and 15 <= y <= 25) and random.random() < 0.7
+    lo, hi = PARK_BLOCK
+    cx, cy = RESTRICTED_CENTER
+    in_park = ((xs >= lo) & (xs <= hi)) & ((ys >= lo) & (ys <= hi))
+    in_restricted = (xs - cx) ** 2 + (ys - cy) ** 2 < RESTRICTED_RADIUS_SQ
+    special = np.where(in_park, np.float32(0.7), np.where(in_restricted, np.float32(0.8), np.float32(0)))
+    # The rest of the unit interval is split between the ordinary categories
+    rest = (u - special) / (1 - special)
 
-def _is_restricted(x: int, y: int) -> bool:
-    return ((x - 40) ** 2 + (y - 40) ** 2 < 25) and random.random() < 0.8
+    codes = TERRAIN_CODES
+    terrain = np.full((width, height), codes[TerrainType.RESIDENTIAL], dtype=np.int8)
+    terrain[rest < 0.1 + 0.9 * 0.7] = codes[TerrainType.URBAN]
+    terrain[rest < 0.1] = codes[TerrainType.CONSTRUCTION]
+    terrain[(u < special) & in_restricted] = codes[TerrainType.RESTRICTED]
+    terrain[(u < special) & in_park] = codes[TerrainType.PARK]
+    terrain[(xs % HIGHWAY_SPACING == 0) | (ys % HIGHWAY_SPACING == 0)] = codes[TerrainType.HIGHWAY]
 
-def _generate_elevation(x: int, y: int) -> float:
-    base = np.sin(x / 10) * np.cos(y / 10)
-    noise = np.random.normal(0, 0.1)
-    return base + noise
\ No newline at end of file
+    elevation = np.sin(xs / 10) * np.cos(ys / 10) + rng.normal(0, 0.1, size=(width, height))
+    return terrain, elevation
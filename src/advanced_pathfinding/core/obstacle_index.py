@@ -0,0 +1,139 @@
+from typing import Dict, Iterable, List, Set, Tuple
+import numpy as np
+from .obstacles import DynamicObstacle
+
+BucketRange = Tuple[int, int, int, int]
+
+
+class ObstacleIndex:
+    """Uniform-grid spatial hash of dynamic obstacles.
+
+    Each obstacle is filed under every ``bucket_size`` x ``bucket_size``
+    bucket its influence disc (radius plus ``buffer``) overlaps, so a cell
+    query only tests the obstacles filed under that cell's bucket. ``update``
+    re-files an obstacle only when its covered bucket range changes.
+    """
+
+    def __init__(self, bucket_size: int = 4, buffer: float = 1.0):
+        self.bucket_size = bucket_size
+        self.buffer = buffer
+        self._buckets: Dict[Tuple[int, int], Dict[int, DynamicObstacle]] = {}
+        self._entries: Dict[int, Tuple[DynamicObstacle, BucketRange]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, obstacle: DynamicObstacle) -> bool:
+        return id(obstacle) in self._entries
+
+    def update(self, obstacle: DynamicObstacle):
+        """Insert the obstacle, or re-file it after it moved"""
+        key = id(obstacle)
+        buckets = self._bucket_range(obstacle)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] == buckets:
+                return
+            self._unfile(key, entry[1])
+        self._entries[key] = (obstacle, buckets)
+        bx0, by0, bx1, by1 = buckets
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                self._buckets.setdefault((bx, by), {})[key] = obstacle
+
+    def remove(self, obstacle: DynamicObstacle):
+        entry = self._entries.pop(id(obstacle), None)
+        if entry is not None:
+            self._unfile(id(obstacle), entry[1])
+
+    def sync(self, obstacles: Iterable[DynamicObstacle]):
+        """Re-file every obstacle in ``obstacles`` and drop any the index holds that are gone"""
+        current = set()
+        for obstacle in obstacles:
+            self.update(obstacle)
+            current.add(id(obstacle))
+        if len(current) != len(self._entries):
+            for key in [k for k in self._entries if k not in current]:
+                self._unfile(key, self._entries.pop(key)[1])
+
+    def clear(self):
+        self._buckets.clear()
+        self._entries.clear()
+
+    def nearby(self, pos: Tuple[float, float]) -> List[DynamicObstacle]:
+        """Obstacles whose influence disc may cover ``pos``"""
+        bucket = self._buckets.get((int(pos[0] // self.bucket_size), int(pos[1] // self.bucket_size)))
+        return list(bucket.values()) if bucket else []
+
+    def is_blocked(self, pos: Tuple[int, int]) -> bool:
+        bucket = self._buckets.get((int(pos[0] // self.bucket_size), int(pos[1] // self.bucket_size)))
+        if not bucket:
+            return False
+        return any(obstacle.affects_position(pos, self.buffer) for obstacle in bucket.values())
+
+    def blocked_mask(self, cells: np.ndarray) -> np.ndarray:
+        """``is_blocked`` for each row of an ``(n, 2)`` array of cells, one bucket at a time"""
+        cells = np.asarray(cells)
+        blocked = np.zeros(len(cells), dtype=bool)
+        if not self._buckets or len(cells) == 0:
+            return blocked
+        keys, inverse = np.unique(cells // self.bucket_size, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        ends = np.cumsum(np.bincount(inverse, minlength=len(keys))).tolist()
+        start = 0
+        for key, end in zip(map(tuple, keys.tolist()), ends):
+            bucket = self._buckets.get(key)
+            if bucket:
+                rows = order[start:end]
+                points = cells[rows]
+                hit = np.zeros(len(rows), dtype=bool)
+                for obstacle in bucket.values():
+                    x, y = obstacle.position
+                    dx = points[:, 0] - x
+                    dy = points[:, 1] - y
+                    hit |= dx * dx + dy * dy <= (obstacle.radius + self.buffer) ** 2
+                blocked[rows] = hit
+            start = end
+        return blocked
+
+    def covered_cells(self, grid_size: Tuple[int, int]) -> Set[int]:
+        """Flat indices (``x * height + y``) of the grid cells any obstacle blocks"""
+        width, height = grid_size
+        cells: Set[int] = set()
+        for obstacle, _ in self._entries.values():
+            reach = obstacle.radius + self.buffer
+            x, y = obstacle.position
+            xs = np.arange(max(0, int(x - reach)), min(width, int(x + reach) + 1))
+            ys = np.arange(max(0, int(y - reach)), min(height, int(y + reach) + 1))
+            inside = (xs[:, None] - x) ** 2 + (ys[None, :] - y) ** 2 <= reach ** 2
+            gx, gy = np.nonzero(inside)
+            cells.update((xs[gx] * height + ys[gy]).tolist())
+        return cells
+
+    def segment_blocked(self, a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+        """Whether any cell on the straight line from ``a`` to ``b`` is blocked"""
+        steps = max(abs(b[0] - a[0]), abs(b[1] - a[1]))
+        for i in range(steps + 1):
+            t = i / steps if steps else 0.0
+            cell = (round(a[0] + (b[0] - a[0]) * t), round(a[1] + (b[1] - a[1]) * t))
+            if self.is_blocked(cell):
+                return True
+        return False
+
+    def _bucket_range(self, obstacle: DynamicObstacle) -> BucketRange:
+        reach = obstacle.radius + self.buffer
+        x, y = obstacle.position
+        size = self.bucket_size
+        return (int((x - reach) // size), int((y - reach) // size),
+                int((x + reach) // size), int((y + reach) // size))
+
+    def _unfile(self, key: int, buckets: BucketRange):
+        bx0, by0, bx1, by1 = buckets
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                bucket = self._buckets.get((bx, by))
+                if bucket is not None:
+                    bucket.pop(key, None)
+                    if not bucket:
+                        del self._buckets[(bx, by)]
@@ -1,28 +1,190 @@
-from dataclasses import dataclass
-from typing import Tuple, Optional
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# Bounds used by obstacles that are not part of a planner's store
+DEFAULT_BOUNDS = (50, 50)
+
+
+class ObstacleStore:
+    """Struct-of-arrays storage for a population of dynamic obstacles.
+
+    ``step`` advances every live obstacle in one NumPy pass, bounces it off
+    the store's bounds and retires obstacles whose lifetime ran out. Retired
+    slots go on a free list and are reused by later ``add`` calls.
+    """
+
+    def __init__(self, bounds: Tuple[int, int] = DEFAULT_BOUNDS, capacity: int = 16):
+        self.bounds = bounds
+        self.position = np.zeros((capacity, 2), dtype=np.float64)
+        self.velocity = np.zeros((capacity, 2), dtype=np.float64)
+        self.radius = np.zeros(capacity, dtype=np.float64)
+        self.lifetime = np.full(capacity, np.inf, dtype=np.float64)
+        self.age = np.zeros(capacity, dtype=np.float64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self._views: List[Optional['DynamicObstacle']] = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return int(self.alive.sum())
+
+    def __iter__(self):
+        for slot in np.flatnonzero(self.alive):
+            yield self._views[slot]
+
+    def add(self, obstacle: 'DynamicObstacle') -> 'DynamicObstacle':
+        """Move the obstacle's state into a free slot and make it a view of that slot"""
+        if obstacle._store is not self:
+            self._take(obstacle)
+        return obstacle
+
+    def remove(self, obstacle: 'DynamicObstacle'):
+        if obstacle._store is self:
+            self._retire(np.array([obstacle._slot]))
+
+    def step(self, dt: float) -> List['DynamicObstacle']:
+        """Advance every live obstacle and return the ones retired by lifetime expiry"""
+        slots = np.flatnonzero(self.alive)
+        self._advance(slots, dt)
+        expired = slots[self.age[slots] >= self.lifetime[slots]]
+        return self._retire(expired) if len(expired) else []
+
+    def _advance(self, slots: np.ndarray, dt: float):
+        old = self.position[slots]
+        velocity = self.velocity[slots]
+        self.position[slots] = old + velocity * dt
+        # Like the original per-obstacle rule, the bounce tests the position before the move
+        limit = np.array(self.bounds, dtype=np.float64) - 1
+        outside = (old < 0) | (old > limit)
+        self.velocity[slots] = np.where(outside, -velocity, velocity)
+        self.age[slots] += dt
+
+    def _retire(self, slots: np.ndarray) -> List['DynamicObstacle']:
+        retired = []
+        for slot in slots.tolist():
+            view = self._views[slot]
+            # The view keeps its last state in a private store
+            ObstacleStore(self.bounds, capacity=1)._take(view)
+            retired.append(view)
+        return retired
+
+    def _take(self, view: 'DynamicObstacle'):
+        """Copy the view's state into a free slot here and release its old slot"""
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        source, source_slot = view._store, view._slot
+        if source is not None:
+            for name in ("position", "velocity", "radius", "lifetime", "age"):
+                getattr(self, name)[slot] = getattr(source, name)[source_slot]
+            source._views[source_slot] = None
+            source.alive[source_slot] = False
+            source._free.append(source_slot)
+        self.alive[slot] = True
+        self._views[slot] = view
+        view._store, view._slot = self, slot
+
+    def _grow(self):
+        capacity = len(self.radius)
+        extra = max(capacity, 1)
+        self.position = np.concatenate([self.position, np.zeros((extra, 2))])
+        self.velocity = np.concatenate([self.velocity, np.zeros((extra, 2))])
+        self.radius = np.concatenate([self.radius, np.zeros(extra)])
+        self.lifetime = np.concatenate([self.lifetime, np.full(extra, np.inf)])
+        self.age = np.concatenate([self.age, np.zeros(extra)])
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        self._views.extend([None] * extra)
+        self._free.extend(range(capacity + extra - 1, capacity - 1, -1))
+
 
-@dataclass
 class DynamicObstacle:
-    id: str
-    position: Tuple[float, float]
-    velocity: Tuple[float, float]
-    radius: float
-    lifetime: Optional[float] = None
+    """View of one obstacle in an ObstacleStore.
+
+    Constructing a DynamicObstacle directly gives it a private one-slot
+    store with the historical 50x50 bounds; the planner moves it into its
+    own store when it is added.
+    """
+    __slots__ = ("id", "_store", "_slot")
+
+    def __init__(self, id: str, position: Tuple[float, float], velocity: Tuple[float, float],
+                 radius: float, lifetime: Optional[float] = None):
+        self.id = id
+        self._store = None
+        self._slot = 0
+        ObstacleStore(capacity=1)._take(self)
+        self.position = position
+        self.velocity = velocity
+        self.radius = radius
+        self.lifetime = lifetime
+
+    def __repr__(self) -> str:
+        return (f"DynamicObstacle(id={self.id!r}, position={self.position}, velocity={self.velocity}, "
+                f"radius={self.radius}, lifetime={self.lifetime})")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DynamicObstacle):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def to_dict(self) -> Dict:
+        """The constructor arguments as a dict"""
+        return {"id": self.id, "position": self.position, "velocity": self.velocity,
+                "radius": self.radius, "lifetime": self.lifetime}
+
+    @property
+    def position(self) -> Tuple[float, float]:
+        x, y = self._store.position[self._slot]
+        return float(x), float(y)
+
+    @position.setter
+    def position(self, value: Tuple[float, float]):
+        self._store.position[self._slot] = value
+
+    @property
+    def velocity(self) -> Tuple[float, float]:
+        vx, vy = self._store.velocity[self._slot]
+        return float(vx), float(vy)
+
+    @velocity.setter
+    def velocity(self, value: Tuple[float, float]):
+        self._store.velocity[self._slot] = value
+
+    @property
+    def radius(self) -> float:
+        return float(self._store.radius[self._slot])
+
+    @radius.setter
+    def radius(self, value: float):
+        self._store.radius[self._slot] = value
+
+    @property
+    def lifetime(self) -> Optional[float]:
+        return _lifetime_value(self._store.lifetime[self._slot])
+
+    @lifetime.setter
+    def lifetime(self, value: Optional[float]):
+        self._store.lifetime[self._slot] = np.inf if value is None else value
+
+    @property
+    def age(self) -> float:
+        return float(self._store.age[self._slot])
+
+    @property
+    def expired(self) -> bool:
+        return bool(self.age >= self._store.lifetime[self._slot])
 
     def update(self, dt: float):
         """Update obstacle position based on velocity"""
-        x, y = self.position
-        vx, vy = self.velocity
-        self.position = (x + vx * dt, y + vy * dt)
-
-        # Bounce off boundaries
-        if not (0 <= x <= 49):
-            self.velocity = (-vx, vy)
-        if not (0 <= y <= 49):
-            self.velocity = (vx, -vy)
+        self._store._advance(np.array([self._slot]), dt)
 
     def affects_position(self, pos: Tuple[int, int], buffer: float = 1.0) -> bool:
         """Check if the obstacle affects a given position"""
-        dx = pos[0] - self.position[0]
-        dy = pos[1] - self.position[1]
-        return (dx * dx + dy * dy) <= (self.radius + buffer) ** 2
\ No newline at end of file
+        x, y = self._store.position[self._slot].tolist()
+        dx = pos[0] - x
+        dy = pos[1] - y
+        return (dx * dx + dy * dy) <= (float(self._store.radius[self._slot]) + buffer) ** 2
+
+
+def _lifetime_value(lifetime: float) -> Optional[float]:
+    return None if np.isinf(lifetime) else float(lifetime)
@@ -1,8 +1,8 @@
 from dataclasses import dataclass
 from typing import Dict, Tuple, Optional
 from enum import Enum
-import random
 import numpy as np
+from .grid import weather_costs
 
 
 class WeatherType(Enum):
@@ -81,27 +81,85 @@ class WeatherCondition:
 
 
 class WeatherSystem:
-    def __init__(self, grid_size: Tuple[int, int]):
-        self.grid_size = grid_size
-        self.current_conditions: Dict[Tuple[int, int], WeatherCondition] = {}
+    """Per-cell weather held as rain, visibility, wind and temperature arrays.
+
+    Cells either follow ``global_condition`` or hold local weather (a front
+    or a single ``set_local_weather``), marked in ``local``. Each ``update``
+    drifts the global condition, lets local cells dissipate back to it and
+    rewrites the arrays in one vectorized pass. ``push_to_grid`` copies the
+    cells whose weather cost moved by at least ``cost_threshold`` into the
+    Grid's weather channels and marks them dirty, so they reach the cost
+    field like any other edit.
+    """
+
+    # Above this many changed cells, push_to_grid marks one bounding box dirty
+    MAX_DIRTY_RECTS = 64
+
+    def __init__(self, grid_size: Tuple[int, int], seed: Optional[int] = None,
+                 dissipation: float = 0.1, cost_threshold: float = 0.05):
+        self.grid_size = (int(grid_size[0]), int(grid_size[1]))
+        self.dissipation = dissipation
+        self.cost_threshold = cost_threshold
+        shape = self.grid_size
+        self.rain = np.zeros(shape, dtype=np.float32)
+        self.visibility = np.ones(shape, dtype=np.float32)
+        self.wind = np.zeros(shape, dtype=np.float32)
+        self.temperature = np.zeros(shape, dtype=np.float32)
+        self.local = np.zeros(shape, dtype=bool)
         self.global_condition: Optional[WeatherCondition] = None
-        self._weather_noise = np.random.RandomState()
+        self._rng = np.random.default_rng(seed)
+        self._local_cells = 0
+        # Weather cost last pushed to the grid, and whether anything changed since
+        self._pushed = np.zeros(shape, dtype=np.float64)
+        self._pushed_cover = np.zeros(shape, dtype=bool)
+        self.pending = False
+
+    @property
+    def active(self) -> bool:
+        return self.global_condition is not None or self._local_cells > 0
+
+    @property
+    def covered(self) -> np.ndarray:
+        """Cells that have any weather: all of them under a global condition, else the local ones"""
+        if self.global_condition is not None:
+            return np.ones(self.grid_size, dtype=bool)
+        return self.local
 
     def set_global_weather(self, condition: WeatherCondition):
-        """Set a global weather condition"""
+        """Set a global weather condition, clearing local weather"""
         self.global_condition = condition
-        self.current_conditions.clear()
+        self.local[:] = False
+        self._local_cells = 0
+        self._fill(condition, np.ones(self.grid_size, dtype=bool))
 
     def set_local_weather(self, position: Tuple[int, int], condition: WeatherCondition):
         """Set weather condition for a specific position"""
-        self.current_conditions[position] = condition
+        x, y = position
+        if not self.local[x, y]:
+            self.local[x, y] = True
+            self._local_cells += 1
+        self.rain[x, y] = condition.rain_intensity
+        self.visibility[x, y] = condition.visibility
+        self.wind[x, y] = condition.wind_speed
+        self.temperature[x, y] = condition.temperature
+        self.pending = True
 
-    def get_weather_at(self, position: Tuple[int, int]) -> WeatherCondition:
+    def get_weather_at(self, position: Tuple[int, int]) -> Optional[WeatherCondition]:
         """Get weather condition at a specific position"""
-        return self.current_conditions.get(position, self.global_condition)
+        x, y = position
+        if not self.local[x, y]:
+            return self.global_condition
+        return WeatherCondition(
+            rain_intensity=float(self.rain[x, y]),
+            visibility=float(self.visibility[x, y]),
+            wind_speed=float(self.wind[x, y]),
+            temperature=float(self.temperature[x, y])
+        )
 
     def update(self, dt: float):
         """Update weather conditions over time"""
+        if not self.active:
+            return
         if self.global_condition:
             # Add some random variation to the global weather
             noise = self._generate_weather_noise()
@@ -112,62 +170,114 @@ class WeatherSystem:
                 temperature=self.global_condition.temperature + noise * 0.5
             )
 
-        # Update local weather conditions
-        for pos in list(self.current_conditions.keys()):
-            if random.random() < 0.1:  # 10% chance to remove local weather effect
-                del self.current_conditions[pos]
+        # Each local cell falls back to the global weather with probability ``dissipation``
+        reverted = np.zeros(0, dtype=np.int64)
+        if self._local_cells:
+            cells = np.flatnonzero(self.local)
+            reverted = cells[self._rng.random(len(cells)) < self.dissipation]
+            self.local.reshape(-1)[reverted] = False
+            self._local_cells -= len(reverted)
+        if self.global_condition:
+            self._fill(self.global_condition, ~self.local)
+        elif len(reverted):
+            self.pending = True
 
     def _generate_weather_noise(self) -> float:
         """Generate random weather variations"""
-        return self._weather_noise.normal(0, 0.05)
+        return float(self._rng.normal(0, 0.05))
+
+    def _fill(self, condition: WeatherCondition, mask: np.ndarray):
+        self.rain[mask] = condition.rain_intensity
+        self.visibility[mask] = condition.visibility
+        self.wind[mask] = condition.wind_speed
+        self.temperature[mask] = condition.temperature
+        self.pending = True
 
     def create_weather_front(self,
                              start_position: Tuple[int, int],
                              condition: WeatherCondition,
                              radius: int):
-        """Create a weather front centered at a position"""
-        for x in range(max(0, start_position[0] - radius),
-                       min(self.grid_size[0], start_position[0] + radius + 1)):
-            for y in range(max(0, start_position[1] - radius),
-                           min(self.grid_size[1], start_position[1] + radius + 1)):
-                # Calculate distance from center
-                distance = ((x - start_position[0]) ** 2 +
-                            (y - start_position[1]) ** 2) ** 0.5
-
-                if distance <= radius:
-                    # Intensity decreases with distance from center
-                    intensity = 1.0 - (distance / radius)
-                    local_condition = WeatherCondition(
-                        rain_intensity=condition.rain_intensity * intensity,
-                        visibility=min(1.0, condition.visibility + (1 - intensity)),
-                        wind_speed=condition.wind_speed * intensity,
-                        temperature=condition.temperature
-                    )
-                    self.set_local_weather((x, y), local_condition)
+        """Create a weather front centered at a position.
+
+        Intensity falls off linearly from the center to ``radius``; the
+        disc is stamped over its bounding box in one pass.
+        """
+        cx, cy = start_position
+        x0, x1 = max(0, cx - radius), min(self.grid_size[0], cx + radius + 1)
+        y0, y1 = max(0, cy - radius), min(self.grid_size[1], cy + radius + 1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        xs, ys = np.ogrid[x0:x1, y0:y1]
+        distance = np.sqrt((xs - cx) ** 2 + (ys - cy) ** 2)
+        inside = distance <= radius
+        intensity = 1.0 - distance[inside] / radius if radius > 0 else np.ones(int(inside.sum()))
+
+        region = (slice(x0, x1), slice(y0, y1))
+        local = self.local[region]
+        self._local_cells += int((inside & ~local).sum())
+        local[inside] = True
+        self.rain[region][inside] = condition.rain_intensity * intensity
+        self.visibility[region][inside] = np.minimum(1.0, condition.visibility + (1 - intensity))
+        self.wind[region][inside] = condition.wind_speed * intensity
+        self.temperature[region][inside] = condition.temperature
+        self.pending = True
+
+    def push_to_grid(self, grid) -> int:
+        """Copy cells whose weather cost moved by at least ``cost_threshold`` into ``grid``; returns the count"""
+        if not self.pending:
+            return 0
+        self.pending = False
+        covered = self.covered
+        cost = weather_costs(self.rain, self.visibility, self.wind)
+        cost[~covered] = 0
+        changed = (np.abs(cost - self._pushed) >= self.cost_threshold) | (covered != self._pushed_cover)
+        xs, ys = np.nonzero(changed)
+        if len(xs) == 0:
+            return 0
+        self._pushed[xs, ys] = cost[xs, ys]
+        self._pushed_cover[xs, ys] = covered[xs, ys]
+        grid.has_weather[xs, ys] = covered[xs, ys]
+        grid.rain[xs, ys] = self.rain[xs, ys]
+        grid.visibility[xs, ys] = self.visibility[xs, ys]
+        grid.wind[xs, ys] = self.wind[xs, ys]
+        grid.temperature[xs, ys] = self.temperature[xs, ys]
+        grid.mark_cells_dirty(xs, ys, self.MAX_DIRTY_RECTS)
+        return len(xs)
 
     def save_weather_state(self) -> Dict:
         """Save current weather state for analysis"""
         return {
             'global_condition': self.global_condition,
-            'local_conditions': self.current_conditions.copy(),
+            'rain': self.rain.copy(),
+            'visibility': self.visibility.copy(),
+            'wind': self.wind.copy(),
+            'temperature': self.temperature.copy(),
+            'local': self.local.copy(),
             'grid_size': self.grid_size
         }
 
     def load_weather_state(self, state: Dict):
         """Load a previously saved weather state"""
+        self.grid_size = tuple(state['grid_size'])
         self.global_condition = state['global_condition']
-        self.current_conditions = state['local_conditions']
-        self.grid_size = state['grid_size']
+        self.rain = state['rain'].copy()
+        self.visibility = state['visibility'].copy()
+        self.wind = state['wind'].copy()
+        self.temperature = state['temperature'].copy()
+        self.local = state['local'].copy()
+        self._local_cells = int(self.local.sum())
+        if self._pushed.shape != self.rain.shape:
+            self._pushed = np.zeros(self.grid_size, dtype=np.float64)
+            self._pushed_cover = np.zeros(self.grid_size, dtype=bool)
+        self.pending = True
+
 
+# Usage with the pathfinding system (AdvancedPathPlanner does this every tick):
+"""
+planner.weather_system.set_global_weather(WeatherCondition.create_preset(WeatherType.RAIN))
+planner.weather_system.create_weather_front((40, 40), WeatherCondition.create_preset(WeatherType.STORM), 10)
 
-# Example usage in the pathfinding system:
+# In AdvancedPathPlanner.update:
+self.weather_system.update(dt)
+self.weather_system.push_to_grid(self.grid)  # changed cells reach the cost field as dirty regions
 """
-# In AdvancedPathPlanner.__init__:
-self.weather_system = WeatherSystem(grid_size)
-self.weather_system.set_global_weather(WeatherCondition.create_preset(WeatherType.CLEAR))
-
-# In GridCell.traversal_cost:
-weather = self.weather_system.get_weather_at((self.x, self.y))
-weather_multiplier = weather.get_movement_multiplier()
-return base_cost * weather_multiplier
-"""
\ No newline at end of file
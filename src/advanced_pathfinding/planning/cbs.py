@@ -0,0 +1,444 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import heapq
+import math
+import time
+from .cost_field import CostField
+from .cooperative import WAIT_COST, agent_priority, move_ticks
+from .flow_field import FlowFieldCache
+from .reservations import TICK_LENGTH
+from .search import DIAGONAL_FACTOR, NEIGHBOR_OFFSETS
+
+_MOVES = tuple((dx, dy, dx != 0 and dy != 0) for dx, dy in NEIGHBOR_OFFSETS)
+
+# A schedule is the list of (cell, tick) arrivals of one agent, starting at tick 0
+Schedule = List[Tuple[Tuple[int, int], int]]
+
+
+class CBSResult(NamedTuple):
+    paths: Dict[str, List[Tuple[int, int]]]
+    schedules: Dict[str, Schedule]
+    cost: float
+    lower_bound: float
+    # cost / lower_bound; at most ``weight`` unless the solver fell back
+    bound: float
+    weight: float
+    expansions: int
+    elapsed: float
+    fallback: bool
+    unsolved: List[str]
+
+
+def schedule_cells(schedule: Schedule) -> Iterator[Tuple[int, Tuple[int, int]]]:
+    """``(tick, cell)`` for every cell the agent occupies until its last arrival.
+
+    While moving between two cells an agent occupies both, so two agents
+    can only swap places by sharing a cell at some tick.
+    """
+    cell, tick = schedule[0]
+    yield tick, cell
+    for (a, ta), (b, tb) in zip(schedule, schedule[1:]):
+        for t in range(ta + 1, tb + 1):
+            if a != b:
+                yield t, a
+            yield t, b
+
+
+def schedule_path(schedule: Schedule) -> List[Tuple[int, int]]:
+    """Waypoints that replay a schedule on a FleetStore stepped once per tick"""
+    if len(schedule) == 1:
+        return [schedule[0][0]]
+    path = []
+    for (a, ta), (b, tb) in zip(schedule, schedule[1:]):
+        if a == b:
+            path.extend([b] * (tb - ta))
+        else:
+            path.append(b)
+    return path
+
+
+class _FocalQueue:
+    """Open list plus its focal subset: entries whose value is within ``weight`` of the lowest bound.
+
+    ``pop`` returns the focal entry with the smallest secondary key, so
+    with ``weight=1`` it is plain best-first search with tie-breaking.
+    """
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self._open = []
+        self._pending = []
+        self._focal = []
+        self._entries = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lower_bound(self) -> float:
+        open_set = self._open
+        while open_set and open_set[0][1] not in self._entries:
+            heapq.heappop(open_set)
+        return open_set[0][0] if open_set else math.inf
+
+    def push(self, lower: float, value: float, secondary: Tuple, item):
+        key = self._count
+        self._count += 1
+        self._entries[key] = (value, secondary, item)
+        heapq.heappush(self._open, (lower, key))
+        heapq.heappush(self._pending, (value, key))
+
+    def pop(self):
+        entries, pending, focal = self._entries, self._pending, self._focal
+        while entries:
+            bound = self.weight * self.lower_bound() + 1e-9
+            while pending and pending[0][0] <= bound:
+                key = heapq.heappop(pending)[1]
+                if key in entries:
+                    heapq.heappush(focal, (entries[key][1], key))
+            if not focal:
+                # Only reachable through float rounding; take the lowest value
+                heapq.heappush(focal, (entries[pending[0][1]][1], heapq.heappop(pending)[1]))
+            key = heapq.heappop(focal)[1]
+            if key not in entries:
+                continue
+            value, secondary, item = entries[key]
+            if value > bound:
+                # The lower bound dropped since this entry was admitted
+                heapq.heappush(pending, (value, key))
+                continue
+            del entries[key]
+            return item
+        return None
+
+
+class _Spec:
+    """Per-agent search inputs"""
+    __slots__ = ('id', 'start', 'goal', 'straight', 'diagonal', 'max_cost', 'heuristic', 'moves')
+
+    def __init__(self, agent, start: int, goal: int, tick_length: float, field):
+        self.id = agent.id
+        self.start = start
+        self.goal = goal
+        self.moves = agent.speed > 0
+        self.straight = move_ticks(1.0, agent.speed, tick_length) if self.moves else 0
+        self.diagonal = move_ticks(DIAGONAL_FACTOR, agent.speed, tick_length) if self.moves else 0
+        self.max_cost = agent.constraints.get('max_cost', float('inf'))
+        self.heuristic = field.distance
+
+
+class _Node:
+    __slots__ = ('constraints', 'solutions', 'cost', 'lower', 'conflicts', 'conflict')
+
+    def __init__(self, constraints, solutions):
+        self.constraints = constraints
+        self.solutions = solutions
+        self.cost = sum(s[1] for s in solutions)
+        self.lower = sum(s[2] for s in solutions)
+
+
+class ConflictBasedSearch:
+    """Conflict-Based Search for dispatching a batch of agents at once.
+
+    Uses the (cell, tick) model of CooperativePlanner: a move lasts as many
+    ticks as the agent's speed needs, both cells are occupied meanwhile,
+    waiting costs ``WAIT_COST`` per tick and an agent stays on its goal
+    once there. The high level branches on the earliest pair of agents
+    sharing a cell at a tick, forbidding it to one or the other, and the
+    low level is a space-time A* under those constraints with an exact
+    reverse-Dijkstra heuristic.
+
+    With ``weight > 1`` this is ECBS: both levels expand, among nodes
+    within ``weight`` of the current lower bound, the one with the fewest
+    conflicts, so the solution costs at most ``weight`` times the optimum.
+    When ``max_expansions`` high-level nodes or ``time_limit`` seconds are
+    used up, agents are planned one at a time in priority order instead,
+    each avoiding everything planned before it. That fallback gets its own
+    ``fallback_time_limit`` seconds (``time_limit`` when unset); agents it
+    has not planned by then are reported unsolved.
+    """
+
+    def __init__(self, cost_field: CostField, weight: float = 1.0, max_expansions: int = 1000,
+                 time_limit: Optional[float] = None, max_search_expansions: int = 20000,
+                 tick_length: float = TICK_LENGTH, max_fields: int = 256,
+                 fallback_time_limit: Optional[float] = None):
+        if weight < 1.0:
+            raise ValueError("weight must be at least 1")
+        self.cost_field = cost_field
+        self.weight = weight
+        self.max_expansions = max_expansions
+        self.time_limit = time_limit
+        self.fallback_time_limit = fallback_time_limit if fallback_time_limit is not None else time_limit
+        self.max_search_expansions = max_search_expansions
+        self.tick_length = tick_length
+        self.heuristics = FlowFieldCache(cost_field, region_size=1, max_fields=max_fields)
+
+    def solve(self, agents: Iterable) -> CBSResult:
+        """Collision-free schedules for ``agents``, each starting from the cell it stands on.
+
+        Agents whose start or goal cell is already taken by a higher-priority
+        agent, or whose goal is unreachable, are left out and listed in
+        ``unsolved``.
+        """
+        started = time.perf_counter()
+        deadline = started + self.time_limit if self.time_limit is not None else math.inf
+        height = self.cost_field.grid_size[1]
+        agents = sorted(agents, key=lambda a: (-agent_priority(a), a.id))
+        specs, unsolved = [], []
+        starts, goals = set(), set()
+        for agent in agents:
+            start = (int(agent.position[0]), int(agent.position[1]))
+            goal = agent.goal if agent.speed > 0 else start
+            # Two agents can never both stand on one start or goal cell
+            if start in starts or goal in goals:
+                unsolved.append(agent.id)
+                continue
+            field = self.heuristics.get(goal, agent.constraints.get('max_cost', float('inf')))
+            if not field.reachable(start):
+                unsolved.append(agent.id)
+                continue
+            starts.add(start)
+            goals.add(goal)
+            specs.append(_Spec(agent, start[0] * height + start[1], goal[0] * height + goal[1],
+                               self.tick_length, field))
+
+        # Root: plan each agent alone, steering away from those planned before it
+        solutions = []
+        table, parked = {}, {}
+        for spec in list(specs):
+            solution = self._search(spec, {}, table, parked, deadline=deadline)
+            if solution is None:
+                if time.perf_counter() > deadline:
+                    return self._prioritized(specs, 0, started, unsolved)
+                specs.remove(spec)
+                unsolved.append(spec.id)
+                continue
+            solutions.append(solution)
+            self._add_occupancy(table, parked, solution[0])
+
+        root = _Node([{} for _ in specs], solutions)
+        self._detect(root)
+        queue = _FocalQueue(self.weight)
+        queue.push(root.lower, root.cost, (root.conflicts, root.cost), root)
+        expansions = 0
+        while queue:
+            if expansions >= self.max_expansions or time.perf_counter() > deadline:
+                break
+            lower = queue.lower_bound()
+            node = queue.pop()
+            if node.conflict is None:
+                return self._result(specs, node.solutions, node.cost, lower, expansions, started,
+                                    False, unsolved)
+            expansions += 1
+            tick, cell, agents_in_conflict = node.conflict
+            for i in agents_in_conflict:
+                constraints = list(node.constraints)
+                forbidden = dict(constraints[i])
+                forbidden[cell] = forbidden.get(cell, frozenset()) | {tick}
+                constraints[i] = forbidden
+                table, parked = {}, {}
+                for j, other in enumerate(node.solutions):
+                    if j != i:
+                        self._add_occupancy(table, parked, other[0])
+                solution = self._search(specs[i], forbidden, table, parked, deadline=deadline)
+                if solution is None:
+                    continue
+                solutions = list(node.solutions)
+                solutions[i] = solution
+                child = _Node(constraints, solutions)
+                self._detect(child)
+                queue.push(child.lower, child.cost, (child.conflicts, child.cost), child)
+        return self._prioritized(specs, expansions, started, unsolved)
+
+    def _prioritized(self, specs: List[_Spec], expansions: int, started: float,
+                     unsolved: List[str]) -> CBSResult:
+        """Plan agents in priority order, each treating earlier schedules as obstacles"""
+        limit = self.fallback_time_limit
+        deadline = time.perf_counter() + limit if limit is not None else math.inf
+        forbidden: Dict[int, Set[int]] = {}
+        occupied_from: Dict[int, int] = {}
+        # Every agent stands on its start cell when the batch begins
+        for spec in specs:
+            forbidden.setdefault(spec.start, set()).add(0)
+        solved, solutions = [], []
+        for spec in specs:
+            if time.perf_counter() > deadline:
+                unsolved.append(spec.id)
+                continue
+            own_start = forbidden[spec.start]
+            own_start.discard(0)
+            solution = self._search(spec, forbidden, {}, {}, occupied_from, deadline=deadline)
+            own_start.add(0)
+            if solution is None:
+                unsolved.append(spec.id)
+                continue
+            solved.append(spec)
+            solutions.append(solution)
+            schedule = solution[0]
+            for tick, cell in schedule_cells(schedule):
+                forbidden.setdefault(cell, set()).add(tick)
+            final, last = schedule[-1]
+            occupied_from[final] = min(last, occupied_from.get(final, last))
+        cost = sum(s[1] for s in solutions)
+        lower = sum(s[2] for s in solutions)
+        return self._result(solved, solutions, cost, lower, expansions, started, True, unsolved)
+
+    def _result(self, specs, solutions, cost: float, lower: float, expansions: int, started: float,
+                fallback: bool, unsolved: List[str]) -> CBSResult:
+        height = self.cost_field.grid_size[1]
+        schedules = {spec.id: [(divmod(cell, height), t) for cell, t in solution[0]]
+                     for spec, solution in zip(specs, solutions)}
+        if fallback:
+            bound = math.inf
+        else:
+            bound = cost / lower if lower > 0 else 1.0
+        return CBSResult(
+            paths={agent_id: schedule_path(schedule) for agent_id, schedule in schedules.items()},
+            schedules=schedules,
+            cost=cost,
+            lower_bound=lower,
+            bound=bound,
+            weight=self.weight,
+            expansions=expansions,
+            elapsed=time.perf_counter() - started,
+            fallback=fallback,
+            unsolved=sorted(unsolved),
+        )
+
+    def _add_occupancy(self, table: Dict[int, int], parked: Dict[int, int], schedule):
+        cells = self.cost_field.costs.size
+        for tick, cell in schedule_cells(schedule):
+            key = tick * cells + cell
+            table[key] = table.get(key, 0) + 1
+        final, last = schedule[-1]
+        parked[final] = min(last, parked.get(final, last))
+
+    def _detect(self, node: _Node):
+        """Count conflicts between the node's schedules and keep the earliest one"""
+        owners: Dict[Tuple[int, int], int] = {}
+        by_cell: Dict[int, List[Tuple[int, int]]] = {}
+        conflicts = 0
+        earliest = None
+        for i, solution in enumerate(node.solutions):
+            for tick, cell in schedule_cells(solution[0]):
+                other = owners.setdefault((tick, cell), i)
+                if other != i:
+                    conflicts += 1
+                    if earliest is None or tick < earliest[0]:
+                        earliest = (tick, cell, (other, i))
+                else:
+                    by_cell.setdefault(cell, []).append((tick, i))
+        # Agents stay on their final cell, so anyone entering it later collides
+        for i, solution in enumerate(node.solutions):
+            final, last = solution[0][-1]
+            for tick, j in by_cell.get(final, ()):
+                if tick > last and j != i:
+                    conflicts += 1
+                    if earliest is None or tick < earliest[0]:
+                        earliest = (tick, final, (i, j))
+        node.conflicts = conflicts
+        node.conflict = earliest
+
+    def _search(self, spec: _Spec, forbidden: Dict[int, Set[int]], table: Dict[int, int],
+                parked: Dict[int, int], occupied_from: Optional[Dict[int, int]] = None,
+                deadline: float = math.inf):
+        """Focal space-time A* for one agent; returns (schedule, cost, lower bound) or None.
+
+        ``forbidden`` maps cells to ticks the agent may not occupy them and
+        ``occupied_from`` cells to the tick from which they are taken for
+        good. ``table`` and ``parked`` describe the other agents and only
+        steer the choice between paths of acceptable cost. Gives up after
+        ``max_search_expansions`` or at ``deadline`` (a perf_counter time).
+        """
+        width, height = self.cost_field.grid_size
+        cells = width * height
+        costs = self.cost_field.costs.reshape(-1)
+        heuristic = spec.heuristic
+        occupied_from = occupied_from or {}
+        goal = spec.goal
+        if goal in occupied_from:
+            return None
+        goal_free_after = max(forbidden.get(goal, ()), default=-1)
+        straight, diagonal = spec.straight, spec.diagonal
+        max_cost = spec.max_cost
+
+        def free(cell: int, first: int, last: int) -> bool:
+            if occupied_from and occupied_from.get(cell, math.inf) <= last:
+                return False
+            ticks = forbidden.get(cell)
+            if ticks:
+                for t in range(first, last + 1):
+                    if t in ticks:
+                        return False
+            return True
+
+        steer = bool(table or parked)
+        occupancy = table.get
+
+        def clashes(cell: int, first: int, last: int) -> int:
+            count = 0
+            key = first * cells + cell
+            for _ in range(first, last + 1):
+                count += occupancy(key, 0)
+                key += cells
+            since = parked.get(cell)
+            if since is not None and since <= last:
+                count += last - max(first, since) + 1
+            return count
+
+        start = spec.start
+        if not free(start, 0, 0):
+            return None
+        queue = _FocalQueue(self.weight)
+        h = float(heuristic[start])
+        queue.push(h, h, (0, h), (start, 0, 0.0, 0))
+        g_score = {(start, 0): 0.0}
+        came_from = {}
+        expansions = 0
+        while queue:
+            lower = queue.lower_bound()
+            cell, t, g, conflicts = queue.pop()
+            state = (cell, t)
+            if g > g_score[state]:
+                continue
+            if cell == goal and t > goal_free_after:
+                schedule = [state]
+                while state in came_from:
+                    state = came_from[state]
+                    schedule.append(state)
+                schedule.reverse()
+                return schedule, g, lower
+            expansions += 1
+            if expansions > self.max_search_expansions:
+                return None
+            if not expansions & 1023 and time.perf_counter() > deadline:
+                return None
+
+            successors = []
+            if free(cell, t + 1, t + 1):
+                successors.append((cell, t + 1, g + WAIT_COST))
+            if spec.moves:
+                x, y = divmod(cell, height)
+                for dx, dy, is_diagonal in _MOVES:
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < width and 0 <= ny < height):
+                        continue
+                    index = nx * height + ny
+                    move_cost = costs[index] * DIAGONAL_FACTOR if is_diagonal else costs[index]
+                    if move_cost > max_cost or not math.isfinite(heuristic[index]):
+                        continue
+                    arrival = t + (diagonal if is_diagonal else straight)
+                    if free(index, t + 1, arrival) and free(cell, t + 1, arrival):
+                        successors.append((index, arrival, g + float(move_cost)))
+            for index, arrival, g2 in successors:
+                next_state = (index, arrival)
+                if g2 < g_score.get(next_state, math.inf):
+                    g_score[next_state] = g2
+                    came_from[next_state] = state
+                    c = conflicts
+                    if steer:
+                        c += clashes(index, t + 1, arrival)
+                        if index != cell:
+                            c += clashes(cell, t + 1, arrival)
+                    f = g2 + float(heuristic[index])
+                    queue.push(f, f, (c, f), (index, arrival, g2, c))
+        return None
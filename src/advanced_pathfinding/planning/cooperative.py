@@ -0,0 +1,205 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+import math
+from .cost_field import CostField
+from .flow_field import FlowFieldCache
+from .reservations import ReservationTable
+from .search import DIAGONAL_FACTOR, NEIGHBOR_OFFSETS
+
+# Ticks ahead each space-time search plans before following the heuristic field
+DEFAULT_WINDOW = 40
+# Cost of waiting in place for one tick
+WAIT_COST = 0.1
+# Waypoints closer than this count as reached (FleetStore.ARRIVAL_RADIUS)
+ARRIVAL_RADIUS = 0.1
+
+_MOVES = tuple((dx, dy, dx != 0 and dy != 0) for dx, dy in NEIGHBOR_OFFSETS)
+
+
+def move_ticks(length: float, speed: float, tick_length: float) -> int:
+    """Ticks an agent needs to cover ``length`` cells and consume the waypoint it reaches"""
+    if length < ARRIVAL_RADIUS:
+        return 1
+    return int(math.ceil(length / (speed * tick_length))) + 1
+
+
+def agent_priority(agent) -> float:
+    """Planning priority; ``constraints['priority']`` overrides ``Agent.priority``"""
+    return agent.constraints.get('priority', agent.priority)
+
+
+class CooperativePlanner:
+    """Windowed Hierarchical Cooperative A* (WHCA*) over a ReservationTable.
+
+    Agents are planned one at a time, highest priority first. Each search
+    runs in (cell, tick) space for ``window`` ticks against every other
+    claim, including the previous windows of agents not replanned yet.
+    Moves last as many ticks as the agent's speed needs, and waiting is an
+    explicit action. The heuristic
+    is an exact reverse-Dijkstra field towards the goal (a one-cell flow
+    field), which also supplies the route beyond the window. The chosen
+    window is reserved and its last cell held open-ended, and an agent is planned again every
+    ``replan_interval`` ticks so its window slides forward with time.
+    """
+
+    def __init__(self, cost_field: CostField, reservations: ReservationTable,
+                 window: int = DEFAULT_WINDOW, replan_interval: Optional[int] = None,
+                 max_expansions: int = 5000, max_fields: int = 256):
+        self.cost_field = cost_field
+        self.reservations = reservations
+        self.window = window
+        self.replan_interval = replan_interval or max(window // 2, 1)
+        self.max_expansions = max_expansions
+        self.heuristics = FlowFieldCache(cost_field, region_size=1, max_fields=max_fields)
+        self._next_plan: Dict[str, int] = {}
+        self.stats = {"searches": 0, "expansions": 0, "fallbacks": 0}
+
+    def due(self, agent_id: str, tick: int) -> bool:
+        return self._next_plan.get(agent_id, tick) <= tick
+
+    def invalidate(self, agent_id: str):
+        """Plan the agent again at the next opportunity"""
+        self._next_plan.pop(agent_id, None)
+
+    def forget(self, agent_id: str):
+        self._next_plan.pop(agent_id, None)
+        self.reservations.release(agent_id)
+
+    def plan(self, agents: Iterable, tick: int,
+             blocked: Optional[Set[int]] = None) -> Dict[str, List[Tuple[int, int]]]:
+        """Plan new windows for ``agents`` in priority order; returns their paths by id.
+
+        ``blocked`` holds flat cells that must not be entered (e.g. under
+        dynamic obstacles) during this window.
+        """
+        agents = sorted(agents, key=lambda a: (-agent_priority(a), a.id))
+        # Each agent keeps its previous window until its own turn, so agents
+        # planned earlier route around it and the old window stays feasible
+        paths = {}
+        for agent in agents:
+            self.reservations.release(agent.id)
+            path = self.plan_agent(agent, tick, blocked)
+            if path is not None:
+                paths[agent.id] = path
+            self._next_plan[agent.id] = tick + self.replan_interval
+        return paths
+
+    def plan_agent(self, agent, tick: int,
+                   blocked: Optional[Set[int]] = None) -> Optional[List[Tuple[int, int]]]:
+        """Space-time path for one agent from its current motion, reserving its window"""
+        reservations = self.reservations
+        position = agent.position
+        start = agent.next_waypoint or (int(position[0]), int(position[1]))
+        goal = agent.goal
+        max_cost = agent.constraints.get('max_cost', float('inf'))
+        field = self.heuristics.get(goal, max_cost)
+        if not field.reachable(start):
+            return None
+        if agent.speed <= 0:
+            reservations.reserve_path(agent.id, [start], tick, hold=self.window)
+            return [start]
+
+        # The agent finishes its current move before the search takes over
+        offset = self._reserve_current_move(agent, tick)
+        states = self._search(agent.id, start, goal, tick + offset, agent.speed, max_cost, field,
+                              blocked or set())
+        self.stats["searches"] += 1
+        if states is None:
+            self.stats["fallbacks"] += 1
+            return field.path_from(start)
+
+        # Reserve every cell the agent is in, moving or waiting, then hold the last one
+        path = [start]
+        first = tick + offset
+        for (a, ta), (b, tb) in zip(states, states[1:]):
+            for t in range(first + ta + 1, first + tb + 1):
+                reservations.reserve(agent.id, t, a)
+                reservations.reserve(agent.id, t, b)
+            if a == b:
+                path.extend([b] * (tb - ta))
+            else:
+                path.append(b)
+        # Park on the last cell until this agent's next turn replaces the hold
+        last, t_last = states[-1]
+        reservations.hold(agent.id, last, first + t_last + 1)
+        if last != goal:
+            path.extend(field.path_from(last)[1:])
+        return path
+
+    def _reserve_current_move(self, agent, tick: int) -> int:
+        """Claim the cells of the agent's move under way; returns the ticks it takes"""
+        position = agent.position
+        current = (int(position[0]), int(position[1]))
+        start = agent.next_waypoint or current
+        offset = move_ticks(math.hypot(start[0] - position[0], start[1] - position[1]),
+                            agent.speed, self.reservations.tick_length)
+        for t in range(tick, tick + offset + 1):
+            self.reservations.reserve(agent.id, t, current)
+            self.reservations.reserve(agent.id, t, start)
+        return offset
+
+    def _search(self, agent_id: str, start: Tuple[int, int], goal: Tuple[int, int], first_tick: int,
+                speed: float, max_cost: float, field, blocked: Set[int]):
+        """A* over (cell, ticks since ``first_tick``); returns the state sequence or None"""
+        reservations = self.reservations
+        width, height = self.cost_field.grid_size
+        costs = self.cost_field.costs.reshape(-1)
+        heuristic = field.distance
+        straight = move_ticks(1.0, speed, reservations.tick_length)
+        diagonal = move_ticks(DIAGONAL_FACTOR, speed, reservations.tick_length)
+        window = self.window
+        is_free = reservations.is_free
+
+        start_state = (start, 0)
+        g_score = {start_state: 0.0}
+        came_from = {}
+        open_set = [(float(heuristic[start[0] * height + start[1]]), 0.0, 0, start)]
+        expansions = 0
+        while open_set:
+            _, g, t, cell = heapq.heappop(open_set)
+            state = (cell, t)
+            if g > g_score[state]:
+                continue
+            if cell == goal or t >= window:
+                states = [state]
+                while state in came_from:
+                    state = came_from[state]
+                    states.append(state)
+                states.reverse()
+                self.stats["expansions"] += expansions
+                return states
+            expansions += 1
+            if expansions > self.max_expansions:
+                break
+
+            x, y = cell
+            # Wait one tick
+            if is_free(cell, first_tick + t + 1, first_tick + t + 1, agent_id):
+                self._push(open_set, g_score, came_from, state, (cell, t + 1), g + WAIT_COST,
+                           float(heuristic[x * height + y]))
+            for dx, dy, is_diagonal in _MOVES:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                index = nx * height + ny
+                move_cost = costs[index] * DIAGONAL_FACTOR if is_diagonal else costs[index]
+                if move_cost > max_cost or index in blocked or not math.isfinite(heuristic[index]):
+                    continue
+                arrival = t + (diagonal if is_diagonal else straight)
+                target = (nx, ny)
+                # Both cells are occupied while the agent is between them
+                if not (is_free(target, first_tick + t + 1, first_tick + arrival, agent_id)
+                        and is_free(cell, first_tick + t + 1, first_tick + arrival, agent_id)):
+                    continue
+                self._push(open_set, g_score, came_from, state, (target, arrival), g + move_cost,
+                           float(heuristic[index]))
+
+        self.stats["expansions"] += expansions
+        return None
+
+    @staticmethod
+    def _push(open_set, g_score, came_from, parent, state, g, h):
+        if g < g_score.get(state, math.inf):
+            g_score[state] = g
+            came_from[state] = parent
+            heapq.heappush(open_set, (g + h, g, state[1], state[0]))
@@ -0,0 +1,101 @@
+from collections import deque
+from typing import List, Optional, Tuple
+import numpy as np
+from ..core.grid import Grid
+
+Rect = Tuple[int, int, int, int]
+
+
+class CostField:
+    """Materialized traversal costs of a Grid with versioned dirty-region refresh.
+
+    The grid reports every cost-relevant change as a rectangle; ``refresh()``
+    recomputes only those rectangles and bumps ``version`` when anything
+    changed, so ``version`` is a valid cache key for search results.
+    """
+
+    # Above this many pending rectangles a single bounding-box pass is cheaper
+    MAX_PENDING_RECTS = 64
+    # Number of refreshes remembered for changes_since()
+    CHANGE_LOG_SIZE = 256
+
+    def __init__(self, grid: Grid):
+        self.grid = grid
+        self.grid_size = grid.grid_size
+        self.costs = grid.traversal_costs()
+        self.version = 0
+        self._dirty: List[Rect] = []
+        self._snapshot: Optional['CostSnapshot'] = None
+        self._changes = deque(maxlen=self.CHANGE_LOG_SIZE)  # (version, rects) per refresh
+        grid.add_observer(self.mark_dirty)
+
+    @property
+    def values(self) -> memoryview:
+        """2-D memoryview over ``costs`` for fast scalar reads from Python loops"""
+        return self.costs.data
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def mark_dirty(self, x0: int, y0: int, x1: int, y1: int):
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.grid_size[0], x1), min(self.grid_size[1], y1)
+        if x0 < x1 and y0 < y1:
+            self._dirty.append((x0, y0, x1, y1))
+
+    def mark_all_dirty(self):
+        self._dirty = [(0, 0, self.grid_size[0], self.grid_size[1])]
+
+    def refresh(self) -> int:
+        """Recompute pending dirty rectangles and return the current version"""
+        if not self._dirty:
+            return self.version
+
+        rects = self._dirty
+        self._dirty = []
+        if len(rects) > self.MAX_PENDING_RECTS:
+            rects = [_bounding_box(rects)]
+
+        for x0, y0, x1, y1 in rects:
+            self.costs[x0:x1, y0:y1] = self.grid.traversal_costs(x0, y0, x1, y1)
+
+        self.version += 1
+        self._changes.append((self.version, rects))
+        return self.version
+
+    def changes_since(self, version: int) -> Optional[List[Rect]]:
+        """Rectangles recomputed after ``version``, or None once the log no longer reaches back"""
+        self.refresh()
+        if version == self.version:
+            return []
+        if not self._changes or self._changes[0][0] > version + 1:
+            return None
+        return [rect for changed, rects in self._changes if changed > version for rect in rects]
+
+    def snapshot(self) -> 'CostSnapshot':
+        """Read-only copy of the refreshed costs, shared by all callers of one version"""
+        self.refresh()
+        if self._snapshot is None or self._snapshot.version != self.version:
+            costs = self.costs.copy()
+            costs.flags.writeable = False
+            self._snapshot = CostSnapshot(costs, self.version)
+        return self._snapshot
+
+
+class CostSnapshot:
+    """Immutable costs of a CostField at one version, safe to search from other threads"""
+
+    def __init__(self, costs: np.ndarray, version: int):
+        self.costs = costs
+        self.version = version
+        self.grid_size = costs.shape
+
+    @property
+    def values(self) -> memoryview:
+        return self.costs.data
+
+
+def _bounding_box(rects: List[Rect]) -> Rect:
+    x0s, y0s, x1s, y1s = zip(*rects)
+    return min(x0s), min(y0s), max(x1s), max(y1s)
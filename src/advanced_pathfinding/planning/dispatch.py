@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import sys
+import threading
+import numpy as np
+from .cost_field import CostField, CostSnapshot
+from .search import create_search_backend
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+# What a process worker returns when its snapshot was unlinked before it attached; a string
+# so it survives pickling
+SNAPSHOT_GONE = "snapshot-gone"
+
+
+class SearchDispatcher:
+    """Runs path searches on a worker pool against read-only cost snapshots.
+
+    ``thread`` mode shares one immutable copy of the costs per cost-field
+    version between worker threads, each of which owns its search engine.
+    ``process`` mode publishes each version once in shared memory and pool
+    workers attach to it by name, so only the query crosses the process
+    boundary. Only the newest snapshots are kept alive; a search whose
+    snapshot was evicted before its worker attached comes back as
+    ``SNAPSHOT_GONE`` and is re-dispatched against the current version.
+    A search that times out or is cancelled is stopped through its cancel
+    flag: a private array in thread mode, a slot of a shared-memory block
+    in process mode.
+
+    ``submit`` runs planner-side work, such as integrating a flow field,
+    off the event loop. That work uses objects of this process, so it runs
+    on the thread pool in thread mode and on a separate one in process mode.
+    """
+
+    SNAPSHOTS_KEPT = 2
+    # Process-mode searches in flight beyond this many run without a cancel flag
+    CANCEL_SLOTS = 1024
+
+    def __init__(self, mode: str, grid_size: Tuple[int, int], backend: str = "flat",
+                 max_workers: Optional[int] = None):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode: {mode!r}")
+        self.mode = mode
+        self.grid_size = grid_size
+        self.backend = backend
+        self._local = threading.local()
+        self._shared: 'OrderedDict[int, shared_memory.SharedMemory]' = OrderedDict()
+        if mode == "thread":
+            self._executor: Executor = ThreadPoolExecutor(max_workers, thread_name_prefix="pathfinder")
+            self._local_executor = self._executor
+        else:
+            # One cancel flag per in-flight search; written through the block's buffer only, so
+            # no array keeps it from closing
+            self._cancel_block = shared_memory.SharedMemory(create=True, size=self.CANCEL_SLOTS)
+            self._free_slots = list(range(self.CANCEL_SLOTS - 1, -1, -1))
+            self._executor = ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                                 initargs=(grid_size, backend, self._cancel_block.name))
+            self._local_executor = ThreadPoolExecutor(max_workers, thread_name_prefix="pathfinder")
+
+    async def search(self, cost_field: CostField, start: Tuple[int, int], goal: Tuple[int, int],
+                     max_cost: float = float('inf'),
+                     timeout: Optional[float] = None) -> Optional[List[Tuple[int, int]]]:
+        """Search off the event loop; returns None on timeout or when no path exists"""
+        cancel = None
+        if self.mode == "thread":
+            cancel = np.zeros(1, dtype=np.uint8)
+            future = asyncio.get_running_loop().run_in_executor(
+                self._executor, self._thread_search, cost_field.snapshot(), start, goal, max_cost, cancel)
+        else:
+            future = self._process_search(cost_field, start, goal, max_cost)
+        try:
+            path = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            # Stops a search that is still running after a timeout or cancellation
+            if cancel is not None:
+                cancel[0] = 1
+        return [tuple(p) for p in path] if path else None
+
+    async def _process_search(self, cost_field: CostField, start, goal, max_cost):
+        """Search on the process pool, re-dispatching while the snapshot is evicted under it"""
+        loop = asyncio.get_running_loop()
+        while True:
+            name = self._publish(cost_field)
+            slot = -1
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._cancel_block.buf[slot] = 0
+            work = self._executor.submit(_process_search, name, start, goal, max_cost, slot)
+            try:
+                path = await asyncio.wrap_future(work, loop=loop)
+            finally:
+                if slot >= 0:
+                    self._release_slot(slot, work)
+            if not isinstance(path, str):
+                return path
+
+    def _release_slot(self, slot: int, work: Future):
+        """Stop the slot's search if it is still running; the slot is reused once the worker is done"""
+        if not work.done() and self._cancel_block.buf is not None:
+            self._cancel_block.buf[slot] = 1
+        work.add_done_callback(lambda _: self._free_slots.append(slot))
+
+    def submit(self, fn: Callable, *args) -> asyncio.Future:
+        """Run ``fn(*args)`` on a worker thread of this process.
+
+        Cancelling the returned future does not stop ``fn``; callers that
+        share state with it should wait for it to finish.
+        """
+        return asyncio.get_running_loop().run_in_executor(self._local_executor, fn, *args)
+
+    def _thread_search(self, snapshot: CostSnapshot, start, goal, max_cost, cancel):
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = self._local.engine = create_search_backend(self.backend, self.grid_size)
+        return engine.search(snapshot, start, goal, max_cost, cancel)
+
+    def _publish(self, cost_field: CostField) -> str:
+        version = cost_field.refresh()
+        if version not in self._shared:
+            costs = cost_field.costs
+            block = shared_memory.SharedMemory(create=True, size=costs.nbytes)
+            np.ndarray(costs.shape, dtype=costs.dtype, buffer=block.buf)[:] = costs
+            self._shared[version] = block
+            while len(self._shared) > self.SNAPSHOTS_KEPT:
+                _, stale = self._shared.popitem(last=False)
+                stale.close()
+                stale.unlink()
+        return self._shared[version].name
+
+    def close(self):
+        _shutdown(self._executor)
+        if self._local_executor is not self._executor:
+            _shutdown(self._local_executor)
+        if self.mode == "process" and self._cancel_block.buf is not None:
+            # Stops searches still running in the workers before the flags go away
+            self._cancel_block.buf[:] = b"\x01" * self.CANCEL_SLOTS
+            self._cancel_block.close()
+            self._cancel_block.unlink()
+        for block in self._shared.values():
+            block.close()
+            block.unlink()
+        self._shared.clear()
+
+
+def _shutdown(executor: Executor):
+    if sys.version_info >= (3, 9):
+        executor.shutdown(wait=False, cancel_futures=True)
+    else:  # cancel_futures is new in 3.9; queued searches then still run to completion
+        executor.shutdown(wait=False)
+
+
+# Per-process state of pool workers in "process" mode
+_worker: Dict[str, object] = {}
+
+
+def _init_worker(grid_size: Tuple[int, int], backend: str, cancel_name: str):
+    _worker["grid_size"] = grid_size
+    _worker["engine"] = create_search_backend(backend, grid_size)
+    _worker["attached"] = OrderedDict()
+    block = shared_memory.SharedMemory(name=cancel_name)
+    _worker["cancel_block"] = block
+    _worker["cancel"] = np.ndarray(SearchDispatcher.CANCEL_SLOTS, dtype=np.uint8, buffer=block.buf)
+
+
+def _process_search(name: str, start, goal, max_cost, slot: int = -1):
+    attached = _worker["attached"]
+    if name not in attached:
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return SNAPSHOT_GONE  # Superseded before this query started; the dispatcher retries
+        costs = np.ndarray(_worker["grid_size"], dtype=np.float64, buffer=block.buf)
+        costs.flags.writeable = False
+        attached[name] = (block, CostSnapshot(costs, -1))
+        while len(attached) > SearchDispatcher.SNAPSHOTS_KEPT:
+            _, (stale, snapshot) = attached.popitem(last=False)
+            del snapshot
+            stale.close()
+    cancel = _worker["cancel"][slot:slot + 1] if slot >= 0 else None
+    return _worker["engine"].search(attached[name][1], start, goal, max_cost, cancel)
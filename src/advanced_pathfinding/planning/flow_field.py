@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import heapq
+import numpy as np
+from .cost_field import CostField
+from .search import DIAGONAL_FACTOR, NEIGHBOR_OFFSETS, lazy_njit
+
+_OFFSETS = tuple(NEIGHBOR_OFFSETS)
+
+
+class FlowField:
+    """Reverse-Dijkstra integration field toward a rectangular goal region.
+
+    ``distance[i]`` is the cheapest cost of reaching any cell of the region
+    from cell ``i`` under the same move costs A* uses (entering a cell costs
+    its traversal cost, diagonals x1.4142, moves above ``max_cost`` are
+    forbidden). ``next_hop[i]`` is the first step of that route, so a path
+    out of the field costs O(path length). ``cost_field`` may also be a
+    ``CostSnapshot``, which lets a worker thread integrate the field.
+    """
+
+    def __init__(self, cost_field: CostField, region: Tuple[int, int, int, int],
+                 max_cost: float = float('inf')):
+        self.grid_size = cost_field.grid_size
+        self.region = region
+        self.max_cost = max_cost
+        self.version = cost_field.version
+        width, height = self.grid_size
+        size = width * height
+        self.distance = np.full(size, np.inf, dtype=np.float64)
+        self.next_hop = np.full(size, -1, dtype=np.int64)
+
+        x0, y0, x1, y1 = region
+        xs, ys = np.meshgrid(np.arange(x0, x1), np.arange(y0, y1), indexing="ij")
+        sources = (xs * height + ys).reshape(-1).astype(np.int64)
+        _integrate(cost_field.costs.reshape(-1), width, height, sources, float(max_cost),
+                   self.distance, self.next_hop)
+
+    def contains(self, pos: Tuple[int, int]) -> bool:
+        x0, y0, x1, y1 = self.region
+        return x0 <= pos[0] < x1 and y0 <= pos[1] < y1
+
+    def reachable(self, pos: Tuple[int, int]) -> bool:
+        return bool(np.isfinite(self.distance[pos[0] * self.grid_size[1] + pos[1]]))
+
+    def next_step(self, pos: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Next cell toward the region, or None inside the region or when unreachable"""
+        hop = int(self.next_hop[pos[0] * self.grid_size[1] + pos[1]])
+        return divmod(hop, self.grid_size[1]) if hop >= 0 else None
+
+    def path_from(self, start: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """Cells from ``start`` to the first cell inside the region"""
+        if not self.reachable(start):
+            return None
+        height = self.grid_size[1]
+        next_hop = self.next_hop.data
+        index = start[0] * height + start[1]
+        path = [start]
+        while next_hop[index] >= 0:
+            index = next_hop[index]
+            path.append(divmod(index, height))
+        return path
+
+
+class FlowFieldCache:
+    """Bounded LRU of flow fields keyed by goal region and ``max_cost``.
+
+    Goals are bucketed into ``region_size`` blocks; a cached field is reused
+    until the cost field's version moves on. ``has_room`` lets callers fall
+    back to a plain search instead of thrashing the cache when more regions
+    want a field than it holds.
+    """
+
+    def __init__(self, cost_field: CostField, region_size: int = 8, max_fields: int = 16):
+        self.cost_field = cost_field
+        self.region_size = region_size
+        self.max_fields = max_fields
+        self._fields: 'OrderedDict[Tuple, FlowField]' = OrderedDict()
+
+    def region_key(self, goal: Tuple[int, int]) -> Tuple[int, int]:
+        return goal[0] // self.region_size, goal[1] // self.region_size
+
+    def region(self, goal: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """Cell bounds ``(x0, y0, x1, y1)`` of the goal's region"""
+        rx, ry = self.region_key(goal)
+        size = self.region_size
+        width, height = self.cost_field.grid_size
+        return rx * size, ry * size, min(width, (rx + 1) * size), min(height, (ry + 1) * size)
+
+    def cached(self, goal: Tuple[int, int], max_cost: float = float('inf')) -> Optional[FlowField]:
+        """The region's field if one is cached for the current cost version"""
+        version = self.cost_field.refresh()
+        key = (self.region_key(goal), max_cost)
+        field = self._fields.get(key)
+        if field is None or field.version != version:
+            return None
+        self._fields.move_to_end(key)
+        return field
+
+    def has_room(self, goal: Tuple[int, int], max_cost: float = float('inf'), reserved: int = 0) -> bool:
+        """Whether a field for the goal's region could be cached without evicting another.
+
+        A region that already has an entry replaces it in place. Otherwise
+        stale fields are dropped first, and ``reserved`` counts fields
+        still being integrated elsewhere.
+        """
+        if (self.region_key(goal), max_cost) in self._fields:
+            return True
+        if len(self._fields) + reserved >= self.max_fields:
+            version = self.cost_field.refresh()
+            for key in [k for k, field in self._fields.items() if field.version != version]:
+                del self._fields[key]
+        return len(self._fields) + reserved < self.max_fields
+
+    def put(self, goal: Tuple[int, int], max_cost: float, field: FlowField):
+        """Cache a field integrated elsewhere, e.g. on a worker thread"""
+        key = (self.region_key(goal), max_cost)
+        self._fields[key] = field
+        self._fields.move_to_end(key)
+        while len(self._fields) > self.max_fields:
+            self._fields.popitem(last=False)
+
+    def get(self, goal: Tuple[int, int], max_cost: float = float('inf')) -> FlowField:
+        field = self.cached(goal, max_cost)
+        if field is None:
+            field = FlowField(self.cost_field, self.region(goal), max_cost)
+            self.put(goal, max_cost, field)
+        return field
+
+    def clear(self):
+        self._fields.clear()
+
+
+def _integrate_loop(costs, width, height, sources, max_cost, distance, next_hop):
+    """Multi-source Dijkstra over reversed moves, filling distance and next_hop"""
+    distance[sources[0]] = 0.0
+    open_set = [(0.0, sources[0])]  # Typed by its first entry under numba
+    for i in range(1, len(sources)):
+        distance[sources[i]] = 0.0
+        open_set.append((0.0, sources[i]))
+    heapq.heapify(open_set)
+
+    while len(open_set) > 0:
+        entry = heapq.heappop(open_set)
+        current_distance = entry[0]
+        current = entry[1]
+        if current_distance > distance[current]:
+            continue
+
+        x = current // height
+        y = current - x * height
+        move_cost = costs[current]
+        for offset in _OFFSETS:
+            # Predecessor u reaches current with the move (dx, dy)
+            ux = x - offset[0]
+            uy = y - offset[1]
+            if not (0 <= ux < width and 0 <= uy < height):
+                continue
+            step_cost = move_cost
+            if offset[0] != 0 and offset[1] != 0:
+                step_cost *= DIAGONAL_FACTOR
+            if step_cost > max_cost:
+                continue
+
+            predecessor = ux * height + uy
+            candidate = current_distance + step_cost
+            if candidate < distance[predecessor]:
+                distance[predecessor] = candidate
+                next_hop[predecessor] = current
+                heapq.heappush(open_set, (candidate, predecessor))
+
+
+# Without numba the integration loop runs as plain Python
+_integrate = lazy_njit(_integrate_loop) or _integrate_loop
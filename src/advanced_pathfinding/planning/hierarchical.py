@@ -0,0 +1,256 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import heapq
+from ..core.grid import HIGHWAY_SPACING
+from .cost_field import CostField, CostSnapshot
+from .incremental import MIN_CELL_COST
+from .search import DIAGONAL_FACTOR, NEIGHBOR_OFFSETS, FlatAStar
+
+INF = float('inf')
+
+ClusterKey = Tuple[int, int]
+Path = List[Tuple[int, int]]
+
+
+class HierarchicalRoute:
+    """Abstract route through cluster entrances, refined into cells segment by segment"""
+
+    def __init__(self, nodes: List[Tuple[int, int]], cost: float,
+                 refine: Callable[[Tuple[int, int], Tuple[int, int]], Optional[Path]]):
+        self.nodes = nodes
+        self.cost = cost
+        self._refine = refine
+        self._cursor = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self._cursor >= len(self.nodes) - 1
+
+    def refine_next(self) -> Optional[Path]:
+        """Cells of the next abstract segment, excluding its first cell"""
+        if self.exhausted:
+            return []
+        a, b = self.nodes[self._cursor], self.nodes[self._cursor + 1]
+        self._cursor += 1
+        if max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1:
+            return [b]
+        segment = self._refine(a, b)
+        return segment[1:] if segment else None
+
+    def full_path(self) -> Optional[Path]:
+        path = [self.nodes[self._cursor]]
+        while not self.exhausted:
+            segment = self.refine_next()
+            if segment is None:
+                return None
+            path.extend(segment)
+        return path
+
+
+class HierarchicalGraph:
+    """HPA* abstraction of the grid over highway-aligned square clusters.
+
+    Each pair of neighbouring clusters gets entrance cells on their shared
+    border: one per passable run, or one at each end of long runs. Costs
+    between entrances of a cluster come from a Dijkstra confined to that
+    cluster. Cluster data is built the first time a query needs it and is
+    rebuilt only for clusters touched by cost changes.
+
+    ``find_route`` syncs with the live cost field before searching. To
+    search on a worker thread, call ``sync(snapshot)`` on the thread that
+    owns the cost field and then ``search_route`` on the worker.
+    """
+
+    # Border runs at least this long get an entrance at each end instead of the middle
+    LONG_ENTRANCE = 6
+
+    def __init__(self, cost_field: CostField, max_cost: float = INF,
+                 cluster_size: int = HIGHWAY_SPACING):
+        self.cost_field = cost_field
+        self.grid_size = cost_field.grid_size
+        self.max_cost = max_cost
+        self.cluster_size = cluster_size
+        self.version = cost_field.refresh()
+        self._source = cost_field
+        self._costs = cost_field.costs.reshape(-1).data
+        self._borders: Dict[Tuple[int, int, int], List[Tuple[int, int]]] = {}
+        self._clusters: Dict[ClusterKey, Tuple[List[int], Dict[int, List[Tuple[int, float]]]]] = {}
+        self._refiner = FlatAStar(self.grid_size)
+        self.clusters_built = 0
+
+    def cluster_of(self, pos: Tuple[int, int]) -> ClusterKey:
+        return pos[0] // self.cluster_size, pos[1] // self.cluster_size
+
+    def cluster_bounds(self, key: ClusterKey) -> Tuple[int, int, int, int]:
+        size = self.cluster_size
+        return (key[0] * size, key[1] * size,
+                min(self.grid_size[0], (key[0] + 1) * size), min(self.grid_size[1], (key[1] + 1) * size))
+
+    def find_route(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[HierarchicalRoute]:
+        """Search the abstract graph; None when start and goal share a cluster or no route exists"""
+        self.sync()
+        return self.search_route(start, goal)
+
+    def search_route(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[HierarchicalRoute]:
+        """``find_route`` against the costs of the last ``sync``"""
+        height = self.grid_size[1]
+        start_cluster, goal_cluster = self.cluster_of(start), self.cluster_of(goal)
+        if start_cluster == goal_cluster:
+            return None
+
+        start_index = start[0] * height + start[1]
+        goal_index = goal[0] * height + goal[1]
+        start_nodes, _ = self._cluster(start_cluster)
+        goal_nodes, _ = self._cluster(goal_cluster)
+        from_start = self._dijkstra(start_index, start_cluster, start_nodes)
+        to_goal = self._dijkstra(goal_index, goal_cluster, goal_nodes, reverse=True)
+
+        def heuristic(index: int) -> float:
+            dx = abs(index // height - goal[0])
+            dy = abs(index % height - goal[1])
+            return MIN_CELL_COST * (max(dx, dy) + (DIAGONAL_FACTOR - 1) * min(dx, dy))
+
+        g_cost = {start_index: 0.0}
+        parent = {start_index: -1}
+        open_set = [(heuristic(start_index), start_index)]
+        closed = set()
+        while open_set:
+            _, current = heapq.heappop(open_set)
+            if current in closed:
+                continue
+            if current == goal_index:
+                nodes = []
+                while current != -1:
+                    nodes.append(divmod(current, height))
+                    current = parent[current]
+                nodes.reverse()
+                return HierarchicalRoute(nodes, g_cost[goal_index], self.refine)
+            closed.add(current)
+
+            if current == start_index:
+                edges = list(from_start.items())
+            else:
+                cluster = self.cluster_of(divmod(current, height))
+                edges = list(self._cluster(cluster)[1].get(current, ()))
+                if cluster == goal_cluster and current in to_goal:
+                    edges.append((goal_index, to_goal[current]))
+            for neighbor, cost in edges:
+                tentative = g_cost[current] + cost
+                if tentative < g_cost.get(neighbor, INF):
+                    g_cost[neighbor] = tentative
+                    parent[neighbor] = current
+                    heapq.heappush(open_set, (tentative + heuristic(neighbor), neighbor))
+        return None
+
+    def refine(self, a: Tuple[int, int], b: Tuple[int, int]) -> Optional[Path]:
+        return self._refiner.search(self._source, a, b, self.max_cost)
+
+    def sync(self, snapshot: Optional[CostSnapshot] = None):
+        """Drop cluster data invalidated by cost changes since the last sync.
+
+        Later searches and refinements read ``snapshot``'s immutable costs,
+        or the live field without one.
+        """
+        version = self.cost_field.refresh()
+        self._source = snapshot if snapshot is not None else self.cost_field
+        self._costs = self._source.costs.reshape(-1).data
+        rects = self.cost_field.changes_since(self.version)
+        self.version = version
+        if rects is None:
+            self._borders.clear()
+            self._clusters.clear()
+            return
+        size = self.cluster_size
+        for x0, y0, x1, y1 in rects:
+            for cx in range(max(0, x0 - 1) // size, x1 // size + 1):
+                for cy in range(max(0, y0 - 1) // size, y1 // size + 1):
+                    self._invalidate((cx, cy))
+
+    def _invalidate(self, key: ClusterKey):
+        cx, cy = key
+        for border in ((cx, cy, 0), (cx - 1, cy, 0), (cx, cy, 1), (cx, cy - 1, 1)):
+            self._borders.pop(border, None)
+        for neighbor in ((cx, cy), (cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)):
+            self._clusters.pop(neighbor, None)
+
+    def _border(self, cx: int, cy: int, axis: int) -> List[Tuple[int, int]]:
+        """Transitions (inside, outside) from cluster (cx, cy) across its high-x (axis 0) or high-y border"""
+        key = (cx, cy, axis)
+        if key in self._borders:
+            return self._borders[key]
+
+        width, height = self.grid_size
+        x0, y0, x1, y1 = self.cluster_bounds((cx, cy))
+        transitions = []
+        if cx < 0 or cy < 0:
+            pass
+        elif (axis == 0 and x1 < width) or (axis == 1 and y1 < height):
+            if axis == 0:
+                pairs = [((x1 - 1) * height + y, x1 * height + y) for y in range(y0, y1)]
+            else:
+                pairs = [(x * height + y1 - 1, x * height + y1) for x in range(x0, x1)]
+            run: List[Tuple[int, int]] = []
+            for a, b in pairs + [(-1, -1)]:
+                if a >= 0 and self._costs[a] <= self.max_cost and self._costs[b] <= self.max_cost:
+                    run.append((a, b))
+                    continue
+                if len(run) >= self.LONG_ENTRANCE:
+                    transitions.extend([run[0], run[-1]])
+                elif run:
+                    transitions.append(run[len(run) // 2])
+                run = []
+        self._borders[key] = transitions
+        return transitions
+
+    def _cluster(self, key: ClusterKey) -> Tuple[List[int], Dict[int, List[Tuple[int, float]]]]:
+        """Entrance cells of a cluster and their outgoing abstract edges"""
+        if key in self._clusters:
+            return self._clusters[key]
+
+        cx, cy = key
+        edges: Dict[int, List[Tuple[int, float]]] = {}
+        for inside, outside in self._border(cx, cy, 0) + self._border(cx, cy, 1):
+            edges.setdefault(inside, []).append((outside, self._costs[outside]))
+        for outside, inside in self._border(cx - 1, cy, 0) + self._border(cx, cy - 1, 1):
+            edges.setdefault(inside, []).append((outside, self._costs[outside]))
+
+        nodes = sorted(edges)
+        for node in nodes:
+            distances = self._dijkstra(node, key, nodes)
+            edges[node].extend((other, cost) for other, cost in distances.items() if other != node)
+        self._clusters[key] = (nodes, edges)
+        self.clusters_built += 1
+        return nodes, edges
+
+    def _dijkstra(self, source: int, key: ClusterKey, targets: List[int],
+                  reverse: bool = False) -> Dict[int, float]:
+        """Costs from ``source`` to each target (to source if ``reverse``) inside one cluster"""
+        x0, y0, x1, y1 = self.cluster_bounds(key)
+        height = self.grid_size[1]
+        costs = self._costs
+        wanted = set(targets)
+        found: Dict[int, float] = {}
+        distance = {source: 0.0}
+        open_set = [(0.0, source)]
+        while open_set and len(found) < len(wanted):
+            current_distance, current = heapq.heappop(open_set)
+            if current_distance > distance[current]:
+                continue
+            if current in wanted:
+                found[current] = current_distance
+
+            x, y = divmod(current, height)
+            for dx, dy in NEIGHBOR_OFFSETS:
+                nx, ny = x + dx, y + dy
+                if not (x0 <= nx < x1 and y0 <= ny < y1):
+                    continue
+                neighbor = nx * height + ny
+                step = costs[current] if reverse else costs[neighbor]
+                if dx != 0 and dy != 0:
+                    step *= DIAGONAL_FACTOR
+                if step > self.max_cost:
+                    continue
+                candidate = current_distance + step
+                if candidate < distance.get(neighbor, INF):
+                    distance[neighbor] = candidate
+                    heapq.heappush(open_set, (candidate, neighbor))
+        return found
@@ -0,0 +1,200 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+from ..core.grid import TERRAIN_COSTS
+from .cost_field import CostField
+from .search import DIAGONAL_FACTOR, NEIGHBOR_OFFSETS
+
+INF = float('inf')
+# Every cell costs at least the cheapest terrain, which keeps the heuristic admissible
+MIN_CELL_COST = float(TERRAIN_COSTS.min())
+
+
+class DStarLite:
+    """Incremental shortest paths toward a fixed goal (D* Lite).
+
+    The search runs backward from the goal, so the tree survives the agent
+    moving. Between calls to ``plan`` only the vertices next to cells whose
+    cost changed (from the cost field's change log) or whose blocked state
+    flipped are repaired, which makes a replan proportional to the change
+    rather than to the map. Blocked cells cannot be entered.
+    """
+
+    # Changes touching more cells than this are cheaper to handle with a fresh search
+    MAX_CHANGED_CELLS = 4096
+
+    def __init__(self, cost_field: CostField, goal: Tuple[int, int], max_cost: float = INF):
+        self.cost_field = cost_field
+        self.grid_size = cost_field.grid_size
+        self.goal = goal
+        self.max_cost = max_cost
+        self.version = cost_field.refresh()
+        self.blocked: Set[int] = set()
+        self.expansions = 0
+        self._goal_index = goal[0] * self.grid_size[1] + goal[1]
+        self._costs = cost_field.costs.reshape(-1).data
+        self._start: Optional[int] = None
+        self._reset()
+
+    def _reset(self):
+        self.g: Dict[int, float] = {}
+        self.rhs: Dict[int, float] = {self._goal_index: 0.0}
+        self.km = 0.0
+        self._open: Dict[int, Tuple[float, float]] = {}
+        self._heap: List[Tuple[Tuple[float, float], int]] = []
+        self._start = None
+        self._push(self._goal_index, (self._heuristic_to_start(self._goal_index), 0.0))
+
+    def plan(self, start: Tuple[int, int],
+             blocked: Iterable[int] = ()) -> Optional[List[Tuple[int, int]]]:
+        """Repair the search for the new start and changes since the last call"""
+        start_index = start[0] * self.grid_size[1] + start[1]
+        blocked = set(blocked)
+        changed = self._changed_cells(blocked)
+        self.blocked = blocked
+
+        if changed is None:
+            self._reset()
+        elif self._start is not None:
+            self.km += self._heuristic(self._start, start_index)
+        self._start = start_index
+
+        for cell in changed or ():
+            for neighbor in self._neighbors(cell):
+                self._update_rhs(neighbor)
+                self._update_vertex(neighbor)
+
+        self._compute_shortest_path()
+        return self._extract_path(start_index)
+
+    def _changed_cells(self, blocked: Set[int]) -> Optional[Set[int]]:
+        version = self.cost_field.refresh()
+        rects = self.cost_field.changes_since(self.version)
+        self.version = version
+        if rects is None:
+            return None
+
+        height = self.grid_size[1]
+        changed = blocked ^ self.blocked
+        for x0, y0, x1, y1 in rects:
+            if (x1 - x0) * (y1 - y0) + len(changed) > self.MAX_CHANGED_CELLS:
+                return None
+            changed.update(x * height + y for x in range(x0, x1) for y in range(y0, y1))
+        return changed if len(changed) <= self.MAX_CHANGED_CELLS else None
+
+    def _heuristic(self, a: int, b: int) -> float:
+        height = self.grid_size[1]
+        dx = abs(a // height - b // height)
+        dy = abs(a % height - b % height)
+        return MIN_CELL_COST * (max(dx, dy) + (DIAGONAL_FACTOR - 1) * min(dx, dy))
+
+    def _heuristic_to_start(self, index: int) -> float:
+        return self._heuristic(self._start, index) if self._start is not None else 0.0
+
+    def _key(self, index: int) -> Tuple[float, float]:
+        best = min(self.g.get(index, INF), self.rhs.get(index, INF))
+        return best + self._heuristic_to_start(index) + self.km, best
+
+    def _push(self, index: int, key: Tuple[float, float]):
+        self._open[index] = key
+        heapq.heappush(self._heap, (key, index))
+
+    def _top(self) -> Tuple[Tuple[float, float], int]:
+        heap = self._heap
+        while heap and self._open.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else ((INF, INF), -1)
+
+    def _update_vertex(self, index: int):
+        if self.g.get(index, INF) != self.rhs.get(index, INF):
+            self._push(index, self._key(index))
+        else:
+            self._open.pop(index, None)
+
+    def _neighbors(self, index: int):
+        width, height = self.grid_size
+        x, y = divmod(index, height)
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height:
+                yield nx * height + ny
+
+    def _move_cost(self, source: int, target: int) -> float:
+        if target in self.blocked:
+            return INF
+        height = self.grid_size[1]
+        cost = self._costs[target]
+        if source // height != target // height and source % height != target % height:
+            cost *= DIAGONAL_FACTOR
+        return cost if cost <= self.max_cost else INF
+
+    def _update_rhs(self, index: int):
+        if index == self._goal_index:
+            return
+        g = self.g
+        self.rhs[index] = min(
+            (self._move_cost(index, successor) + g.get(successor, INF)
+             for successor in self._neighbors(index)),
+            default=INF
+        )
+
+    def _compute_shortest_path(self):
+        g, rhs = self.g, self.rhs
+        start = self._start
+        while True:
+            top_key, index = self._top()
+            start_key = self._key(start)
+            if not (top_key < start_key or rhs.get(start, INF) > g.get(start, INF)):
+                return
+            if index < 0:
+                return
+
+            self.expansions += 1
+            new_key = self._key(index)
+            if top_key < new_key:
+                self._push(index, new_key)
+            elif g.get(index, INF) > rhs.get(index, INF):
+                g[index] = rhs[index]
+                del self._open[index]
+                for predecessor in self._neighbors(index):
+                    if predecessor != self._goal_index:
+                        candidate = self._move_cost(predecessor, index) + g[index]
+                        if candidate < rhs.get(predecessor, INF):
+                            rhs[predecessor] = candidate
+                    self._update_vertex(predecessor)
+            else:
+                g[index] = INF
+                for predecessor in list(self._neighbors(index)) + [index]:
+                    self._update_rhs(predecessor)
+                    self._update_vertex(predecessor)
+
+    def _extract_path(self, start: int) -> Optional[List[Tuple[int, int]]]:
+        """Walk the repaired tree from ``start`` to the goal.
+
+        D* Lite only guarantees the start vertex after a repair, so each
+        vertex on the walk becomes the search start in turn (advancing km
+        as for a moving agent); that costs nothing where no work is pending.
+        """
+        g = self.g
+        height = self.grid_size[1]
+        path = [divmod(start, height)]
+        current = start
+        visited = {start}
+        while current != self._goal_index:
+            if current != self._start:
+                self.km += self._heuristic(self._start, current)
+                self._start = current
+                self._compute_shortest_path()
+            if self.rhs.get(current, INF) == INF:
+                return None
+
+            best, best_cost = -1, INF
+            for successor in self._neighbors(current):
+                cost = self._move_cost(current, successor) + g.get(successor, INF)
+                if cost < best_cost:
+                    best, best_cost = successor, cost
+            if best < 0 or best in visited:
+                return None
+            visited.add(best)
+            path.append(divmod(best, height))
+            current = best
+        return path
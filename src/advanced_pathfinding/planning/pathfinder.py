@@ -1,134 +1,588 @@
-from typing import List, Tuple, Dict, Optional
-import heapq
+from collections import Counter
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, List, Tuple, Dict, Optional
 import asyncio
-from rich.console import Console
 import os
-from ..core.grid import GridCell, initialize_grid
-from ..core.agents import Agent
-from ..core.obstacles import DynamicObstacle
-from .traffic import TrafficManager
-from ..visualization.analysis import SimulationAnalyzer
-from ..visualization.renderer import SimulationRenderer
+import numpy as np
+from ..core.grid import initialize_grid
+from ..core.agents import Agent, FleetStore
+from ..core.obstacles import DynamicObstacle, ObstacleStore
+from ..core.obstacle_index import ObstacleIndex
+from ..core.weather import WeatherSystem
+from .traffic import DEFAULT_FEEDBACK_THRESHOLD, TrafficManager
+from .cost_field import CostField
+from .search import create_search_backend
+from .dispatch import EXECUTOR_MODES, SearchDispatcher
+from .flow_field import FlowField, FlowFieldCache
+from .route_cache import RouteCache
+from .incremental import DStarLite
+from .recorder import FrameRecorder, snapshot_frame
+from .trajectory import TrajectoryWriter
+from .cooperative import CooperativePlanner
+from .cbs import CBSResult, ConflictBasedSearch, schedule_cells
+from .hierarchical import HIGHWAY_SPACING, HierarchicalGraph, HierarchicalRoute
+from .stats import PlannerStats
 
-console = Console()
+if TYPE_CHECKING:  # Imported lazily at runtime so planning never loads matplotlib
+    from ..visualization.analysis import SimulationAnalyzer
+    from ..visualization.renderer import SimulationRenderer
+
+REPLAN_MODES = ("full", "incremental")
+# Routed agents get the next abstract segment refined once fewer cells than this remain
+REFINE_LOOKAHEAD = 2 * HIGHWAY_SPACING
 
 
 class AdvancedPathPlanner:
-    def __init__(self, grid_size: Tuple[int, int], seed: int = None):
+    def __init__(self, grid_size: Tuple[int, int], seed: int = None,
+                 search_backend: str = "flat", executor: str = "inline",
+                 max_workers: Optional[int] = None, replan_timeout: Optional[float] = None,
+                 flow_field_min_agents: int = 3, flow_region_size: int = 8,
+                 route_cache_size: int = 1024, route_cache_max_age: Optional[float] = None,
+                 replan_mode: str = "full", hierarchical_min_distance: Optional[int] = None,
+                 congestion_decay: float = 0.0, congestion_window: Optional[int] = None,
+                 congestion_feedback: Optional[float] = DEFAULT_FEEDBACK_THRESHOLD,
+                 cooperative_window: Optional[int] = None, map_cache_dir: Optional[str] = None,
+                 headless: bool = False, instrument: bool = False):
+        if executor not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown executor mode: {executor!r}")
+        if replan_mode not in REPLAN_MODES:
+            raise ValueError(f"Unknown replan mode: {replan_mode!r}")
+        if replan_mode == "incremental" and executor != "inline":
+            # D* Lite repairs per-agent state against the live cost field, so it cannot leave the loop
+            raise ValueError("replan_mode='incremental' requires executor='inline'")
         self.grid_size = grid_size
-        self.grid = initialize_grid(grid_size, seed)
+        self.grid = initialize_grid(grid_size, seed, cache_dir=map_cache_dir)
+        self.cost_field = CostField(self.grid)
+        self.search_engine = create_search_backend(search_backend, grid_size)
+        # Off-loop searches: replans are dispatched during a tick and applied at the next one
+        self.executor = executor
+        self.replan_timeout = replan_timeout
+        self._dispatcher = (SearchDispatcher(executor, grid_size, search_backend, max_workers)
+                            if executor != "inline" else None)
+        self._pending_replans: Dict[str, Tuple[asyncio.Task, Tuple[int, int]]] = {}
+        # Goal regions shared by at least flow_field_min_agents active agents use flow fields
+        self.flow_field_min_agents = flow_field_min_agents
+        self.flow_fields = FlowFieldCache(self.cost_field, flow_region_size)
+        self._goal_groups: Optional[Counter] = None
+        # Flow fields being integrated on a worker, shared by every query that needs them
+        self._pending_fields: Dict[Tuple, asyncio.Future] = {}
+        self.route_cache = RouteCache(route_cache_size, route_cache_max_age)
+        # "incremental" keeps a D* Lite search per agent that avoids obstacle cells
+        self.replan_mode = replan_mode
+        self._incremental: Dict[str, DStarLite] = {}
+        self._blocked_cells: Optional[set] = None
+        # Trips spanning at least this many cells search the HPA* cluster graph first; off by default
+        self.hierarchical_min_distance = hierarchical_min_distance
+        self._hierarchies: Dict[float, HierarchicalGraph] = {}
+        self._hierarchy_locks: Dict[float, asyncio.Lock] = {}
+        self._routes: Dict[str, Tuple[HierarchicalRoute, Tuple[int, int], float]] = {}
         self.dynamic_obstacles: List[DynamicObstacle] = []
+        # Obstacles added to the planner become views of this store, bounded by the real grid
+        self.obstacle_store = ObstacleStore(grid_size)
+        self.obstacle_index = ObstacleIndex()
         self.agents: Dict[str, Agent] = {}
-        self.traffic_manager = TrafficManager()
+        # Agents added to the planner become views of this store and move in one batched step.
+        # Cooperative move timings assume agents land on waypoints within one step
+        self.fleet = FleetStore(land_within_step=bool(cooperative_window))
+        # Weather reaches traversal costs through the grid's dirty regions
+        self.weather_system = WeatherSystem(grid_size, seed=seed)
+        # Congestion feeds back into traversal costs in batches; congestion_feedback=None turns it off
+        self.traffic_manager = TrafficManager(grid_size, decay=congestion_decay, window=congestion_window,
+                                              feedback_threshold=congestion_feedback)
+        # With a window (in ticks), active agents are planned cooperatively with WHCA*
+        self.cooperative = (CooperativePlanner(self.cost_field, self.traffic_manager.reservations,
+                                               window=cooperative_window)
+                            if cooperative_window else None)
         self.simulation_time = 0.0
         self.paths_history = []
-        # Initialize analyzer and renderer
-        self.analyzer = SimulationAnalyzer(grid_size)
-        self.renderer = SimulationRenderer(grid_size)
-
-    async def find_path(self, start: Tuple[int, int], goal: Tuple[int, int],
-                        constraints: Dict[str, float]) -> Optional[List[Tuple[int, int]]]:
-        def heuristic(pos: Tuple[int, int]) -> float:
-            return ((pos[0] - goal[0]) ** 2 + (pos[1] - goal[1]) ** 2) ** 0.5
+        # Query and tick instrumentation; off unless instrument is set or stats.enable() is called
+        self.stats = PlannerStats(enabled=instrument)
+        # Visualization modules are imported on first use; headless planners never load matplotlib
+        self.headless = headless
+        self._analyzer = None
+        self._renderer = None
 
-        open_set = [(0, start)]
-        heapq.heapify(open_set)
+    @property
+    def analyzer(self) -> 'SimulationAnalyzer':
+        if self._analyzer is None:
+            from ..visualization.analysis import SimulationAnalyzer
+            self._analyzer = SimulationAnalyzer(self.grid_size)
+        return self._analyzer
 
-        came_from = {}
-        g_score = {start: 0}
-        f_score = {start: heuristic(start)}
+    @property
+    def renderer(self) -> 'SimulationRenderer':
+        if self._renderer is None:
+            if self.headless:
+                raise RuntimeError("Headless planner has no renderer; use export_animation instead")
+            from ..visualization.renderer import SimulationRenderer
+            self._renderer = SimulationRenderer(self.grid_size)
+        return self._renderer
 
-        while open_set:
-            current = heapq.heappop(open_set)[1]
-
-            if current == goal:
-                path = []
-                while current in came_from:
-                    path.append(current)
-                    current = came_from[current]
-                path.append(start)
-                path.reverse()
-                return path
+    async def find_path(self, start: Tuple[int, int], goal: Tuple[int, int],
+                        constraints: Dict[str, float], timeout: Optional[float] = None,
+                        agent_id: Optional[str] = None) -> Optional[List[Tuple[int, int]]]:
+        """Path from ``start`` to ``goal``; ``agent_id`` only attributes the query in ``stats``"""
+        stats = self.stats
+        token = stats.begin_query() if stats.enabled else None
+        max_cost = constraints.get('max_cost', float('inf'))
+        use_flow_field = self._shares_goal_region(goal, max_cost)
+        key = (start, goal, max_cost, use_flow_field, self.cost_field.refresh())
+        path = self.route_cache.get(key)
+        source = "cache"
+        if path is None:
+            if use_flow_field:
+                path = await self._flow_field_path(start, goal, max_cost, timeout)
+                source = "flow_field"
+            elif self._is_long_trip(start, goal):
+                path = await self._on_hierarchy(max_cost, lambda graph: _route_cells(graph, start, goal))
+                source = "hierarchical"
+            if not path:
+                path = await self._search(start, goal, max_cost, timeout)
+                source = "search"
+            if path:
+                self.route_cache.put(key, path)
+        if token is not None:
+            stats.end_query(token, start, goal, path, source, agent_id, self.simulation_time)
+        return path
 
-            for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                neighbor = (current[0] + dx, current[1] + dy)
+    async def _search(self, start: Tuple[int, int], goal: Tuple[int, int], max_cost: float,
+                      timeout: Optional[float] = None) -> Optional[List[Tuple[int, int]]]:
+        if self._dispatcher is None:
+            self.cost_field.refresh()
+            # Off-loop searches run on other engines and go uncounted
+            counters = self.stats.search_counters if self.stats.enabled else None
+            return self.search_engine.search(self.cost_field, start, goal, max_cost, counters=counters)
+        return await self._dispatcher.search(self.cost_field, start, goal, max_cost, timeout)
 
-                if not (0 <= neighbor[0] < self.grid_size[0] and
-                        0 <= neighbor[1] < self.grid_size[1]):
-                    continue
+    def _is_long_trip(self, start: Tuple[int, int], goal: Tuple[int, int]) -> bool:
+        limit = self.hierarchical_min_distance
+        return limit is not None and max(abs(start[0] - goal[0]), abs(start[1] - goal[1])) >= limit
 
-                cell = self.grid[neighbor[0]][neighbor[1]]
-                move_cost = cell.traversal_cost(self.simulation_time)
+    def _hierarchy(self, max_cost: float) -> HierarchicalGraph:
+        graph = self._hierarchies.get(max_cost)
+        if graph is None:
+            graph = self._hierarchies[max_cost] = HierarchicalGraph(self.cost_field, max_cost)
+        return graph
 
-                if dx != 0 and dy != 0:
-                    move_cost *= 1.4142
+    async def _on_hierarchy(self, max_cost: float, work: Callable[[HierarchicalGraph], Any]) -> Any:
+        """Run ``work`` on the HPA* graph for ``max_cost``.
 
-                if move_cost > constraints.get('max_cost', float('inf')):
-                    continue
+        Inline it runs at once against the live costs. With an executor it
+        runs on a worker thread against a snapshot, one call per graph at a
+        time because searches fill the graph's cluster cache.
+        """
+        graph = self._hierarchy(max_cost)
+        if self._dispatcher is None:
+            graph.sync()
+            return work(graph)
+        lock = self._hierarchy_locks.get(max_cost)
+        if lock is None:
+            lock = self._hierarchy_locks[max_cost] = asyncio.Lock()
+        async with lock:
+            graph.sync(self.cost_field.snapshot())
+            future = self._dispatcher.submit(work, graph)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The next caller may only touch the graph once the worker is done with it
+                await asyncio.wait([future])
+                raise
 
-                tentative_g_score = g_score[current] + move_cost
+    def _shares_goal_region(self, goal: Tuple[int, int], max_cost: float) -> bool:
+        if self.flow_field_min_agents <= 0:
+            return False
+        if self._goal_groups is None:
+            self._goal_groups = Counter(
+                (self.flow_fields.region_key(agent.goal), agent.constraints.get('max_cost', float('inf')))
+                for agent in self.agents.values() if agent.status == "active"
+            )
+        key = (self.flow_fields.region_key(goal), max_cost)
+        return self._goal_groups[key] >= self.flow_field_min_agents and self._flow_field_fits(goal, max_cost)
 
-                if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tentative_g_score
-                    f_score[neighbor] = tentative_g_score + heuristic(neighbor)
-                    heapq.heappush(open_set, (f_score[neighbor], neighbor))
+    def _flow_field_fits(self, goal: Tuple[int, int], max_cost: float) -> bool:
+        """Whether the goal's field is cached, being integrated, or has room in the cache"""
+        fields = self.flow_fields
+        if fields.cached(goal, max_cost) is not None:
+            return True
+        pending = {key[:2] for key in self._pending_fields}
+        if (fields.region_key(goal), max_cost) in pending:
+            return True
+        return fields.has_room(goal, max_cost, reserved=len(pending))
 
-        return None
+    async def _flow_field_path(self, start: Tuple[int, int], goal: Tuple[int, int], max_cost: float,
+                               timeout: Optional[float] = None) -> Optional[List[Tuple[int, int]]]:
+        """Follow the goal region's shared field, then search the short hop to the exact goal"""
+        if self._dispatcher is None:
+            field = self.flow_fields.get(goal, max_cost)
+        else:
+            field = self.flow_fields.cached(goal, max_cost)
+            if field is None:
+                try:
+                    field = await asyncio.wait_for(asyncio.shield(self._integrate_flow_field(goal, max_cost)),
+                                                   timeout)
+                except asyncio.TimeoutError:
+                    return None
+        approach = field.path_from(start)
+        if approach is None:
+            return None
+        if approach[-1] == goal:
+            return approach
+        final_leg = await self._search(approach[-1], goal, max_cost, timeout)
+        if final_leg is None:
+            return None
+        return approach[:-1] + final_leg
 
     def add_dynamic_obstacle(self, obstacle: DynamicObstacle):
+        self.obstacle_store.add(obstacle)
         self.dynamic_obstacles.append(obstacle)
+        self.obstacle_index.update(obstacle)
 
     def add_agent(self, agent: Agent):
+        self.fleet.add(agent)
         self.agents[agent.id] = agent
+        self._goal_groups = None
 
     async def update(self, dt: float):
+        timer = self.stats.tick_timer(self.simulation_time + dt)
+        self._goal_groups = None
+        self._blocked_cells = None
+        await self._apply_replans()
         self.simulation_time += dt
+        reservations = self.traffic_manager.reservations
+        reservations.expire(reservations.tick_of(self.simulation_time))
+        timer.lap("replans")
+
+        if self.obstacle_store.step(dt):
+            self.dynamic_obstacles = [obstacle for obstacle in self.dynamic_obstacles
+                                      if obstacle._store is self.obstacle_store]
+        self.obstacle_index.sync(self.dynamic_obstacles)
+        timer.lap("obstacles")
+        self.weather_system.update(dt)
+        self.weather_system.push_to_grid(self.grid)
+        timer.lap("weather")
 
-        for obstacle in self.dynamic_obstacles:
-            obstacle.update(dt)
+        blocked_agents = self._blocked_agents()
+        blocked = len(blocked_agents)
+        timer.lap("blocked")
+        replans = 0
+        if self.cooperative is not None:
+            for agent in blocked_agents:
+                self.cooperative.invalidate(agent.id)
+            blocked_agents = []
+            replans = self._plan_cooperative()
 
         tasks = []
-        for agent in self.agents.values():
-            if agent.status == "active":
-                if self._check_path_blocked(agent):
-                    task = asyncio.create_task(self._replan_path(agent))
-                    tasks.append(task)
+        for agent in blocked_agents:
+            if self._dispatcher is None:
+                tasks.append(asyncio.create_task(self._replan_path(agent)))
+            else:
+                self._dispatch_replan(agent)
+            replans += 1
+        for agent_id in list(self._routes):
+            if agent_id in self._routes and self.agents[agent_id].status == "active":
+                await self._extend_route(self.agents[agent_id])
+        timer.lap("replans")
 
-                agent.update_position(dt)
-                current_pos = (int(agent.position[0]), int(agent.position[1]))
-                self.traffic_manager.update_congestion(current_pos)
+        moved = self.fleet.step(dt)
+        timer.lap("kinematics")
+        self.traffic_manager.accumulate(self.fleet.position[moved].astype(np.int64), dt)
+        if self.traffic_manager.feedback_threshold is not None:
+            self.traffic_manager.push_to_grid(self.grid)
+        timer.lap("congestion")
 
         if tasks:
             await asyncio.gather(*tasks)
+        if self._incremental:
+            for agent_id in [a for a in self._incremental if self.agents[a].status != "active"]:
+                del self._incremental[agent_id]
+        for agent_id in [a for a in self._routes if self.agents[a].status != "active"]:
+            del self._routes[agent_id]
+        timer.lap("replans")
+        timer.finish(blocked, replans)
+
+    def _blocked_agents(self) -> List[Agent]:
+        """Active agents whose next waypoint is covered by an obstacle, in fleet order"""
+        if not self.dynamic_obstacles:
+            return []
+        fleet = self.fleet
+        slots = fleet.active_slots()
+        slots = slots[fleet.cursor[slots] < fleet.path_end[slots]]
+        if len(slots) == 0:
+            return []
+        cells = fleet.next_waypoints(slots)
+        return fleet.views(slots[self.obstacle_index.blocked_mask(cells)].tolist())
 
     def _check_path_blocked(self, agent: Agent) -> bool:
-        if not agent.path:
-            return False
-        next_pos = agent.path[0]
-        return any(obs.affects_position(next_pos) for obs in self.dynamic_obstacles)
+        """Whether one agent's next waypoint is covered by an obstacle"""
+        next_pos = agent.next_waypoint
+        return next_pos is not None and self.obstacle_index.is_blocked(next_pos)
 
     async def _replan_path(self, agent: Agent):
         current_pos = (int(agent.position[0]), int(agent.position[1]))
-        new_path = await self.find_path(current_pos, agent.goal, agent.constraints)
+        # The old route's space-time claims no longer hold
+        self.traffic_manager.reservations.release(agent.id)
+        if self.replan_mode == "incremental":
+            self._routes.pop(agent.id, None)
+            new_path = self._incremental_replan(agent, current_pos)
+        else:
+            await self.route_agent(agent, current_pos)
+            return
         if new_path:
             agent.path = new_path
 
-    async def simulate(self, duration: float, dt: float = 0.1):
-        steps = int(duration / dt)
-        frames = []
-        for _ in range(steps):
-            await self.update(dt)
-            frames.append(self._get_simulation_state())
+    async def route_agent(self, agent: Agent, start: Optional[Tuple[int, int]] = None):
+        """Plan and assign the agent's path.
+
+        Long trips are routed over the cluster graph and only the first
+        segments are refined into cells; the rest are refined during
+        ``update`` as the agent gets close to them.
+        """
+        if start is None:
+            start = (int(agent.position[0]), int(agent.position[1]))
+        self._routes.pop(agent.id, None)
+        max_cost = agent.constraints.get('max_cost', float('inf'))
+        goal = agent.goal
+        if self._is_long_trip(start, goal) and not self._shares_goal_region(goal, max_cost):
+            route = await self._on_hierarchy(max_cost, lambda graph: graph.search_route(start, goal))
+            if route is not None and agent.goal == goal:
+                agent.path = []
+                self._routes[agent.id] = (route, goal, max_cost)
+                await self._extend_route(agent)
+                if agent.path:
+                    return
+        new_path = await self.find_path(start, agent.goal, agent.constraints, agent_id=agent.id)
+        if new_path:
+            agent.path = new_path
+
+    async def dispatch_batch(self, agents: List[Agent], weight: float = 1.0, max_expansions: int = 1000,
+                             time_limit: Optional[float] = None) -> CBSResult:
+        """Add ``agents`` and give them mutually collision-free paths with (E)CBS.
+
+        Schedules are reserved from the current tick and assume the planner
+        is stepped with ``dt`` equal to the reservation tick length. Agents
+        the solver could not place are routed on their own.
+        """
+        for agent in agents:
+            if agent.id not in self.agents:
+                self.add_agent(agent)
+        reservations = self.traffic_manager.reservations
+        solver = ConflictBasedSearch(self.cost_field, weight=weight, max_expansions=max_expansions,
+                                     time_limit=time_limit, tick_length=reservations.tick_length)
+        result = solver.solve(agents)
+        tick = reservations.tick_of(self.simulation_time)
+        for agent in agents:
+            reservations.release(agent.id)
+            self._routes.pop(agent.id, None)
+            self._incremental.pop(agent.id, None)
+            schedule = result.schedules.get(agent.id)
+            if schedule is None:
+                await self.route_agent(agent)
+                continue
+            agent.path = result.paths[agent.id]
+            for t, cell in schedule_cells(schedule):
+                reservations.reserve(agent.id, tick + t, cell)
+        return result
+
+    async def _extend_route(self, agent: Agent):
+        """Refine abstract segments until the agent has enough cells ahead of it"""
+        entry = self._routes[agent.id]
+        route, goal, max_cost = entry
+        if goal != agent.goal:
+            del self._routes[agent.id]
+            return
+        while agent.waypoints_left < REFINE_LOOKAHEAD and not route.exhausted:
+            segment = await self._on_hierarchy(max_cost, lambda graph: route.refine_next())
+            if self._routes.get(agent.id) is not entry:
+                return  # Re-routed while the segment was refined off the loop
+            if segment is None:
+                # The segment became impassable since the route was planned; finish with a plain search
+                del self._routes[agent.id]
+                path = agent.path
+                tail = path[-1] if path else (int(agent.position[0]), int(agent.position[1]))
+                rest = await self._search(tail, goal, max_cost)
+                if rest and agent.path == path:
+                    agent.extend_path(rest[1:] if path else rest)
+                return
+            agent.extend_path(segment if agent.waypoints_left else [route.nodes[0]] + segment)
+        if route.exhausted:
+            del self._routes[agent.id]
+
+    def _incremental_replan(self, agent: Agent, current_pos: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """Repair the agent's D* Lite search instead of searching from scratch"""
+        max_cost = agent.constraints.get('max_cost', float('inf'))
+        search = self._incremental.get(agent.id)
+        if search is None or search.goal != agent.goal or search.max_cost != max_cost:
+            search = self._incremental[agent.id] = DStarLite(self.cost_field, agent.goal, max_cost)
+        return search.plan(current_pos, self._obstacle_cells())
+
+    def _plan_cooperative(self) -> int:
+        """Re-plan the windows of agents that are due, highest priority first; returns how many"""
+        cooperative = self.cooperative
+        tick = cooperative.reservations.tick_of(self.simulation_time)
+        due = [agent for agent in self.agents.values()
+               if agent.status == "active" and cooperative.due(agent.id, tick)]
+        if not due:
+            return 0
+        blocked = self._obstacle_cells() if self.dynamic_obstacles else set()
+        for agent_id, path in cooperative.plan(due, tick, blocked).items():
+            self._routes.pop(agent_id, None)
+            self._incremental.pop(agent_id, None)
+            self.agents[agent_id].path = path
+        return len(due)
+
+    def _obstacle_cells(self) -> set:
+        """Flat indices of cells currently covered by a dynamic obstacle, cached per tick"""
+        if self._blocked_cells is None:
+            self._blocked_cells = self.obstacle_index.covered_cells(self.grid_size)
+        return self._blocked_cells
+
+    def _integrate_flow_field(self, goal: Tuple[int, int], max_cost: float) -> asyncio.Future:
+        """Integrate the goal region's field on a worker against a snapshot of the costs"""
+        snapshot = self.cost_field.snapshot()
+        key = (self.flow_fields.region_key(goal), max_cost, snapshot.version)
+        pending = self._pending_fields.get(key)
+        if pending is None:
+            pending = self._pending_fields[key] = self._dispatcher.submit(
+                FlowField, snapshot, self.flow_fields.region(goal), max_cost)
+
+            def done(future: asyncio.Future):
+                del self._pending_fields[key]
+                # A field for costs that changed meanwhile would never be used
+                if (not future.cancelled() and future.exception() is None
+                        and future.result().version == self.cost_field.version):
+                    self.flow_fields.put(goal, max_cost, future.result())
+            pending.add_done_callback(done)
+        return pending
+
+    def _dispatch_replan(self, agent: Agent):
+        if agent.id in self._pending_replans:
+            return
+        current_pos = (int(agent.position[0]), int(agent.position[1]))
+        task = asyncio.create_task(self.find_path(current_pos, agent.goal, agent.constraints,
+                                                  timeout=self.replan_timeout, agent_id=agent.id))
+        self._pending_replans[agent.id] = (task, agent.goal)
+
+    async def _apply_replans(self):
+        """Apply background replans at the tick boundary, in agent-id order.
+
+        Replans dispatched during the previous tick are waited for, for at
+        most ``replan_timeout`` seconds, so whether a result lands does not
+        depend on worker timing. A replan still running after that is
+        applied at a later boundary.
+        """
+        for agent_id in sorted(self._pending_replans):
+            task, goal = self._pending_replans[agent_id]
+            agent = self.agents.get(agent_id)
+            if agent is None or agent.status != "active" or agent.goal != goal:
+                task.cancel()
+                del self._pending_replans[agent_id]
+        if self._pending_replans:
+            await asyncio.wait([task for task, _ in self._pending_replans.values()],
+                               timeout=self.replan_timeout)
+
+        for agent_id in sorted(self._pending_replans):
+            task, goal = self._pending_replans[agent_id]
+            if not task.done():
+                continue
+            del self._pending_replans[agent_id]
+            agent = self.agents.get(agent_id)
+            if task.cancelled() or agent is None or agent.goal != goal:
+                continue
+            new_path = task.result()
+            if new_path:
+                self._routes.pop(agent_id, None)
+                self.traffic_manager.reservations.release(agent_id)
+                agent.path = new_path
+
+    def cancel_replan(self, agent_id: str):
+        """Drop an in-flight background replan, e.g. after changing the agent's goal"""
+        pending = self._pending_replans.pop(agent_id, None)
+        if pending:
+            pending[0].cancel()
+
+    def close(self):
+        """Cancel in-flight replans and shut down the worker pool"""
+        for agent_id in list(self._pending_replans):
+            self.cancel_replan(agent_id)
+        if self._dispatcher is not None:
+            self._dispatcher.close()
+
+    async def simulate(self, duration: float, dt: float = 0.1, max_frames: Optional[int] = None,
+                       trajectory_path: Optional[str] = None) -> FrameRecorder:
+        """Run the simulation and return its frames.
+
+        ``max_frames`` keeps only the newest frames in memory. With
+        ``trajectory_path`` every tick is also appended to an on-disk
+        trajectory, which widens as agents and obstacles are added.
+        """
+        frames = FrameRecorder(self.grid_size, max_frames=max_frames)
+        capture = frames.capture
+        writer = None
+        if trajectory_path is not None:
+            writer = TrajectoryWriter(trajectory_path, self.grid_size, max_agents=len(self.agents),
+                                      max_obstacles=len(self.dynamic_obstacles))
+
+            def capture(planner):
+                frames.capture(planner)
+                writer.append(planner)
+        try:
+            async for _ in self.simulate_stream(duration, dt, capture=capture):
+                pass
+        finally:
+            if writer is not None:
+                writer.close()
         return frames
 
-    def _get_simulation_state(self):
-        return {
-            'time': self.simulation_time,
-            'obstacles': self.dynamic_obstacles,
-            'agents': self.agents,
-            'congestion': dict(self.traffic_manager.congestion)
-        }
+    async def simulate_stream(self, duration: float, dt: float = 0.1, every: int = 1,
+                              buffer: int = 0,
+                              capture: Callable[['AdvancedPathPlanner'], Any] = snapshot_frame
+                              ) -> AsyncIterator[Any]:
+        """Run the simulation, yielding ``capture(self)`` every ``every`` ticks as it goes.
+
+        With ``buffer=0`` the simulation only advances while the consumer
+        asks for the next frame. With a buffer it runs in a background task
+        up to ``buffer`` frames ahead, then waits for the consumer. Leaving
+        the loop early stops the simulation.
+        """
+        steps = int(duration / dt)
+
+        async def frames():
+            for tick in range(steps):
+                await self.update(dt)
+                if (tick + 1) % every == 0:
+                    yield capture(self)
+
+        if buffer <= 0:
+            source = frames()
+            try:
+                async for frame in source:
+                    yield frame
+            finally:
+                await source.aclose()
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        done = object()
+
+        async def produce():
+            try:
+                async for frame in frames():
+                    await queue.put((frame, None))
+                await queue.put((done, None))
+            except Exception as error:
+                await queue.put((done, error))
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                frame, error = await queue.get()
+                if error is not None:
+                    raise error
+                if frame is done:
+                    return
+                yield frame
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
 
     def save_analysis(self, output_dir: str = "simulation_results") -> str:
         """Save comprehensive analysis of the simulation"""
@@ -150,4 +604,15 @@ class AdvancedPathPlanner:
             frames: List of simulation frames
             output_path: Optional path to save the animation as GIF
         """
-        self.renderer.create_animation(frames, self.grid, output_path=output_path)
\ No newline at end of file
+        self.renderer.create_animation(frames, self.grid, output_path=output_path)
+
+    def export_animation(self, frames, output_path: str, **options) -> int:
+        """Render frames headlessly to a GIF or raw video; see ``export_animation``"""
+        from ..visualization.export import export_animation
+        return export_animation(frames, self.grid, output_path, **options)
+
+
+def _route_cells(graph: HierarchicalGraph, start: Tuple[int, int],
+                 goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+    route = graph.search_route(start, goal)
+    return route.full_path() if route else None
@@ -0,0 +1,228 @@
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+from ..core.agents import AGENT_STATUSES
+
+
+class AgentFrame(NamedTuple):
+    id: str
+    position: Tuple[float, float]
+    status: str
+    goal: Tuple[int, int]
+    path: List[Tuple[int, int]]
+
+
+class ObstacleFrame(NamedTuple):
+    id: str
+    position: Tuple[float, float]
+    radius: float
+
+
+def snapshot_frame(planner) -> Dict:
+    """Copy of the planner's current state, shaped like a recorded frame"""
+    return {
+        'time': planner.simulation_time,
+        'obstacles': [ObstacleFrame(o.id, o.position, o.radius) for o in planner.dynamic_obstacles],
+        'agents': {a.id: AgentFrame(a.id, a.position, a.status, a.goal, list(a.path)) for a in planner.agents.values()},
+        'congestion': dict(planner.traffic_manager.congestion.items())
+    }
+
+
+class _Segment:
+    """A keyframe plus the frames delta-encoded against it, in preallocated arrays"""
+
+    def __init__(self, first: int, capacity: int, agent_ids: List[str], agent_slots: np.ndarray,
+                 obstacle_ids: List[str], obstacle_slots: np.ndarray):
+        n, m = len(agent_ids), len(obstacle_ids)
+        self.first = first
+        self.count = 0
+        self.agent_ids = agent_ids
+        self.agent_slots = agent_slots
+        self.obstacle_ids = obstacle_ids
+        self.obstacle_slots = obstacle_slots
+        self.obstacle_list = None
+        self.obstacle_count = 0
+        # Dense per-frame state
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.positions = np.zeros((capacity, n, 2), dtype=np.float32)
+        self.status = np.zeros((capacity, n), dtype=np.int8)
+        self.path_left = np.zeros((capacity, n), dtype=np.int32)
+        self.obstacle_positions = np.zeros((capacity, m, 2), dtype=np.float32)
+        self.obstacle_radius = np.zeros(m, dtype=np.float32)
+        # Keyframe state and per-frame changes to it
+        self.goals = np.zeros((n, 2), dtype=np.int32)
+        self.path_refs = np.zeros(n, dtype=np.int32)
+        self.congestion: Tuple[np.ndarray, np.ndarray] = (np.zeros(0, np.int64), np.zeros(0, np.int64))
+        self.path_changes: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.goal_changes: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.congestion_changes: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.paths: List[np.ndarray] = []
+
+    @property
+    def full(self) -> bool:
+        return self.count == len(self.times)
+
+
+class FrameRecorder(Sequence):
+    """Compact recording of a simulation, readable as a sequence of frames.
+
+    Every ``keyframe_interval`` frames (and whenever the agent or obstacle
+    set changes) a keyframe stores goals, paths and the congestion map in
+    full; the frames after it store positions and statuses in typed arrays
+    and only the paths, goals and congestion cells that changed. Indexing
+    rebuilds a frame dict shaped like ``AdvancedPathPlanner``'s live state,
+    holding ``AgentFrame``/``ObstacleFrame`` snapshots. With ``max_frames``
+    the recorder keeps only the newest frames, dropping whole keyframe
+    segments, so it holds between ``max_frames`` and
+    ``max_frames + keyframe_interval`` frames.
+    """
+
+    def __init__(self, grid_size: Tuple[int, int], keyframe_interval: int = 64,
+                 max_frames: Optional[int] = None):
+        self.grid_size = grid_size
+        self.keyframe_interval = keyframe_interval
+        self.max_frames = max_frames
+        self._segments: deque = deque()
+        self._frames = 0
+        self._dropped = 0
+        self._path_versions = np.zeros(0, dtype=np.int64)
+        self._goals = np.zeros((0, 2), dtype=np.int32)
+        self._congestion_count = 0
+
+    def __len__(self) -> int:
+        return self._frames - self._dropped
+
+    @property
+    def dropped(self) -> int:
+        """Frames evicted from the front in ring-buffer mode"""
+        return self._dropped
+
+    def capture(self, planner):
+        """Append the planner's current state as a new frame"""
+        fleet, store = planner.fleet, planner.obstacle_store
+        segment = self._segments[-1] if self._segments else None
+        agents = planner.agents
+        obstacles = planner.dynamic_obstacles
+        congestion_changes = planner.traffic_manager.changes_since(self._congestion_count)
+        if (segment is None or segment.full or len(segment.agent_ids) != len(agents)
+                or segment.obstacle_list is not obstacles or segment.obstacle_count != len(obstacles)
+                or congestion_changes is None):
+            segment = self._keyframe(planner)
+        else:
+            self._record_changes(segment, planner, congestion_changes)
+
+        k = segment.count
+        slots = segment.agent_slots
+        segment.times[k] = planner.simulation_time
+        segment.positions[k] = fleet.position[slots]
+        segment.status[k] = fleet.status[slots]
+        segment.path_left[k] = fleet.path_end[slots] - fleet.cursor[slots]
+        segment.obstacle_positions[k] = store.position[segment.obstacle_slots]
+        segment.count += 1
+        self._frames += 1
+        self._evict()
+
+    def _keyframe(self, planner) -> _Segment:
+        fleet, store = planner.fleet, planner.obstacle_store
+        agents = list(planner.agents.values())
+        obstacles = [o for o in planner.dynamic_obstacles if o._store is store]
+        segment = _Segment(self._frames, self.keyframe_interval,
+                           [a.id for a in agents], np.array([a._slot for a in agents], dtype=np.int64),
+                           [o.id for o in obstacles], np.array([o._slot for o in obstacles], dtype=np.int64))
+        # add_dynamic_obstacle appends to the same list, so its length is tracked too
+        segment.obstacle_list = planner.dynamic_obstacles
+        segment.obstacle_count = len(planner.dynamic_obstacles)
+        slots = segment.agent_slots
+        segment.obstacle_radius[:] = store.radius[segment.obstacle_slots]
+        segment.goals[:] = fleet.goal[slots]
+        segment.paths = [fleet.waypoints[fleet.cursor[s]:fleet.path_end[s]].copy() for s in slots.tolist()]
+        segment.path_refs[:] = np.arange(len(agents))
+        segment.path_changes.append(_EMPTY_CHANGE)
+        segment.goal_changes.append(_EMPTY_CHANGE)
+        segment.congestion_changes.append(_EMPTY_CHANGE)
+
+        traffic = planner.traffic_manager
+        self._congestion_count = traffic.change_count
+        levels = traffic.levels.reshape(-1)
+        cells = np.flatnonzero(levels)
+        segment.congestion = (cells, levels[cells])
+        self._path_versions = fleet.path_version[slots].copy()
+        self._goals = segment.goals.copy()
+        self._segments.append(segment)
+        return segment
+
+    def _record_changes(self, segment: _Segment, planner, congestion_changes: np.ndarray):
+        fleet = planner.fleet
+        slots = segment.agent_slots
+
+        versions = fleet.path_version[slots]
+        changed = np.flatnonzero(versions != self._path_versions)
+        refs = np.arange(len(segment.paths), len(segment.paths) + len(changed), dtype=np.int32)
+        for slot in slots[changed].tolist():
+            segment.paths.append(fleet.waypoints[fleet.cursor[slot]:fleet.path_end[slot]].copy())
+        self._path_versions[changed] = versions[changed]
+        segment.path_changes.append((changed, refs))
+
+        goals = fleet.goal[slots]
+        moved = np.flatnonzero((goals != self._goals).any(axis=1))
+        self._goals[moved] = goals[moved]
+        segment.goal_changes.append((moved, goals[moved]))
+
+        traffic = planner.traffic_manager
+        self._congestion_count = traffic.change_count
+        segment.congestion_changes.append((congestion_changes, traffic.levels.reshape(-1)[congestion_changes]))
+
+    def _evict(self):
+        if self.max_frames is None:
+            return
+        while len(self._segments) > 1 and len(self) - self._segments[0].count >= self.max_frames:
+            self._dropped += self._segments.popleft().count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("frame index out of range")
+        absolute = index + self._dropped
+        for segment in self._segments:
+            if absolute < segment.first + segment.count:
+                return self._decode(segment, absolute - segment.first)
+        raise IndexError("frame index out of range")
+
+    def _decode(self, segment: _Segment, k: int) -> Dict:
+        refs = segment.path_refs.copy()
+        goals = segment.goals.copy()
+        congestion = dict(zip(segment.congestion[0].tolist(), segment.congestion[1].tolist()))
+        for j in range(1, k + 1):
+            agents, new_refs = segment.path_changes[j]
+            refs[agents] = new_refs
+            agents, new_goals = segment.goal_changes[j]
+            goals[agents] = new_goals
+            congestion.update(zip(*(a.tolist() for a in segment.congestion_changes[j])))
+
+        height = self.grid_size[1]
+        agent_frames = {}
+        for i, agent_id in enumerate(segment.agent_ids):
+            left = int(segment.path_left[k, i])
+            path = segment.paths[refs[i]]
+            x, y = segment.positions[k, i].tolist()
+            agent_frames[agent_id] = AgentFrame(
+                agent_id, (x, y), AGENT_STATUSES[segment.status[k, i]], tuple(goals[i].tolist()),
+                [tuple(p) for p in path[len(path) - left:].tolist()] if left else []
+            )
+        obstacle_frames = [
+            ObstacleFrame(obstacle_id, tuple(segment.obstacle_positions[k, i].tolist()),
+                          float(segment.obstacle_radius[i]))
+            for i, obstacle_id in enumerate(segment.obstacle_ids)
+        ]
+        return {
+            'time': float(segment.times[k]),
+            'obstacles': obstacle_frames,
+            'agents': agent_frames,
+            'congestion': {divmod(cell, height): level for cell, level in congestion.items() if level}
+        }
+
+
+_EMPTY_CHANGE = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32))
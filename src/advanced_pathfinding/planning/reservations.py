@@ -0,0 +1,220 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+import heapq
+
+# Length of one reservation tick in simulation seconds
+TICK_LENGTH = 0.1
+
+
+class ReservationTable:
+    """Space-time reservations keyed by integer tick and flat cell index.
+
+    Every claim is one int key in a dict, so reserving, checking and
+    releasing a cell at a tick are O(1). A vertex key is
+    ``tick * stride + cell``; moves get their own keys in the same tick
+    (``tick * stride + cells + cell * 9 + direction``) so two agents
+    swapping cells can be caught. Each agent's keys and each tick's keys
+    are tracked as well, and a min-heap orders the ticks that have keys,
+    which makes dropping an agent's claims when it replans and expiring
+    past ticks proportional to what is removed.
+
+    ``hold`` parks an agent on one cell from a tick onwards with no end, so
+    an agent waiting where its window ran out is never planned through
+    before its own next turn. Each agent has at most one hold, and
+    ``release`` drops it with the rest of the agent's claims.
+    """
+
+    def __init__(self, grid_size: Tuple[int, int], tick_length: float = TICK_LENGTH):
+        self.grid_size = (int(grid_size[0]), int(grid_size[1]))
+        self.tick_length = tick_length
+        self._cells = self.grid_size[0] * self.grid_size[1]
+        self._stride = self._cells * 10
+        self._owners: Dict[int, str] = {}
+        self._by_agent: Dict[str, Set[int]] = {}
+        self._by_tick: Dict[int, List[int]] = {}
+        # Min-heap of the ticks in _by_tick
+        self._ticks: List[int] = []
+        # Open-ended claims: cell -> (agent, first tick), and each agent's held cell
+        self._holds: Dict[int, Tuple[str, int]] = {}
+        self._held: Dict[str, int] = {}
+        # Ticks before this have been expired
+        self.horizon = 0
+
+    def __len__(self) -> int:
+        return len(self._owners)
+
+    def tick_of(self, time: float) -> int:
+        """Tick containing the simulation time ``time``"""
+        return int(round(time / self.tick_length))
+
+    def cell_index(self, pos: Tuple[int, int]) -> int:
+        return pos[0] * self.grid_size[1] + pos[1]
+
+    def _vertex(self, tick: int, cell: int) -> int:
+        return tick * self._stride + cell
+
+    def _edge(self, tick: int, a: Tuple[int, int], b: Tuple[int, int]) -> int:
+        direction = (b[0] - a[0] + 1) * 3 + (b[1] - a[1] + 1)
+        return tick * self._stride + self._cells + self.cell_index(a) * 9 + direction
+
+    def _claim(self, agent_id: str, tick: int, key: int) -> bool:
+        owner = self._owners.get(key)
+        if owner is not None:
+            return owner == agent_id
+        if tick < self.horizon:
+            return True  # The past is never contested
+        self._owners[key] = agent_id
+        self._by_agent.setdefault(agent_id, set()).add(key)
+        keys = self._by_tick.get(tick)
+        if keys is None:
+            keys = self._by_tick[tick] = []
+            heapq.heappush(self._ticks, tick)
+        keys.append(key)
+        return True
+
+    def reserve(self, agent_id: str, tick: int, pos: Tuple[int, int]) -> bool:
+        """Claim ``pos`` at ``tick``; False when another agent already holds it"""
+        cell = self.cell_index(pos)
+        if self._held_by(cell, tick) not in (None, agent_id):
+            return False
+        return self._claim(agent_id, tick, self._vertex(tick, cell))
+
+    def hold(self, agent_id: str, pos: Tuple[int, int], from_tick: int) -> bool:
+        """Claim ``pos`` from ``from_tick`` on, replacing the agent's previous hold.
+
+        False when another agent already holds the cell.
+        """
+        cell = self.cell_index(pos)
+        held = self._holds.get(cell)
+        if held is not None and held[0] != agent_id:
+            return False
+        self._drop_hold(agent_id)
+        self._holds[cell] = (agent_id, from_tick)
+        self._held[agent_id] = cell
+        return True
+
+    def _held_by(self, cell: int, tick: int) -> Optional[str]:
+        held = self._holds.get(cell)
+        return held[0] if held is not None and tick >= held[1] else None
+
+    def _drop_hold(self, agent_id: str):
+        cell = self._held.pop(agent_id, None)
+        if cell is not None:
+            del self._holds[cell]
+
+    def reserve_path(self, agent_id: str, path: Sequence[Tuple[int, int]], start_tick: int = 0,
+                     hold: int = 0) -> bool:
+        """Claim ``path[i]`` at ``start_tick + i`` and each move between them.
+
+        The last cell stays claimed for ``hold`` more ticks. Claims already
+        held by other agents are skipped; returns False if there were any.
+        """
+        ok = True
+        previous = None
+        for i, pos in enumerate(path):
+            tick = start_tick + i
+            ok &= self.reserve(agent_id, tick, pos)
+            if previous is not None and previous != pos:
+                ok &= self._claim(agent_id, tick, self._edge(tick, previous, pos))
+            previous = pos
+        if path:
+            for tick in range(start_tick + len(path), start_tick + len(path) + hold):
+                ok &= self.reserve(agent_id, tick, path[-1])
+        return ok
+
+    def owner(self, tick: int, pos: Tuple[int, int]) -> Optional[str]:
+        cell = self.cell_index(pos)
+        owner = self._owners.get(self._vertex(tick, cell))
+        return owner if owner is not None else self._held_by(cell, tick)
+
+    def is_reserved(self, tick: int, pos: Tuple[int, int], agent_id: Optional[str] = None) -> bool:
+        """Whether ``pos`` is claimed at ``tick`` by someone other than ``agent_id``"""
+        owner = self.owner(tick, pos)
+        return owner is not None and owner != agent_id
+
+    def move_conflicts(self, tick: int, a: Tuple[int, int], b: Tuple[int, int],
+                       agent_id: Optional[str] = None) -> bool:
+        """Whether moving from ``a`` into ``b`` during ``tick`` hits another agent's claim.
+
+        That is the case when ``b`` is taken at ``tick`` or another agent
+        moves from ``b`` into ``a`` during the same tick.
+        """
+        if self.is_reserved(tick, b, agent_id):
+            return True
+        if a == b:
+            return False
+        owner = self._owners.get(self._edge(tick, b, a))
+        return owner is not None and owner != agent_id
+
+    def is_free(self, pos: Tuple[int, int], first_tick: int, last_tick: int,
+                agent_id: Optional[str] = None) -> bool:
+        """Whether ``pos`` is unclaimed by others for every tick in ``[first_tick, last_tick]``"""
+        cell = self.cell_index(pos)
+        held = self._holds.get(cell)
+        if held is not None and held[0] != agent_id and held[1] <= last_tick:
+            return False
+        for tick in range(max(first_tick, self.horizon), last_tick + 1):
+            owner = self._owners.get(self._vertex(tick, cell))
+            if owner is not None and owner != agent_id:
+                return False
+        return True
+
+    def reservations(self, first_tick: int, last_tick: int) -> Iterator[Tuple[int, Tuple[int, int], str]]:
+        """``(tick, cell, agent_id)`` for every cell claim in ``[first_tick, last_tick]``"""
+        height = self.grid_size[1]
+        for tick in range(max(first_tick, self.horizon), last_tick + 1):
+            # A key released and claimed again is listed twice
+            for key in dict.fromkeys(self._by_tick.get(tick, ())):
+                cell = key - tick * self._stride
+                owner = self._owners.get(key)
+                if cell < self._cells and owner is not None:
+                    yield tick, divmod(cell, height), owner
+            for cell, (owner, from_tick) in self._holds.items():
+                if tick >= from_tick and self._vertex(tick, cell) not in self._owners:
+                    yield tick, divmod(cell, height), owner
+
+    def agent_reservations(self, agent_id: str) -> int:
+        return len(self._by_agent.get(agent_id, ()))
+
+    def release(self, agent_id: str, from_tick: Optional[int] = None) -> int:
+        """Drop the agent's claims (only those at or after ``from_tick`` if given); returns the count"""
+        cell = self._held.get(agent_id)
+        if cell is not None and (from_tick is None or self._holds[cell][1] >= from_tick):
+            self._drop_hold(agent_id)
+        keys = self._by_agent.get(agent_id)
+        if not keys:
+            return 0
+        if from_tick is not None:
+            first = from_tick * self._stride
+            dropped = {key for key in keys if key >= first}
+            keys -= dropped
+        else:
+            dropped = keys
+            del self._by_agent[agent_id]
+        for key in dropped:
+            del self._owners[key]
+        # _by_tick may keep released keys; expire skips them
+        return len(dropped)
+
+    def expire(self, before_tick: int) -> int:
+        """Forget every claim before ``before_tick``; returns how many were dropped"""
+        dropped = 0
+        ticks = self._ticks
+        while ticks and ticks[0] < before_tick:
+            for key in self._by_tick.pop(heapq.heappop(ticks)):
+                agent_id = self._owners.pop(key, None)
+                if agent_id is not None:
+                    keys = self._by_agent[agent_id]
+                    keys.discard(key)
+                    if not keys:
+                        del self._by_agent[agent_id]
+                    dropped += 1
+        self.horizon = max(self.horizon, before_tick)
+        return dropped
+
+    def clear(self):
+        self._holds.clear()
+        self._held.clear()
+        self._owners.clear()
+        self._by_agent.clear()
+        self._by_tick.clear()
+        self._ticks.clear()
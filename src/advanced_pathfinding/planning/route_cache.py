@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import time
+
+Path = List[Tuple[int, int]]
+
+
+class RouteCache:
+    """Bounded LRU of found routes, evicted by size and optionally by age.
+
+    Callers key entries on everything the route depends on (endpoints,
+    constraint values and the cost-field version), so a version bump
+    naturally retires stale routes. Routes are stored as immutable tuples
+    and every hit hands out a fresh list. Agents copy a route into their
+    fleet's waypoint buffer, but ``find_path`` returns the list itself,
+    and edits a caller makes to it must never reach the shared entry.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_age: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._clock = clock
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Tuple[Tuple[int, int], ...]]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Path]:
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(entry[0]):
+            del self._entries[key]
+            self.evictions += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return list(entry[1])
+
+    def put(self, key: Hashable, path: Path):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (self._clock(), tuple(path))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def prune(self) -> int:
+        """Drop every expired entry and return how many were removed"""
+        expired = [key for key, (stored, _) in self._entries.items() if self._expired(stored)]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+        return len(expired)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _expired(self, stored: float) -> bool:
+        return self.max_age is not None and self._clock() - stored > self.max_age
@@ -0,0 +1,319 @@
+from typing import Callable, List, Tuple, Optional
+import functools
+import heapq
+import importlib.util
+import numpy as np
+from .cost_field import CostField
+
+# numba is optional; without it FlatAStar falls back to a Python loop
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+
+NEIGHBOR_OFFSETS = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+DIAGONAL_FACTOR = 1.4142
+_OFFSETS = tuple(NEIGHBOR_OFFSETS)
+# Searches poll their cancel flag once per this many heap pops
+CANCEL_CHECK_INTERVAL = 1024
+_NEVER_CANCELLED = np.zeros(1, dtype=np.uint8)
+# Slots of the ``counters`` array searches add their work to
+SEARCH_COUNTERS = ("expanded", "pushes", "pops", "stale")
+
+
+class ReferenceAStar:
+    """Dictionary-based A* over (x, y) tuples; the original search loop"""
+
+    def __init__(self, grid_size: Tuple[int, int]):
+        self.grid_size = grid_size
+
+    def search(self, cost_field: CostField, start: Tuple[int, int], goal: Tuple[int, int],
+               max_cost: float = float('inf'), cancel: Optional[np.ndarray] = None,
+               counters: Optional[np.ndarray] = None) -> Optional[List[Tuple[int, int]]]:
+        """A* path from ``start`` to ``goal``; work done is added to ``counters`` if given"""
+        if cancel is None:
+            cancel = _NEVER_CANCELLED
+        pops = pushes = stale = 0
+        path = None
+
+        def heuristic(pos: Tuple[int, int]) -> float:
+            return ((pos[0] - goal[0]) ** 2 + (pos[1] - goal[1]) ** 2) ** 0.5
+
+        costs = cost_field.values
+        open_set = [(0, start)]
+        heapq.heapify(open_set)
+
+        came_from = {}
+        g_score = {start: 0}
+        f_score = {start: heuristic(start)}
+
+        while open_set:
+            f, current = heapq.heappop(open_set)
+            pops += 1
+            if pops % CANCEL_CHECK_INTERVAL == 0 and cancel[0]:
+                break
+            # Superseded entries are expanded again, as the original loop did
+            if f > f_score[current]:
+                stale += 1
+
+            if current == goal:
+                path = []
+                while current in came_from:
+                    path.append(current)
+                    current = came_from[current]
+                path.append(start)
+                path.reverse()
+                break
+
+            for dx, dy in NEIGHBOR_OFFSETS:
+                neighbor = (current[0] + dx, current[1] + dy)
+
+                if not (0 <= neighbor[0] < self.grid_size[0] and
+                        0 <= neighbor[1] < self.grid_size[1]):
+                    continue
+
+                move_cost = costs[neighbor]
+
+                if dx != 0 and dy != 0:
+                    move_cost *= DIAGONAL_FACTOR
+
+                if move_cost > max_cost:
+                    continue
+
+                tentative_g_score = g_score[current] + move_cost
+
+                if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g_score
+                    f_score[neighbor] = tentative_g_score + heuristic(neighbor)
+                    heapq.heappush(open_set, (f_score[neighbor], neighbor))
+                    pushes += 1
+
+        if counters is not None:
+            _count(counters, pops - (path is not None), pushes + 1, pops, stale)
+        return path
+
+
+class FlatAStar:
+    """A* over flat cell indices (``x * height + y``) with reusable bookkeeping.
+
+    g-costs, parents and the closed set live in preallocated arrays that are
+    shared by all queries; a per-query generation stamp marks which entries
+    are valid, so nothing is cleared between searches. Heap entries whose
+    cell was already expanded are dropped when popped (lazy deletion). Ties
+    break on the flat index, which orders cells exactly like (x, y) tuples,
+    so results match ReferenceAStar on the same cost field.
+
+    When numba is installed the loop runs as a compiled kernel over the same
+    arrays (releasing the GIL); ``use_jit=False`` forces the pure-Python loop.
+    Setting ``cancel[0]`` from another thread aborts a running search.
+    Nodes expanded, heap pushes, pops and stale pops are added to the
+    ``counters`` array (see ``SEARCH_COUNTERS``) when one is passed.
+    """
+
+    def __init__(self, grid_size: Tuple[int, int], use_jit: bool = True):
+        self.grid_size = grid_size
+        self.use_jit = use_jit and _astar_kernel is not None
+        size = grid_size[0] * grid_size[1]
+        self.g_cost = np.zeros(size, dtype=np.float64)
+        self.parent = np.full(size, -1, dtype=np.int64)
+        self.seen = np.zeros(size, dtype=np.uint32)
+        self.closed = np.zeros(size, dtype=np.uint32)
+        self.generation = 0
+        # Kernel counters when the caller keeps none
+        self._counters = np.zeros(len(SEARCH_COUNTERS), dtype=np.int64)
+
+    def _next_generation(self) -> int:
+        self.generation += 1
+        if self.generation >= np.iinfo(np.uint32).max:
+            self.seen[:] = 0
+            self.closed[:] = 0
+            self.generation = 1
+        return self.generation
+
+    def search(self, cost_field: CostField, start: Tuple[int, int], goal: Tuple[int, int],
+               max_cost: float = float('inf'), cancel: Optional[np.ndarray] = None,
+               counters: Optional[np.ndarray] = None) -> Optional[List[Tuple[int, int]]]:
+        if cancel is None:
+            cancel = _NEVER_CANCELLED
+        gen = self._next_generation()
+        if self.use_jit:
+            found = _astar_kernel(cost_field.costs.reshape(-1), self.grid_size[0], self.grid_size[1],
+                                  start[0], start[1], goal[0], goal[1], float(max_cost),
+                                  self.g_cost, self.parent, self.seen, self.closed, gen, cancel,
+                                  self._counters if counters is None else counters)
+            return self._reconstruct(goal[0] * self.grid_size[1] + goal[1]) if found else None
+
+        width, height = self.grid_size
+        costs = cost_field.costs.reshape(-1).data
+        g_cost = self.g_cost.data
+        parent = self.parent.data
+        seen = self.seen.data
+        closed = self.closed.data
+
+        gx, gy = goal
+        start_index = start[0] * height + start[1]
+        goal_index = gx * height + gy
+        offsets = [(dx, dy, dx * height + dy, dx != 0 and dy != 0) for dx, dy in NEIGHBOR_OFFSETS]
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        g_cost[start_index] = 0
+        parent[start_index] = -1
+        seen[start_index] = gen
+        open_set = [(0, start_index)]
+        pops = pushes = stale = expanded = 0
+        found = False
+
+        while open_set:
+            current = heappop(open_set)[1]
+            pops += 1
+            if pops % CANCEL_CHECK_INTERVAL == 0 and cancel[0]:
+                break
+            if closed[current] == gen:
+                stale += 1
+                continue
+            if current == goal_index:
+                found = True
+                break
+            closed[current] = gen
+            expanded += 1
+
+            x, y = divmod(current, height)
+            current_g = g_cost[current]
+            for dx, dy, delta, diagonal in offsets:
+                nx = x + dx
+                ny = y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+
+                neighbor = current + delta
+                move_cost = costs[neighbor]
+                if diagonal:
+                    move_cost *= DIAGONAL_FACTOR
+                if move_cost > max_cost:
+                    continue
+
+                tentative = current_g + move_cost
+                if seen[neighbor] != gen or tentative < g_cost[neighbor]:
+                    seen[neighbor] = gen
+                    closed[neighbor] = 0
+                    g_cost[neighbor] = tentative
+                    parent[neighbor] = current
+                    heappush(open_set, (tentative + ((nx - gx) ** 2 + (ny - gy) ** 2) ** 0.5, neighbor))
+                    pushes += 1
+
+        if counters is not None:
+            _count(counters, expanded, pushes + 1, pops, stale)
+        return self._reconstruct(goal_index) if found else None
+
+    def _reconstruct(self, index: int) -> List[Tuple[int, int]]:
+        height = self.grid_size[1]
+        parent = self.parent.data
+        path = []
+        while index != -1:
+            path.append(divmod(index, height))
+            index = parent[index]
+        path.reverse()
+        return path
+
+
+def _count(counters, expanded, pushes, pops, stale):
+    counters[0] += expanded
+    counters[1] += pushes
+    counters[2] += pops
+    counters[3] += stale
+
+
+def _astar_loop(costs, width, height, sx, sy, gx, gy, max_cost, g_cost, parent, seen, closed, gen, cancel,
+                counters):
+    """FlatAStar's search loop in a form numba can compile"""
+    start_index = sx * height + sy
+    goal_index = gx * height + gy
+    g_cost[start_index] = 0.0
+    parent[start_index] = -1
+    seen[start_index] = gen
+    open_set = [(0.0, start_index)]
+    pops = 0
+    pushes = 1
+    stale = 0
+    expanded = 0
+    found = False
+
+    while len(open_set) > 0:
+        current = heapq.heappop(open_set)[1]
+        pops += 1
+        if pops % CANCEL_CHECK_INTERVAL == 0 and cancel[0]:
+            break
+        if closed[current] == gen:
+            stale += 1
+            continue
+        if current == goal_index:
+            found = True
+            break
+        closed[current] = gen
+        expanded += 1
+
+        x = current // height
+        y = current - x * height
+        current_g = g_cost[current]
+        for offset in _OFFSETS:
+            dx = offset[0]
+            dy = offset[1]
+            nx = x + dx
+            ny = y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+
+            neighbor = current + dx * height + dy
+            move_cost = costs[neighbor]
+            if dx != 0 and dy != 0:
+                move_cost *= DIAGONAL_FACTOR
+            if move_cost > max_cost:
+                continue
+
+            tentative = current_g + move_cost
+            if seen[neighbor] != gen or tentative < g_cost[neighbor]:
+                seen[neighbor] = gen
+                closed[neighbor] = 0
+                g_cost[neighbor] = tentative
+                parent[neighbor] = current
+                heapq.heappush(open_set, (tentative + ((nx - gx) ** 2 + (ny - gy) ** 2) ** 0.5, neighbor))
+                pushes += 1
+
+    counters[0] += expanded
+    counters[1] += pushes
+    counters[2] += pops
+    counters[3] += stale
+    return found
+
+
+def lazy_njit(loop: Callable) -> Optional[Callable]:
+    """``loop`` compiled by numba on its first call, or None without numba.
+
+    numba takes longer to import than the rest of the package, so it is only
+    loaded once a kernel actually runs.
+    """
+    if not HAVE_NUMBA:
+        return None
+    compiled: List[Callable] = []
+
+    @functools.wraps(loop)
+    def kernel(*args):
+        if not compiled:
+            from numba import njit
+            compiled.append(njit(cache=True, nogil=True)(loop))
+        return compiled[0](*args)
+    return kernel
+
+
+_astar_kernel = lazy_njit(_astar_loop)
+
+
+SEARCH_BACKENDS = {
+    "reference": ReferenceAStar,
+    "flat": FlatAStar,
+}
+
+
+def create_search_backend(name: str, grid_size: Tuple[int, int]):
+    try:
+        return SEARCH_BACKENDS[name](grid_size)
+    except KeyError:
+        raise ValueError(f"Unknown search backend: {name!r}") from None
@@ -0,0 +1,251 @@
+from collections import Counter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import heapq
+import json
+import math
+import time
+import numpy as np
+from .search import SEARCH_COUNTERS
+
+# Parts of AdvancedPathPlanner.update that are timed separately
+TICK_PHASES = ("obstacles", "weather", "blocked", "replans", "kinematics", "congestion")
+# Where a find_path result came from
+QUERY_SOURCES = ("cache", "flow_field", "hierarchical", "search")
+
+
+class QueryRecord(NamedTuple):
+    agent_id: Optional[str]
+    start: Tuple[int, int]
+    goal: Tuple[int, int]
+    source: str
+    elapsed: float
+    length: int
+    expanded: int
+    pushes: int
+    pops: int
+    stale: int
+    time: float
+
+
+class TickRecord(NamedTuple):
+    tick: int
+    time: float
+    elapsed: float
+    phases: Dict[str, float]
+    blocked: int
+    replans: int
+    queries: int
+
+
+class Histogram:
+    """Counts of non-negative values in power-of-two buckets.
+
+    Bucket ``e`` holds values in ``[2**(e-1), 2**e)``, so a histogram stays a
+    few dozen ints however many values it sees; zeros get their own bucket.
+    """
+
+    __slots__ = ("unit", "buckets", "count", "total", "max")
+
+    def __init__(self, unit: str = ""):
+        self.unit = unit
+        self.buckets: Counter = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.buckets[math.frexp(value)[1] if value > 0 else None] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict:
+        buckets = [{"le": 0.0, "count": self.buckets[None]}] if self.buckets[None] else []
+        buckets += [{"le": 2.0 ** e, "count": n} for e, n in sorted(
+            (e, n) for e, n in self.buckets.items() if e is not None)]
+        return {"unit": self.unit, "count": self.count, "total": self.total, "mean": self.mean,
+                "max": self.max, "buckets": buckets}
+
+
+class PlannerStats:
+    """Opt-in counters and timers for ``find_path`` queries and ``update`` ticks.
+
+    While ``enabled`` is False the planner only checks the flag, once per
+    query and once per tick. Enabled, every query is timed and its A* work
+    (nodes expanded, heap pushes, pops and stale pops) counted; every tick
+    is split into ``TICK_PHASES``. Values go into ``Histogram``s, the
+    ``keep_slowest`` slowest queries are kept whole, and query time is
+    totalled per agent and per ``region_size`` block of the goal so slow
+    queries can be traced back. ``on_tick`` is called with each
+    ``TickRecord``; ``to_dict``/``save`` export everything as JSON.
+    """
+
+    def __init__(self, enabled: bool = False, on_tick: Optional[Callable[[TickRecord], None]] = None,
+                 region_size: int = 16, keep_slowest: int = 32):
+        self.enabled = enabled
+        self.on_tick = on_tick
+        self.region_size = region_size
+        self.keep_slowest = keep_slowest
+        # Searches add their work here while the planner is instrumented
+        self.search_counters = np.zeros(len(SEARCH_COUNTERS), dtype=np.int64)
+        self.reset()
+
+    def enable(self, on_tick: Optional[Callable[[TickRecord], None]] = None):
+        self.enabled = True
+        if on_tick is not None:
+            self.on_tick = on_tick
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        self.queries = 0
+        self.ticks = 0
+        self.sources: Counter = Counter()
+        self.totals = dict.fromkeys(SEARCH_COUNTERS, 0)
+        self.phase_time = dict.fromkeys(TICK_PHASES, 0.0)
+        self.histograms: Dict[str, Histogram] = {
+            "query_ms": Histogram("ms"),
+            "expanded": Histogram("nodes"),
+            "path_length": Histogram("cells"),
+            "tick_ms": Histogram("ms"),
+        }
+        for phase in TICK_PHASES:
+            self.histograms[f"{phase}_ms"] = Histogram("ms")
+        self.last_tick: Optional[TickRecord] = None
+        self._slowest: List[Tuple[float, int, QueryRecord]] = []
+        self._agents: Dict[str, List[float]] = {}
+        self._regions: Dict[Tuple[int, int], List[float]] = {}
+
+    def begin_query(self) -> Tuple[float, np.ndarray]:
+        return time.perf_counter(), self.search_counters.copy()
+
+    def end_query(self, token: Tuple[float, np.ndarray], start: Tuple[int, int], goal: Tuple[int, int],
+                  path: Optional[List[Tuple[int, int]]], source: str,
+                  agent_id: Optional[str] = None, sim_time: float = 0.0) -> QueryRecord:
+        began, before = token
+        elapsed = time.perf_counter() - began
+        work = (self.search_counters - before).tolist()
+        record = QueryRecord(agent_id, start, goal, source, elapsed, len(path) if path else 0, *work, sim_time)
+        self.queries += 1
+        self.sources[source] += 1
+        for name, value in zip(SEARCH_COUNTERS, work):
+            self.totals[name] += value
+        histograms = self.histograms
+        histograms["query_ms"].add(elapsed * 1000)
+        histograms["expanded"].add(record.expanded)
+        histograms["path_length"].add(record.length)
+
+        entry = (elapsed, self.queries, record)
+        if len(self._slowest) < self.keep_slowest:
+            heapq.heappush(self._slowest, entry)
+        elif elapsed > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+        if agent_id is not None:
+            _tally(self._agents, agent_id, elapsed, record.expanded)
+        _tally(self._regions, (goal[0] // self.region_size, goal[1] // self.region_size),
+               elapsed, record.expanded)
+        return record
+
+    def tick_timer(self, sim_time: float) -> '_TickTimer':
+        """Timer for one ``update``; a no-op one while disabled"""
+        return _TickTimer(self, sim_time) if self.enabled else _NULL_TIMER
+
+    def _end_tick(self, sim_time: float, elapsed: float, phases: Dict[str, float], blocked: int,
+                  replans: int, queries: int):
+        record = TickRecord(self.ticks, sim_time, elapsed, phases, blocked, replans, queries)
+        self.ticks += 1
+        self.histograms["tick_ms"].add(elapsed * 1000)
+        for phase, seconds in phases.items():
+            self.phase_time[phase] += seconds
+            self.histograms[f"{phase}_ms"].add(seconds * 1000)
+        self.last_tick = record
+        if self.on_tick is not None:
+            self.on_tick(record)
+
+    def slowest_queries(self, n: Optional[int] = None) -> List[QueryRecord]:
+        """The slowest recorded queries, slowest first"""
+        records = [record for _, _, record in sorted(self._slowest, reverse=True)]
+        return records[:n] if n is not None else records
+
+    def agents(self) -> Dict[str, Dict[str, float]]:
+        """Query count, seconds and nodes expanded per agent, most time first"""
+        return _ranked(self._agents)
+
+    def regions(self) -> Dict[Tuple[int, int], Dict[str, float]]:
+        """Query count, seconds and nodes expanded per goal region, most time first"""
+        return _ranked(self._regions)
+
+    def to_dict(self) -> Dict:
+        return {
+            "queries": self.queries,
+            "ticks": self.ticks,
+            "sources": dict(self.sources),
+            "search": self.totals,
+            "phase_seconds": self.phase_time,
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            "slowest_queries": [record._asdict() for record in self.slowest_queries()],
+            "agents": self.agents(),
+            "region_size": self.region_size,
+            "regions": [{"region": list(key), **totals} for key, totals in self.regions().items()],
+        }
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class _TickTimer:
+    """Splits one tick's wall time into phases as ``lap`` is called after each"""
+
+    __slots__ = ("stats", "sim_time", "queries", "began", "last", "phases")
+
+    def __init__(self, stats: PlannerStats, sim_time: float):
+        self.stats = stats
+        self.sim_time = sim_time
+        self.queries = stats.queries
+        self.began = self.last = time.perf_counter()
+        self.phases = dict.fromkeys(TICK_PHASES, 0.0)
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] += now - self.last
+        self.last = now
+
+    def finish(self, blocked: int = 0, replans: int = 0):
+        stats = self.stats
+        stats._end_tick(self.sim_time, self.last - self.began, self.phases, blocked, replans,
+                        stats.queries - self.queries)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def lap(self, phase: str):
+        pass
+
+    def finish(self, blocked: int = 0, replans: int = 0):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _tally(table: Dict, key, elapsed: float, expanded: int):
+    totals = table.get(key)
+    if totals is None:
+        totals = table[key] = [0, 0.0, 0]
+    totals[0] += 1
+    totals[1] += elapsed
+    totals[2] += expanded
+
+
+def _ranked(table: Dict) -> Dict:
+    return {key: {"queries": n, "seconds": seconds, "expanded": expanded}
+            for key, (n, seconds, expanded) in sorted(table.items(), key=lambda item: -item[1][1])}
@@ -1,29 +1,186 @@
-from collections import defaultdict
-from typing import List, Tuple, Dict
+from collections import deque
+from typing import Iterator, List, Mapping, Optional, Tuple, Dict
+import math
+import numpy as np
+from .reservations import ReservationTable
+
+# Grid size used when a TrafficManager is created without one
+DEFAULT_GRID_SIZE = (50, 50)
+# Congestion a cell must gain or lose before push_to_grid copies it into traversal costs
+DEFAULT_FEEDBACK_THRESHOLD = 1.0
+
+
+class CongestionMap(Mapping):
+    """Read-only ``{(x, y): level}`` view of the nonzero cells of a congestion grid.
+
+    Looking up any cell that was never visited, in bounds or not, gives 0
+    as the old ``defaultdict`` did, but only nonzero cells are iterated.
+    """
+
+    def __init__(self, manager: 'TrafficManager'):
+        self._manager = manager
+
+    def __getitem__(self, pos: Tuple[int, int]):
+        x, y = pos
+        width, height = self._manager.grid_size
+        if not (0 <= x < width and 0 <= y < height):
+            return 0.0
+        return self._manager.levels[x, y].item()
+
+    def __contains__(self, pos) -> bool:
+        try:
+            return self[pos] != 0
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for x, y in np.argwhere(self._manager.levels).tolist():
+            yield x, y
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._manager.levels))
+
+    def items(self):
+        levels = self._manager.levels
+        cells = np.nonzero(levels)
+        return list(zip(zip(*(c.tolist() for c in cells)), levels[cells].tolist()))
+
 
 class TrafficManager:
-    def __init__(self):
-        self.congestion = defaultdict(int)
-        self.reserved_paths = defaultdict(list)  # time -> [(agent_id, position)]
+    """Grid-shaped congestion levels accumulated once per tick.
+
+    ``accumulate`` adds one visit per agent cell in a single NumPy pass.
+    By default levels are plain visit counts. ``decay`` (per second) fades
+    them exponentially, and ``window`` keeps only the visits of the last
+    ``window`` ticks. ``push_to_grid`` copies levels into
+    ``Grid.congestion``, and so into traversal costs, for cells that moved
+    by at least ``feedback_threshold`` since the last push; a threshold of
+    None turns feedback off. Only
+    cells in the change log since that push are compared, so a tick where
+    nothing moved and nothing decayed pushes nothing.
+    Space-time claims live in ``reservations``, a ``ReservationTable``.
+    """
+
+    # Accumulated batches kept for changes_since readers
+    CHANGE_LOG_SIZE = 1024
+    # Decayed levels below this snap to zero
+    MIN_LEVEL = 1e-3
+    # Above this many changed cells, push_to_grid marks one bounding box dirty
+    MAX_FEEDBACK_RECTS = 64
+
+    def __init__(self, grid_size: Tuple[int, int] = DEFAULT_GRID_SIZE, decay: float = 0.0,
+                 window: Optional[int] = None,
+                 feedback_threshold: Optional[float] = DEFAULT_FEEDBACK_THRESHOLD):
+        self.grid_size = (int(grid_size[0]), int(grid_size[1]))
+        self.decay = decay
+        self.window = window
+        self.feedback_threshold = feedback_threshold
+        self.levels = np.zeros(self.grid_size, dtype=np.float64 if decay else np.int64)
+        self.congestion = CongestionMap(self)
+        self.reservations = ReservationTable(self.grid_size)
+        self.change_count = 0
+        self._change_log: List[np.ndarray] = []
+        self._log_offset = 0
+        self._recent: deque = deque()  # Flat cells visited per tick, for the sliding window
+        # change_count at the last push_to_grid, and the grid it went to
+        self._pushed = 0
+        self._pushed_grid = None
 
     def update_congestion(self, pos: Tuple[int, int]):
-        """Update congestion level at a given position"""
-        self.congestion[pos] += 1
+        """Add one visit at ``pos`` to the current tick; it decays and expires like ``accumulate`` visits"""
+        self._log(np.unique(self._visit(np.array([pos]))))
+
+    def accumulate(self, cells: np.ndarray, dt: float = 1.0):
+        """Advance congestion by one tick: decay or expire old visits, then add one per row of ``cells``"""
+        levels = self.levels.reshape(-1)
+        changed = []
+
+        if self.decay:
+            live = np.flatnonzero(levels)
+            levels[live] *= math.exp(-self.decay * dt)
+            faded = live[levels[live] < self.MIN_LEVEL]
+            levels[faded] = 0
+            changed.append(live)
+        if self.window is not None:
+            self._recent.append(np.zeros(0, dtype=np.int64))
+            if len(self._recent) > self.window:
+                expired = self._recent.popleft()
+                np.subtract.at(levels, expired, 1)
+                changed.append(expired)
+
+        changed.append(self._visit(cells))
+        self._log(np.unique(np.concatenate(changed)))
+
+    def _visit(self, cells: np.ndarray) -> np.ndarray:
+        """Add one visit per in-bounds row of ``cells`` to the current tick; returns their flat cells"""
+        width, height = self.grid_size
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        inside = (cells[:, 0] >= 0) & (cells[:, 0] < width) & (cells[:, 1] >= 0) & (cells[:, 1] < height)
+        flat = cells[inside, 0] * height + cells[inside, 1]
+        np.add.at(self.levels.reshape(-1), flat, 1)
+        if self.window is not None:
+            if self._recent:
+                self._recent[-1] = np.concatenate([self._recent[-1], flat])
+            else:
+                self._recent.append(flat)
+        return flat
+
+    def _log(self, cells: np.ndarray):
+        self._change_log.append(cells)
+        self.change_count += 1
+        if len(self._change_log) > 2 * self.CHANGE_LOG_SIZE:
+            del self._change_log[:self.CHANGE_LOG_SIZE]
+            self._log_offset += self.CHANGE_LOG_SIZE
+
+    def changes_since(self, count: int) -> Optional[np.ndarray]:
+        """Flat cells (``x * height + y``) changed after the first ``count`` batches.
+
+        Returns None once the log no longer reaches back that far.
+        """
+        if count < self._log_offset:
+            return None
+        batches = self._change_log[count - self._log_offset:]
+        if not batches:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(batches))
+
+    def push_to_grid(self, grid) -> int:
+        """Copy levels that moved by at least ``feedback_threshold`` into ``grid.congestion``; returns the cell count"""
+        threshold = self.feedback_threshold or 0.0
+        # Cells not logged since the last push to this grid cannot have moved
+        changed = self.changes_since(self._pushed) if grid is self._pushed_grid else None
+        self._pushed = self.change_count
+        self._pushed_grid = grid
+        if changed is not None:
+            if len(changed) == 0:
+                return 0
+            xs, ys = np.divmod(changed, self.grid_size[1])
+            delta = np.abs(self.levels[xs, ys] - grid.congestion[xs, ys])
+            moved = delta >= threshold if threshold > 0 else delta > 0
+            xs, ys = xs[moved], ys[moved]
+        else:
+            delta = np.abs(self.levels - grid.congestion)
+            xs, ys = np.nonzero(delta >= threshold if threshold > 0 else delta > 0)
+        if len(xs) == 0:
+            return 0
+        grid.congestion[xs, ys] = self.levels[xs, ys]
+        grid.mark_cells_dirty(xs, ys, self.MAX_FEEDBACK_RECTS)
+        return len(xs)
 
     def get_congestion_cost(self, pos: Tuple[int, int]) -> float:
         """Get the congestion cost for a given position"""
-        return self.congestion[pos] * 0.2
+        return float(self.levels[pos[0], pos[1]]) * 0.2
 
     def reserve_path(self, agent_id: str, path: List[Tuple[int, int]], time_windows: List[float]):
         """Reserve a path for an agent at specific time windows"""
+        tick_of = self.reservations.tick_of
         for t, pos in zip(time_windows, path):
-            self.reserved_paths[t].append((agent_id, pos))
+            self.reservations.reserve(agent_id, tick_of(t), pos)
 
     def check_collision(self, pos: Tuple[int, int], time: float) -> bool:
         """Check if there's a collision at a given position and time"""
-        window = int(time * 10) / 10  # Round to nearest 0.1
-        return any(p == pos for _, p in self.reserved_paths[window])
+        return self.reservations.owner(self.reservations.tick_of(time), pos) is not None
 
     def get_congestion_map(self, grid_size: Tuple[int, int]) -> Dict[Tuple[int, int], int]:
         """Get the current congestion map"""
-        return dict(self.congestion)
\ No newline at end of file
+        return dict(self.congestion.items())
\ No newline at end of file
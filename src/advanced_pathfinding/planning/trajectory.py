@@ -0,0 +1,326 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import copy
+import json
+import os
+import numpy as np
+from ..core.agents import AGENT_STATUSES
+from .recorder import AgentFrame, ObstacleFrame
+
+TRAJECTORY_FORMAT = "advanced-pathfinding-trajectory"
+TRAJECTORY_VERSION = 2
+HEADER_FILE = "header.json"
+# Rows copied at a time when old steps are widened
+GROW_CHUNK_ROWS = 4096
+
+# File name, dtype and per-step row shape for each array
+_LAYOUT = {
+    "time": ("time.bin", np.float64, lambda h: ()),
+    "agent_position": ("agent_position.bin", np.float32, lambda h: (h["max_agents"], 2)),
+    "agent_status": ("agent_status.bin", np.int8, lambda h: (h["max_agents"],)),
+    "agent_goal": ("agent_goal.bin", np.int32, lambda h: (h["max_agents"], 2)),
+    "obstacle_position": ("obstacle_position.bin", np.float32, lambda h: (h["max_obstacles"], 2)),
+    "obstacle_radius": ("obstacle_radius.bin", np.float32, lambda h: (h["max_obstacles"],)),
+    # Congestion snapshots: the changed cells and their new levels, and where each snapshot ends
+    "congestion_cell": ("congestion_cell.bin", np.int32, lambda h: ()),
+    "congestion_value": ("congestion_value.bin", np.float32, lambda h: ()),
+    "congestion_end": ("congestion_end.bin", np.int64, lambda h: ()),
+}
+# Arrays that do not hold one row per step
+_SNAPSHOT_ARRAYS = ("congestion_cell", "congestion_value", "congestion_end")
+# Arrays widened when a limit grows, with the value that marks an absent entry
+_COLUMNS = {
+    "max_agents": {"agent_position": np.nan, "agent_status": -1, "agent_goal": -1},
+    "max_obstacles": {"obstacle_position": np.nan, "obstacle_radius": np.nan},
+}
+
+
+class TrajectoryWriter:
+    """Appends simulation steps to a trajectory directory.
+
+    Each array is a raw binary file that only ever grows, so readers can
+    memory-map a run while it is still being written. Agents and obstacles
+    get a column the first time they are seen; absent entries are NaN
+    (status -1). ``max_agents`` and ``max_obstacles`` are initial widths:
+    when a new id does not fit, the affected files are rewritten with
+    twice the columns. Readers must reopen after that. Every
+    ``congestion_every`` steps the congestion cells that changed since the
+    previous snapshot are stored with their new levels. Opening an
+    existing trajectory appends to it, keeping its columns and limits.
+    """
+
+    def __init__(self, path: str, grid_size: Tuple[int, int], max_agents: int,
+                 max_obstacles: int = 0, congestion_every: int = 10):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        header_path = os.path.join(path, HEADER_FILE)
+        if os.path.exists(header_path):
+            existing = Trajectory(path)
+            self.header = existing.header
+            self.steps = len(existing)
+            snapshots = len(existing.congestion_end)
+            written = (existing.congestion_at((snapshots - 1) * existing.congestion_every)
+                       if snapshots else np.zeros(existing.grid_size, dtype=np.float32))
+            entries = int(existing.congestion_end[-1]) if snapshots else 0
+            mode = "ab"
+        else:
+            self.header = self._new_header(grid_size, max_agents, max_obstacles, congestion_every)
+            self.steps = 0
+            written = np.zeros(grid_size, dtype=np.float32)
+            entries = 0
+            mode = "wb"
+        self._files = {name: open(os.path.join(path, spec[0]), mode) for name, spec in _LAYOUT.items()}
+        self._agent_columns = {key: i for i, key in enumerate(self.header["agent_ids"])}
+        self._obstacle_columns = {key: i for i, key in enumerate(self.header["obstacle_ids"])}
+        # Fleet membership and agent count the columns were mapped for
+        self._agents_seen = None
+        self._agent_slots = np.zeros(0, dtype=np.int64)
+        self._agent_targets = np.zeros(0, dtype=np.int64)
+        # Congestion as of the last snapshot, and the traffic manager change count it was taken at
+        self._congestion = written.reshape(-1)
+        self._congestion_entries = entries
+        self._traffic = None
+        self._congestion_count = 0
+        self._write_header()
+
+    @staticmethod
+    def _new_header(grid_size: Tuple[int, int], max_agents: int, max_obstacles: int,
+                    congestion_every: int) -> Dict:
+        return {
+            "format": TRAJECTORY_FORMAT,
+            "version": TRAJECTORY_VERSION,
+            "grid_size": list(grid_size),
+            "max_agents": max_agents,
+            "max_obstacles": max_obstacles,
+            "congestion_every": congestion_every,
+            "agent_ids": [],
+            "obstacle_ids": [],
+        }
+
+    def __enter__(self) -> 'TrajectoryWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, planner):
+        """Write the planner's current state as the next step"""
+        fleet = planner.fleet
+        if (fleet.membership_version, len(planner.agents)) != self._agents_seen:
+            self._map_agents(planner)
+        a = self.header["max_agents"]
+
+        position = np.full((a, 2), np.nan, dtype=np.float32)
+        status = np.full(a, -1, dtype=np.int8)
+        goal = np.full((a, 2), -1, dtype=np.int32)
+        slots, columns = self._agent_slots, self._agent_targets
+        position[columns] = fleet.position[slots]
+        status[columns] = fleet.status[slots]
+        goal[columns] = fleet.goal[slots]
+
+        obstacles = planner.dynamic_obstacles
+        obstacle_columns = [self._column(self._obstacle_columns, obstacle.id, "obstacle_ids", "max_obstacles")
+                            for obstacle in obstacles]
+        o = self.header["max_obstacles"]
+        obstacle_position = np.full((o, 2), np.nan, dtype=np.float32)
+        obstacle_radius = np.full(o, np.nan, dtype=np.float32)
+        for obstacle, column in zip(obstacles, obstacle_columns):
+            obstacle_position[column] = obstacle._store.position[obstacle._slot]
+            obstacle_radius[column] = obstacle._store.radius[obstacle._slot]
+
+        files = self._files
+        files["time"].write(np.float64(planner.simulation_time).tobytes())
+        files["agent_position"].write(position.tobytes())
+        files["agent_status"].write(status.tobytes())
+        files["agent_goal"].write(goal.tobytes())
+        files["obstacle_position"].write(obstacle_position.tobytes())
+        files["obstacle_radius"].write(obstacle_radius.tobytes())
+        if self.steps % self.header["congestion_every"] == 0:
+            self._write_congestion(planner.traffic_manager)
+        self.steps += 1
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._write_header()
+
+    def _write_congestion(self, traffic):
+        """Store the cells whose level changed since the previous snapshot"""
+        levels = traffic.levels.reshape(-1).astype(np.float32)
+        # Only cells in the change log can have moved, unless the log was trimmed in between
+        logged = traffic.changes_since(self._congestion_count) if traffic is self._traffic else None
+        if logged is None:
+            cells = np.flatnonzero(levels != self._congestion)
+        else:
+            cells = logged[levels[logged] != self._congestion[logged]]
+        self._traffic, self._congestion_count = traffic, traffic.change_count
+        self._congestion[cells] = levels[cells]
+        self._congestion_entries += len(cells)
+        files = self._files
+        files["congestion_cell"].write(cells.astype(np.int32).tobytes())
+        files["congestion_value"].write(levels[cells].tobytes())
+        files["congestion_end"].write(np.int64(self._congestion_entries).tobytes())
+
+    def _map_agents(self, planner):
+        agents = list(planner.agents.values())
+        columns = [self._column(self._agent_columns, agent.id, "agent_ids", "max_agents") for agent in agents]
+        self._agent_slots = np.array([agent._slot for agent in agents], dtype=np.int64)
+        self._agent_targets = np.array(columns, dtype=np.int64)
+        self._agents_seen = (planner.fleet.membership_version, len(agents))
+
+    def _column(self, columns: Dict[str, int], key: str, ids: str, limit: str) -> int:
+        column = columns.get(key)
+        if column is None:
+            if len(columns) >= self.header[limit]:
+                self._grow(limit, max(1, 2 * self.header[limit]))
+            column = columns[key] = len(columns)
+            self.header[ids].append(key)
+            self._write_header()
+        return column
+
+    def _grow(self, limit: str, width: int):
+        """Rewrite the arrays sized by ``limit`` with ``width`` columns, padding old steps"""
+        old = dict(self.header)
+        self.header[limit] = width
+        for name, fill in _COLUMNS[limit].items():
+            file_name, dtype, row = _LAYOUT[name]
+            file_path = os.path.join(self.path, file_name)
+            self._files[name].close()
+            old_row, new_row = row(old), row(self.header)
+            # Old steps are read through a memory map a chunk at a time, never all at once
+            data = (np.memmap(file_path, dtype=dtype, mode="r", shape=(self.steps,) + old_row)
+                    if self.steps and old_row[0] else None)
+            with open(file_path + ".tmp", "wb") as out:
+                for first in range(0, self.steps, GROW_CHUNK_ROWS):
+                    last = min(first + GROW_CHUNK_ROWS, self.steps)
+                    grown = np.full((last - first,) + new_row, fill, dtype=dtype)
+                    if data is not None:
+                        grown[:, :old_row[0]] = data[first:last]
+                    out.write(grown.tobytes())
+            del data
+            os.replace(file_path + ".tmp", file_path)
+            self._files[name] = open(file_path, "ab")
+        self._write_header()
+
+    def _write_header(self):
+        with open(os.path.join(self.path, HEADER_FILE), "w") as f:
+            json.dump(self.header, f, indent=2)
+
+
+class Trajectory(Sequence):
+    """Read-only, memory-mapped view of a trajectory directory.
+
+    Arrays map the files directly, so nothing is loaded until it is
+    indexed. ``between`` narrows the view to a time range without copying.
+    Indexing gives frame dicts in the renderer's format; trajectories do
+    not store paths, so agent frames carry empty paths. Congestion is
+    rebuilt from the stored changes, continuing from the last snapshot
+    built when reading forward.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            self.header = json.load(f)
+        if self.header.get("format") != TRAJECTORY_FORMAT:
+            raise ValueError(f"{path} is not a trajectory directory")
+        if self.header.get("version") != TRAJECTORY_VERSION:
+            raise ValueError(f"{path} uses trajectory version {self.header.get('version')}, "
+                             f"expected {TRAJECTORY_VERSION}")
+        self.grid_size = tuple(self.header["grid_size"])
+        self.agent_ids: List[str] = self.header["agent_ids"]
+        self.obstacle_ids: List[str] = self.header["obstacle_ids"]
+        self.congestion_every: int = self.header["congestion_every"]
+
+        arrays = {name: self._map(name) for name in _LAYOUT}
+        per_step = [name for name in _LAYOUT if name not in _SNAPSHOT_ARRAYS]
+        # Arrays with no columns yet (a run without obstacles) have empty files whatever the length
+        empty = [name for name in per_step if 0 in arrays[name].shape[1:]]
+        steps = min(len(arrays[name]) for name in per_step if name not in empty)
+        for name in empty:
+            arrays[name] = np.zeros((steps,) + arrays[name].shape[1:], dtype=arrays[name].dtype)
+        self.time = arrays["time"][:steps]
+        self.agent_position = arrays["agent_position"][:steps]
+        self.agent_status = arrays["agent_status"][:steps]
+        self.agent_goal = arrays["agent_goal"][:steps]
+        self.obstacle_position = arrays["obstacle_position"][:steps]
+        self.obstacle_radius = arrays["obstacle_radius"][:steps]
+        # Absolute step of index 0, which picks the congestion snapshot
+        self._first = 0
+        self.congestion_cell = arrays["congestion_cell"]
+        self.congestion_value = arrays["congestion_value"]
+        self.congestion_end = arrays["congestion_end"]
+        # Entries applied so far and the flat levels they give, shared with between() views
+        self._congestion = [0, np.zeros(int(np.prod(self.grid_size)), dtype=np.float32)]
+
+    def _map(self, name: str) -> np.ndarray:
+        file_name, dtype, row = _LAYOUT[name]
+        shape = row(self.header)
+        file_path = os.path.join(self.path, file_name)
+        row_bytes = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        rows = os.path.getsize(file_path) // row_bytes if row_bytes else 0
+        if rows == 0:
+            return np.zeros((0,) + shape, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode="r", shape=(rows,) + shape)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def between(self, start_time: Optional[float] = None, end_time: Optional[float] = None) -> 'Trajectory':
+        """View of the steps with ``start_time <= time <= end_time``, sharing this one's memory maps"""
+        first = 0 if start_time is None else int(np.searchsorted(self.time, start_time, side="left"))
+        last = len(self.time) if end_time is None else int(np.searchsorted(self.time, end_time, side="right"))
+        window = slice(first, max(first, last))
+        view = copy.copy(self)
+        for name in ("time", "agent_position", "agent_status", "agent_goal",
+                     "obstacle_position", "obstacle_radius"):
+            setattr(view, name, getattr(self, name)[window])
+        view._first = self._first + first
+        return view
+
+    def congestion_at(self, index: int) -> np.ndarray:
+        """Most recent congestion snapshot at or before step ``index`` of this view"""
+        end = int(self.congestion_end[(self._first + index) // self.congestion_every])
+        applied, levels = self._congestion
+        if end < applied:
+            applied = 0
+            levels[:] = 0
+        # Later snapshots overwrite earlier ones, so each cell takes its last stored level
+        cells = self.congestion_cell[applied:end][::-1]
+        cells, last = np.unique(cells, return_index=True)
+        levels[cells] = self.congestion_value[applied:end][::-1][last]
+        self._congestion[0] = end
+        return levels.reshape(self.grid_size).copy()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("trajectory step out of range")
+
+        agents = {}
+        status = self.agent_status[index]
+        for column in np.flatnonzero(status >= 0).tolist():
+            agent_id = self.agent_ids[column]
+            x, y = self.agent_position[index, column].tolist()
+            agents[agent_id] = AgentFrame(agent_id, (x, y), AGENT_STATUSES[status[column]],
+                                          tuple(self.agent_goal[index, column].tolist()), [])
+        radius = self.obstacle_radius[index]
+        obstacles = [
+            ObstacleFrame(self.obstacle_ids[column], tuple(self.obstacle_position[index, column].tolist()),
+                          float(radius[column]))
+            for column in np.flatnonzero(~np.isnan(radius)).tolist()
+        ]
+        congestion = self.congestion_at(index)
+        cells = np.argwhere(congestion != 0)
+        return {
+            'time': float(self.time[index]),
+            'obstacles': obstacles,
+            'agents': agents,
+            'congestion': {(int(x), int(y)): float(congestion[x, y]) for x, y in cells}
+        }
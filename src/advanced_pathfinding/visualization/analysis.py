@@ -1,9 +1,10 @@
 import os
 import json
-import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple, Union
+from ..core.agents import ACTIVE, AGENT_STATUSES
+from ..planning.trajectory import Trajectory
 
 class SimulationAnalyzer:
     def __init__(self, grid_size: Tuple[int, int]):
@@ -34,6 +35,36 @@ class SimulationAnalyzer:
 
         return analysis_dir
 
+    def analyze_trajectory(self, trajectory: Union[str, Trajectory], start_time: Optional[float] = None,
+                           end_time: Optional[float] = None) -> List[Dict]:
+        """Per-agent movement statistics over a time range of an on-disk trajectory"""
+        if isinstance(trajectory, str):
+            trajectory = Trajectory(trajectory)
+        trajectory = trajectory.between(start_time, end_time)
+        if len(trajectory) == 0:
+            return []
+        positions = trajectory.agent_position
+        status = trajectory.agent_status
+        steps = np.linalg.norm(np.diff(positions, axis=0), axis=2)
+        distance = np.nansum(steps, axis=0)
+        present = status >= 0
+        active = status == ACTIVE
+        dt = np.diff(trajectory.time)[:, None]
+        active_time = (active[1:] * dt).sum(axis=0)
+        stats = []
+        for column, agent_id in enumerate(trajectory.agent_ids):
+            if not present[:, column].any():
+                continue
+            last = int(np.flatnonzero(present[:, column])[-1])
+            stats.append({
+                "id": agent_id,
+                "status": AGENT_STATUSES[status[last, column]],
+                "distance_traveled": float(distance[column]),
+                "active_time": float(active_time[column]),
+                "average_speed": float(distance[column] / active_time[column]) if active_time[column] > 0 else 0.0
+            })
+        return stats
+
     def _generate_agent_stats(self, agents: Dict) -> List[Dict]:
         agent_stats = []
         for agent_id, agent in agents.items():
@@ -50,6 +81,8 @@ class SimulationAnalyzer:
         return agent_stats
 
     def _generate_analysis_plots(self, analysis_dir: str, agent_stats: List[Dict], traffic_manager):
+        import matplotlib.pyplot as plt
+
         # Path Efficiency Plot
         plt.figure(figsize=(10, 6))
         efficiencies = [stat['path_efficiency'] for stat in agent_stats]
@@ -0,0 +1,256 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence, Tuple
+import json
+import os
+import numpy as np
+from ..core.grid import TerrainType, TERRAIN_TYPES
+
+# 8-bit colours parsed from the renderer's '#RRGGBB' palette, so exporting never imports matplotlib
+TERRAIN_RGB8 = np.array([[int(TerrainType.get_color(terrain)[i:i + 2], 16) for i in (1, 3, 5)]
+                         for terrain in TERRAIN_TYPES], dtype=np.uint8)
+AGENT_RGB = np.array([0, 0, 255], dtype=np.uint8)
+GOAL_RGB = np.array([0, 128, 0], dtype=np.uint8)
+OBSTACLE_RGB = np.array([255, 0, 0], dtype=np.float32)
+CONGESTION_RGB = np.array([255, 255, 0], dtype=np.float32)
+
+EXPORT_FORMATS = ("gif", "raw")
+
+
+def _disc(radius: float) -> np.ndarray:
+    """Pixel offsets (row, col) covered by a disc of the given radius"""
+    r = int(np.ceil(radius))
+    rows, cols = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = rows * rows + cols * cols <= radius * radius
+    return np.stack([rows[inside], cols[inside]], axis=1)
+
+
+def _cross(radius: int) -> np.ndarray:
+    span = np.arange(-radius, radius + 1)
+    zeros = np.zeros_like(span)
+    return np.concatenate([np.stack([span, zeros], axis=1), np.stack([zeros, span], axis=1)])
+
+
+class FrameRasterizer:
+    """Draws frames straight into RGB arrays, without matplotlib.
+
+    The terrain is upscaled to ``scale`` pixels per cell once; each frame
+    copies it, blends in the congestion overlay and obstacle discs, and
+    stamps agent and goal sprites with fancy indexing. Like the renderer,
+    grid ``x`` runs down the image and ``y`` across it.
+    """
+
+    def __init__(self, terrain: np.ndarray, scale: int = 8):
+        self.scale = scale
+        self.base = np.repeat(np.repeat(TERRAIN_RGB8[terrain], scale, axis=0), scale, axis=1)
+        self.shape = self.base.shape
+        self._agent = _disc(max(scale * 0.35, 1))
+        self._goal = _cross(max(scale // 3, 1))
+
+    def draw(self, frame: Dict) -> np.ndarray:
+        """RGB uint8 image of shape ``(width * scale, height * scale, 3)``"""
+        image = self.base.copy()
+        self._draw_congestion(image, frame['congestion'])
+        for obstacle in frame['obstacles']:
+            self._draw_obstacle(image, obstacle.position, obstacle.radius)
+
+        moving = [a for a in frame['agents'].values() if a.status != "finished"]
+        if moving:
+            self._stamp(image, np.array([a.goal for a in moving], dtype=np.float64), self._goal, GOAL_RGB)
+            self._stamp(image, np.array([a.position for a in moving], dtype=np.float64), self._agent,
+                        AGENT_RGB)
+        return image
+
+    def _pixels(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points + 0.5) * self.scale).astype(np.int64)
+
+    def _draw_congestion(self, image: np.ndarray, congestion: Dict[Tuple[int, int], int]):
+        if not congestion:
+            return
+        cells = np.array(list(congestion.keys()), dtype=np.int64).reshape(-1, 2)
+        levels = np.fromiter(congestion.values(), dtype=np.float64, count=len(congestion))
+        busy = levels > 1
+        if not busy.any():
+            return
+        width, height = image.shape[0] // self.scale, image.shape[1] // self.scale
+        alpha = np.zeros((width, height), dtype=np.float32)
+        alpha[cells[busy, 0], cells[busy, 1]] = np.minimum(levels[busy] * 0.1, 0.8)
+        # Blend only the rows and columns that hold congested cells
+        rows = np.flatnonzero(alpha.any(axis=1))
+        cols = np.flatnonzero(alpha.any(axis=0))
+        r0, r1 = rows[0] * self.scale, (rows[-1] + 1) * self.scale
+        c0, c1 = cols[0] * self.scale, (cols[-1] + 1) * self.scale
+        a = np.repeat(np.repeat(alpha[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1], self.scale, axis=0),
+                      self.scale, axis=1)[..., None]
+        region = image[r0:r1, c0:c1]
+        region[:] = region * (1 - a) + CONGESTION_RGB * a
+
+    def _draw_obstacle(self, image: np.ndarray, position: Tuple[float, float], radius: float):
+        scale = self.scale
+        cx, cy = (position[0] + 0.5) * scale, (position[1] + 0.5) * scale
+        r = radius * scale
+        r0, r1 = max(int(cx - r), 0), min(int(np.ceil(cx + r)) + 1, image.shape[0])
+        c0, c1 = max(int(cy - r), 0), min(int(np.ceil(cy + r)) + 1, image.shape[1])
+        if r0 >= r1 or c0 >= c1:
+            return
+        rows, cols = np.ogrid[r0:r1, c0:c1]
+        inside = (rows + 0.5 - cx) ** 2 + (cols + 0.5 - cy) ** 2 <= r * r
+        region = image[r0:r1, c0:c1]
+        region[inside] = region[inside] * 0.5 + OBSTACLE_RGB * 0.5
+
+    def _stamp(self, image: np.ndarray, points: np.ndarray, sprite: np.ndarray, color: np.ndarray):
+        centers = self._pixels(points)
+        rows = (centers[:, None, 0] + sprite[None, :, 0]).ravel()
+        cols = (centers[:, None, 1] + sprite[None, :, 1]).ravel()
+        keep = (rows >= 0) & (rows < image.shape[0]) & (cols >= 0) & (cols < image.shape[1])
+        image[rows[keep], cols[keep]] = color
+
+
+def _gif_frame(image: np.ndarray) -> bytes:
+    """Quantize and LZW-encode one frame as an image block carrying a local palette"""
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.fromarray(image).quantize(colors=256).save(buffer, format="GIF")
+    data = buffer.getvalue()
+    # Logical screen descriptor follows the 6-byte signature
+    flags = data[10]
+    palette = b""
+    bits = 0
+    pos = 13
+    if flags & 0x80:
+        bits = flags & 0x07
+        palette = data[pos:pos + 3 * (2 << bits)]
+        pos += len(palette)
+    while data[pos] == 0x21:  # Skip extension blocks
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    if data[pos] != 0x2C:
+        raise ValueError("Expected a GIF image descriptor")
+    descriptor = data[pos:pos + 10]
+    pos += 10
+    if descriptor[9] & 0x80:
+        bits = descriptor[9] & 0x07
+        palette = data[pos:pos + 3 * (2 << bits)]
+        pos += len(palette)
+    start = pos
+    pos += 1  # LZW minimum code size
+    while data[pos]:
+        pos += data[pos] + 1
+    pos += 1
+    # Rewrite the descriptor so the palette travels with the frame as a local table
+    block = descriptor[:9] + bytes([0x80 | (descriptor[9] & 0x40) | bits]) + palette + data[start:pos]
+    return block
+
+
+class GifStreamWriter:
+    """Writes a looping GIF one frame at a time, each with its own palette"""
+
+    def __init__(self, path: str, size: Tuple[int, int], fps: float):
+        self.frames = 0
+        self._delay = max(int(round(100 / fps)), 1)
+        self._file = open(path, "wb")
+        height, width = size
+        self._file.write(b"GIF89a" + width.to_bytes(2, "little") + height.to_bytes(2, "little")
+                         + b"\x00\x00\x00")
+        self._file.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def write(self, encoded: bytes):
+        self._file.write(b"\x21\xf9\x04\x00" + self._delay.to_bytes(2, "little") + b"\x00\x00")
+        self._file.write(encoded)
+        self.frames += 1
+
+    def close(self):
+        self._file.write(b"\x3b")
+        self._file.close()
+
+
+class RawVideoWriter:
+    """Writes rgb24 frames back to back, plus a JSON sidecar describing them.
+
+    The output can be fed to e.g. ``ffmpeg -f rawvideo -pix_fmt rgb24``
+    with the size and rate from the sidecar.
+    """
+
+    def __init__(self, path: str, size: Tuple[int, int], fps: float):
+        self.path = path
+        self.size = size
+        self.fps = fps
+        self.frames = 0
+        self._file = open(path, "wb")
+
+    def write(self, encoded: bytes):
+        self._file.write(encoded)
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+        height, width = self.size
+        with open(self.path + ".json", "w") as f:
+            json.dump({"width": width, "height": height, "fps": self.fps, "pix_fmt": "rgb24",
+                       "frames": self.frames}, f, indent=2)
+
+
+_worker_rasterizer: Optional[FrameRasterizer] = None
+_worker_format = "raw"
+
+
+def _init_worker(terrain: np.ndarray, scale: int, fmt: str):
+    global _worker_rasterizer, _worker_format
+    _worker_rasterizer = FrameRasterizer(terrain, scale)
+    _worker_format = fmt
+
+
+def _encode_chunk(frames: List[Dict]) -> List[bytes]:
+    """Rasterize and encode a chunk of frames inside a worker"""
+    encoded = []
+    for frame in frames:
+        image = _worker_rasterizer.draw(frame)
+        encoded.append(_gif_frame(image) if _worker_format == "gif" else image.tobytes())
+    return encoded
+
+
+def export_animation(frames: Sequence[Dict], grid, output_path: str, fps: float = 10, scale: int = 8,
+                     workers: Optional[int] = None, chunk_size: int = 16,
+                     fmt: Optional[str] = None) -> int:
+    """Render frames headlessly and stream them to a GIF or raw rgb24 video.
+
+    Chunks of ``chunk_size`` frames are rasterized and encoded in a process
+    pool of ``workers`` (``0`` renders in this process). At most two chunks
+    per worker are in flight, so memory stays bounded however long the run
+    is. The format comes from ``fmt`` or the file suffix (``.gif`` or raw).
+    Returns the number of frames written.
+    """
+    fmt = fmt or ("gif" if output_path.lower().endswith(".gif") else "raw")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    terrain = np.ascontiguousarray(grid.terrain)
+    size = (terrain.shape[0] * scale, terrain.shape[1] * scale)
+    writer = (GifStreamWriter if fmt == "gif" else RawVideoWriter)(output_path, size, fps)
+    starts = range(0, len(frames), chunk_size)
+    try:
+        if workers == 0:
+            _init_worker(terrain, scale, fmt)
+            for start in starts:
+                for encoded in _encode_chunk(frames[start:start + chunk_size]):
+                    writer.write(encoded)
+            return writer.frames
+
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(terrain, scale, fmt)) as pool:
+            in_flight: deque = deque()
+            limit = 2 * (workers or os.cpu_count() or 1)
+            for start in starts:
+                in_flight.append(pool.submit(_encode_chunk, frames[start:start + chunk_size]))
+                if len(in_flight) >= limit:
+                    for encoded in in_flight.popleft().result():
+                        writer.write(encoded)
+            while in_flight:
+                for encoded in in_flight.popleft().result():
+                    writer.write(encoded)
+        return writer.frames
+    finally:
+        writer.close()
@@ -1,28 +1,60 @@
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.animation import FuncAnimation
+from matplotlib.collections import EllipseCollection, LineCollection
 import numpy as np
-from ..core.grid import TerrainType
+from ..core.grid import TerrainType, TERRAIN_TYPES
 from rich.progress import Progress
 
+# RGB lookup table indexed by the grid's terrain codes
+TERRAIN_RGB = np.array([plt.cm.colors.to_rgb(TerrainType.get_color(terrain))
+                        for terrain in TERRAIN_TYPES])
+
+# Congestion overlay colour; alpha follows the level as in the per-patch drawing
+CONGESTION_RGB = plt.cm.colors.to_rgb('yellow')
+
 
 class SimulationRenderer:
-    def __init__(self, grid_size):
+    """Draws simulation frames onto a matplotlib figure.
+
+    By default the renderer is persistent: the terrain is rasterized once
+    per grid and each frame only updates a fixed set of artists (agent and
+    goal scatters, a path ``LineCollection``, an obstacle
+    ``EllipseCollection`` and a congestion overlay image), so blitting
+    redraws just those. ``persistent=False`` keeps the original mode that
+    clears the axes and rebuilds every artist each frame. The figure is
+    only created when something is drawn, so batch jobs that never render
+    do not open one.
+    """
+
+    def __init__(self, grid_size, persistent: bool = True):
         self.grid_size = grid_size
-        self.fig, self.ax = plt.subplots(figsize=(12, 12))
+        self.persistent = persistent
+        self._fig = None
+        self._ax = None
+        self._artists = None
+        self._grid = None
+
+    @property
+    def fig(self):
+        if self._fig is None:
+            self._fig, self._ax = plt.subplots(figsize=(12, 12))
+        return self._fig
+
+    @property
+    def ax(self):
+        if self._ax is None:
+            self.fig
+        return self._ax
 
     def render_frame(self, frame, grid):
+        if self.persistent:
+            return self._update_artists(frame, grid)
         self.ax.clear()
         artists = []
 
         # Draw terrain
-        terrain_colors = np.zeros((self.grid_size[0], self.grid_size[1], 3))
-        for x in range(self.grid_size[0]):
-            for y in range(self.grid_size[1]):
-                cell = grid[x][y]
-                color_name = TerrainType.get_color(cell.terrain)
-                color_rgb = plt.cm.colors.to_rgb(color_name)
-                terrain_colors[x, y] = color_rgb
+        terrain_colors = TERRAIN_RGB[grid.terrain]
 
         im = self.ax.imshow(terrain_colors)
         artists.append(im)
@@ -30,7 +62,7 @@ class SimulationRenderer:
         # Draw dynamic obstacles
         for obstacle in frame['obstacles']:
             circle = patches.Circle(
-                obstacle.position,
+                (obstacle.position[1], obstacle.position[0]),
                 obstacle.radius,
                 color='red',
                 alpha=0.5
@@ -72,15 +104,84 @@ class SimulationRenderer:
 
         return artists
 
-    def create_animation(self, frames, grid, output_path=None):
-        """Create and save the animation with progress tracking"""
+    def _setup_artists(self, grid):
+        """Create the persistent artists, rasterizing the grid's terrain once"""
+        ax = self.ax
+        ax.clear()
+        width, height = grid.terrain.shape
+        ax.imshow(TERRAIN_RGB[grid.terrain])
+        self._congestion = np.zeros((width, height, 4))
+        self._congestion[..., :3] = CONGESTION_RGB
+        overlay = ax.imshow(self._congestion, animated=True)
+        obstacles = EllipseCollection([], [], [], units='xy', offsets=np.zeros((0, 2)),
+                                      offset_transform=ax.transData, facecolors='red', alpha=0.5,
+                                      animated=True)
+        ax.add_collection(obstacles)
+        paths = LineCollection([], colors='b', linestyles='--', alpha=0.5, animated=True)
+        ax.add_collection(paths)
+        agents = ax.scatter([], [], c='b', marker='o', animated=True)
+        goals = ax.scatter([], [], c='g', marker='*', animated=True)
+        title = ax.text(0.5, 1.01, '', transform=ax.transAxes, ha='center', va='bottom',
+                        fontsize='large', animated=True)
+        ax.set_xlim(-0.5, height - 0.5)
+        ax.set_ylim(width - 0.5, -0.5)
+        ax.grid(True)
+        self._artists = (overlay, obstacles, paths, agents, goals, title)
+        self._grid = grid
+
+    def _update_artists(self, frame, grid):
+        if self._grid is not grid or self._artists is None:
+            self._setup_artists(grid)
+        overlay, obstacles, paths, agents, goals, title = self._artists
+
+        # Congestion: one RGBA overlay instead of a patch per cell
+        alpha = self._congestion[..., 3]
+        alpha[:] = 0
+        congestion = frame['congestion']
+        if congestion:
+            cells = np.array(list(congestion.keys()), dtype=np.int64).reshape(-1, 2)
+            levels = np.fromiter(congestion.values(), dtype=np.float64, count=len(congestion))
+            busy = levels > 1
+            alpha[cells[busy, 0], cells[busy, 1]] = np.minimum(levels[busy] * 0.1, 0.8)
+        overlay.set_data(self._congestion)
+
+        # Frames store (x, y) grid coordinates; the image puts x on the vertical axis
+        obstacle_frames = frame['obstacles']
+        diameters = np.array([2 * o.radius for o in obstacle_frames])
+        obstacles.set_offsets(np.array([(o.position[1], o.position[0]) for o in obstacle_frames])
+                              .reshape(-1, 2))
+        obstacles.set_widths(diameters)
+        obstacles.set_heights(diameters)
+        obstacles.set_angles(np.zeros(len(diameters)))
+
+        moving = [a for a in frame['agents'].values() if a.status != "finished"]
+        agents.set_offsets(np.array([(a.position[1], a.position[0]) for a in moving]).reshape(-1, 2))
+        goals.set_offsets(np.array([(a.goal[1], a.goal[0]) for a in moving]).reshape(-1, 2))
+        paths.set_segments([np.asarray(a.path)[:, ::-1] for a in moving if len(a.path) > 1])
+        title.set_text(f'Time: {frame["time"]:.1f}s')
+        return list(self._artists)
+
+    def animate_trajectory(self, trajectory, grid, start_time=None, end_time=None, output_path=None):
+        """Animate a time range of an on-disk trajectory (a path or a Trajectory)"""
+        if isinstance(trajectory, str):
+            from ..planning.trajectory import Trajectory
+            trajectory = Trajectory(trajectory)
+        self.create_animation(trajectory.between(start_time, end_time), grid, output_path=output_path)
+
+    def create_animation(self, frames, grid, output_path=None, show=True):
+        """Create and save the animation with progress tracking; ``show=False`` skips the window"""
 
         def update(frame_number):
             return self.render_frame(frames[frame_number], grid)
 
+        def init():
+            self._setup_artists(grid)
+            return list(self._artists)
+
         anim = FuncAnimation(
             self.fig,
             update,
+            init_func=init if self.persistent else None,
             frames=len(frames),
             interval=50,
             blit=True,
@@ -105,4 +206,5 @@ class SimulationRenderer:
 
                 progress.update(task, completed=100)
 
-        plt.show()
\ No newline at end of file
+        if show:
+            plt.show()
\ No newline at end of file
@@ -0,0 +1,307 @@
+import numpy as np
+import pytest
+from advanced_pathfinding.core.grid import (
+    GridCell, TerrainType, WeatherCondition, initialize_grid
+)
+
+
+def test_cell_views_write_through_to_arrays():
+    grid = initialize_grid((20, 20), seed=7)
+
+    cell = grid[3][4]
+    cell.terrain = TerrainType.CONSTRUCTION
+    cell.congestion = 3
+    cell.weather = WeatherCondition(0.5, 0.6, 12.0, 10.0)
+
+    assert grid[3][4].terrain is TerrainType.CONSTRUCTION
+    assert grid.congestion[3, 4] == 3
+    assert grid.has_weather[3, 4]
+    assert grid[3][4].weather.wind_speed == 12.0
+    assert len(grid) == 20 and len(grid[0]) == 20
+
+
+def test_vectorized_costs_match_cell_costs():
+    grid = initialize_grid((15, 15), seed=3)
+    grid[2][2].weather = WeatherCondition(0.9, 0.2, 15.0, 18.0)
+    grid[5][6].risk_factor = 0.4
+
+    costs = grid.traversal_costs()
+    for x in range(15):
+        for y in range(15):
+            assert costs[x, y] == grid[x][y].traversal_cost(0.0)
+
+
+def test_standalone_cell():
+    cell = GridCell(1, 2, TerrainType.PARK)
+    cell.elevation = 2.0
+
+    assert (cell.x, cell.y) == (1, 2)
+    assert cell.weather is None
+    assert np.isclose(cell.traversal_cost(0.0), 1.3 + 0.2)
+
+
+def test_cost_field_refreshes_dirty_regions_only():
+    from advanced_pathfinding.planning.cost_field import CostField
+
+    grid = initialize_grid((12, 12), seed=5)
+    field = CostField(grid)
+    assert field.refresh() == 0
+
+    grid[4][4].congestion = 10
+    assert field.is_dirty
+    assert field.refresh() == 1
+    assert field.costs[4, 4] == grid[4][4].traversal_cost(0.0)
+
+    # Raw array writes need an explicit notification
+    grid.risk[0:2, 0:2] = 1.0
+    assert field.costs[0, 0] != grid.traversal_cost(0, 0)
+    grid.mark_dirty(0, 0, 2, 2)
+    assert field.refresh() == 2
+    assert np.array_equal(field.costs, grid.traversal_costs())
+
+
+def test_obstacle_index_matches_linear_scan():
+    import random
+    from advanced_pathfinding.core.obstacles import DynamicObstacle
+    from advanced_pathfinding.core.obstacle_index import ObstacleIndex
+
+    rng = random.Random(9)
+    obstacles = [DynamicObstacle(f"o{i}", (rng.uniform(0, 49), rng.uniform(0, 49)),
+                                 (rng.uniform(-3, 3), rng.uniform(-3, 3)), rng.uniform(0.5, 3.0))
+                 for i in range(40)]
+    index = ObstacleIndex(bucket_size=4)
+    cells = np.array([(x, y) for x in range(0, 50, 3) for y in range(0, 50, 3)])
+    for _ in range(10):
+        for obstacle in obstacles:
+            obstacle.update(0.5)
+        index.sync(obstacles)
+        expected = [any(o.affects_position((x, y)) for o in obstacles) for x, y in cells.tolist()]
+        assert [index.is_blocked((x, y)) for x, y in cells.tolist()] == expected
+        assert index.blocked_mask(cells).tolist() == expected
+        covered = {x * 50 + y for x in range(50) for y in range(50)
+                   if any(o.affects_position((x, y)) for o in obstacles)}
+        assert index.covered_cells((50, 50)) == covered
+
+    removed = obstacles.pop()
+    index.sync(obstacles)
+    assert len(index) == len(obstacles) and removed not in index
+    assert index.segment_blocked((0, 0), (0, 0)) == index.is_blocked((0, 0))
+
+
+def test_obstacle_store_steps_bounces_and_expires():
+    from advanced_pathfinding.core.obstacles import DynamicObstacle, ObstacleStore
+
+    store = ObstacleStore((80, 80), capacity=2)
+    walker = store.add(DynamicObstacle("walker", (78.5, 10.0), (2.0, 0.0), 1.0))
+    crew = store.add(DynamicObstacle("crew", (5.0, 5.0), (0.0, 1.0), 2.0, lifetime=1.0))
+    extra = store.add(DynamicObstacle("extra", (1.0, 1.0), (0.0, 0.0), 1.0))
+    assert len(store) == 3  # Grew past the initial capacity
+
+    assert store.step(0.5) == []
+    assert walker.position == (79.5, 10.0) and walker.velocity == (2.0, 0.0)
+    store.step(0.5)
+    # 79.5 is past the last cell of an 80-wide map, so the obstacle turns around
+    assert walker.velocity == (-2.0, 0.0)
+    assert crew.expired and crew not in list(store)
+    assert crew.position == (5.0, 6.0)  # Retired views keep their last state
+
+    freed = int(np.flatnonzero(~store.alive)[0])
+    again = store.add(DynamicObstacle("again", (3.0, 3.0), (0.0, 0.0), 1.0))
+    assert again._slot == freed and len(store) == 3
+
+    # Obstacles compare by value wherever their state lives
+    assert again == DynamicObstacle("again", (3.0, 3.0), (0.0, 0.0), 1.0)
+    assert crew != DynamicObstacle("crew", (5.0, 6.0), (0.0, 1.0), 2.0)
+    assert crew.to_dict() == {"id": "crew", "position": (5.0, 6.0), "velocity": (0.0, 1.0),
+                              "radius": 2.0, "lifetime": 1.0}
+    with pytest.raises(TypeError):
+        hash(again)
+
+
+def _original_update(position, path, speed, dt):
+    """The original per-agent Agent.update_position rule"""
+    target = path[0]
+    dx = target[0] - position[0]
+    dy = target[1] - position[1]
+    distance = (dx * dx + dy * dy) ** 0.5
+    if distance < 0.1:
+        path.pop(0)
+        return target
+    step = speed * dt
+    if distance > step:
+        return position[0] + dx * step / distance, position[1] + dy * step / distance
+    return position
+
+
+def _landing_update(position, path, speed, dt):
+    """The original rule, except that a waypoint within one step is landed on.
+
+    This is the opt-in ``FleetStore(land_within_step=True)`` behaviour, not
+    the original: ``_original_update`` stays put when the waypoint is within
+    one step but outside the arrival radius.
+    """
+    target = path[0]
+    dx = target[0] - position[0]
+    dy = target[1] - position[1]
+    distance = (dx * dx + dy * dy) ** 0.5
+    if distance < 0.1:
+        path.pop(0)
+        return target
+    step = speed * dt
+    if distance > step:
+        return position[0] + dx * step / distance, position[1] + dy * step / distance
+    return target
+
+
+@pytest.mark.parametrize("land", [False, True])
+def test_fleet_step_matches_scalar_updates(land):
+    import random
+    from advanced_pathfinding.core.agents import Agent, FleetStore
+
+    rng = random.Random(3)
+    fleet = FleetStore(capacity=4, waypoint_capacity=8, land_within_step=land)
+    scalar_update = _landing_update if land else _original_update
+    agents, expected = [], []
+    for i in range(30):
+        start = (rng.randrange(40), rng.randrange(40))
+        path = [start]
+        for _ in range(rng.randrange(1, 12)):
+            path.append((path[-1][0] + rng.choice([-1, 0, 1]), path[-1][1] + rng.choice([-1, 0, 1])))
+        agent = Agent(f"a{i}", start, path[-1], rng.choice([0.5, 1.0, 2.0]), start, path, {})
+        agents.append(fleet.add(agent))
+        expected.append([start, list(path)])
+
+    for tick in range(60):
+        if tick == 20:
+            agents[0].extend_path([(5, 5)])
+            expected[0][1].append((5, 5))
+        fleet.step(0.1)
+        for agent, state in zip(agents, expected):
+            if state[1]:
+                state[0] = scalar_update(state[0], state[1], agent.speed, 0.1)
+            assert agent.position == tuple(float(v) for v in state[0])
+            assert agent.path == state[1]
+            assert agent.status == ("active" if state[1] else "finished")
+
+
+def test_fleet_step_lands_on_waypoints_within_one_step_only_when_asked():
+    from advanced_pathfinding.core.agents import Agent, FleetStore
+
+    # 0.15 from the waypoint: outside the 0.1 arrival radius, inside one 0.2 step
+    position, path = (0.85, 0.0), [(1, 0), (2, 0)]
+    assert _original_update(position, list(path), 2.0, 0.1) == position
+    original = FleetStore(capacity=2, waypoint_capacity=4)
+    stalled = original.add(Agent("a", (0, 0), (2, 0), 2.0, position, list(path), {}))
+    for _ in range(3):
+        original.step(0.1)
+    assert stalled.position == position and stalled.path == path
+
+    fleet = FleetStore(capacity=2, waypoint_capacity=4, land_within_step=True)
+    agent = fleet.add(Agent("a", (0, 0), (2, 0), 2.0, position, list(path), {}))
+    fleet.step(0.1)
+    assert agent.position == (1.0, 0.0) and agent.path == [(1, 0), (2, 0)]
+    fleet.step(0.1)
+    assert agent.position == (1.0, 0.0) and agent.path == [(2, 0)]
+    fleet.step(0.1)
+    assert agent.position == pytest.approx((1.2, 0.0))
+
+
+def test_agent_path_edits_write_through_and_agents_compare_by_value():
+    import copy
+    import pickle
+    from advanced_pathfinding.core.agents import Agent, FleetStore
+
+    def make():
+        return Agent("a", (0, 0), (2, 2), 1.0, (0.0, 0.0), [(0, 0), (1, 1), (2, 2)], {"max_cost": 5})
+
+    agent = make()
+    path = agent.path
+    assert isinstance(path, list) and path == [(0, 0), (1, 1), (2, 2)] and path[1:] == [(1, 1), (2, 2)]
+    agent.extend_path([(3, 3)])
+    assert agent.path == path + [(3, 3)]
+    assert np.asarray(agent.path).shape == (4, 2)
+
+    # Edits to a current snapshot reach the agent, like edits to the old list did
+    assert agent.path.pop(0) == (0, 0) and agent.next_waypoint == (1, 1)
+    agent.path.append((4, 4))
+    agent.path[0] = (9, 9)
+    assert agent.path == [(9, 9), (2, 2), (3, 3), (4, 4)]
+    # A stale snapshot is detached, as a replaced list would be
+    stale = agent.path
+    agent.path = [(5, 5)]
+    stale.pop(0)
+    assert agent.path == [(5, 5)]
+    assert type(pickle.loads(pickle.dumps(stale))) is list and type(copy.copy(stale)) is list
+
+    other = make()
+    assert other == make() and other != agent
+    assert other.to_dict()["path"] == [(0, 0), (1, 1), (2, 2)]
+
+    # Moving an agent between fleets frees its old slot, as ObstacleStore does
+    first, second = FleetStore(capacity=1), FleetStore(capacity=1)
+    first.add(other)
+    second.add(other)
+    assert len(first) == 0 and first._free == [0] and other.path == [(0, 0), (1, 1), (2, 2)]
+    second.remove(other)
+    assert len(second) == 0 and other.path == [(0, 0), (1, 1), (2, 2)]
+
+
+def test_weather_fronts_reach_the_cost_field():
+    from advanced_pathfinding.core.weather import WeatherSystem, WeatherType
+    from advanced_pathfinding.core.weather import WeatherCondition as Conditions
+    from advanced_pathfinding.planning.cost_field import CostField
+
+    grid = initialize_grid((30, 30), seed=2)
+    field = CostField(grid)
+    clear = field.costs[10, 10]
+    weather = WeatherSystem(grid.grid_size, seed=1, dissipation=0.5)
+    weather.create_weather_front((10, 10), Conditions.create_preset(WeatherType.STORM), 4)
+
+    assert weather.local.sum() == 49 and weather.rain[10, 10] > weather.rain[13, 10] > 0
+    assert weather.get_weather_at((10, 10)).wind_speed == 15.0
+    assert weather.get_weather_at((20, 20)) is None
+    assert weather.push_to_grid(grid) == 49 and weather.push_to_grid(grid) == 0
+    assert field.refresh() == 1 and field.costs[10, 10] == grid.traversal_cost(10, 10)
+    assert field.costs[10, 10] > clear + 1
+
+    # Local weather dissipates cell by cell until the front is gone
+    for _ in range(30):
+        weather.update(0.1)
+        weather.push_to_grid(grid)
+    assert not weather.active and not grid.has_weather.any()
+    field.refresh()
+    assert np.array_equal(field.costs, grid.traversal_costs()) and field.costs[10, 10] == clear
+
+
+def test_generated_maps_are_seeded_and_cached(tmp_path):
+    from advanced_pathfinding.core.grid import TERRAIN_CODES, map_cache_path
+
+    state = np.random.get_state()
+    grid = initialize_grid((60, 60), seed=9)
+    assert np.array_equal(np.random.get_state()[1], state[1])  # Global RNGs are left alone
+    assert np.array_equal(grid.terrain, initialize_grid((60, 60), seed=9).terrain)
+
+    highway = TERRAIN_CODES[TerrainType.HIGHWAY]
+    assert (grid.terrain[::10, :] == highway).all() and (grid.terrain[:, ::10] == highway).all()
+    park = grid.terrain[16:20, 16:20]
+    assert (park == TERRAIN_CODES[TerrainType.PARK]).mean() > 0.4
+    assert not (grid.terrain[50:, :40] == TERRAIN_CODES[TerrainType.RESTRICTED]).any()
+
+    cached = initialize_grid((60, 60), seed=9, cache_dir=str(tmp_path))
+    assert np.array_equal(cached.terrain, grid.terrain) and np.array_equal(cached.elevation, grid.elevation)
+    # Later calls read the file instead of generating
+    path = map_cache_path(str(tmp_path), (60, 60), 9)
+    np.savez(path, terrain=np.zeros((60, 60), dtype=np.int8), elevation=cached.elevation)
+    assert not initialize_grid((60, 60), seed=9, cache_dir=str(tmp_path)).terrain.any()
+    # Files that do not fit the grid are regenerated, not used
+    for broken in ({"terrain": np.zeros((50, 60), dtype=np.int8), "elevation": cached.elevation},
+                   {"terrain": np.zeros((60, 60), dtype=np.float64), "elevation": cached.elevation},
+                   {"terrain": cached.terrain, "elevation": cached.elevation.astype(np.float32)},
+                   {"terrain": cached.terrain}):
+        np.savez(path, **broken)
+        assert np.array_equal(initialize_grid((60, 60), seed=9, cache_dir=str(tmp_path)).terrain, grid.terrain)
+        with np.load(path) as rewritten:
+            assert np.array_equal(rewritten["elevation"], grid.elevation)
+    with open(path, "wb") as f:
+        f.write(b"not a zip")
+    assert np.array_equal(initialize_grid((60, 60), seed=9, cache_dir=str(tmp_path)).terrain, grid.terrain)
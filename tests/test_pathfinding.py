@@ -59,6 +59,8 @@ async def test_obstacle_avoidance():
     # Add obstacle in path
     obstacle = DynamicObstacle("obs1", (5, 5), (0, 0), 1.0)
     planner.add_dynamic_obstacle(obstacle)
+    probe = Agent("probe", (5, 4), (9, 9), 1.0, (5, 4), [(5, 4)], {})
+    assert planner._check_path_blocked(probe) and not planner._check_path_blocked(agent)
 
     # Update and verify path changes
     await planner.update(0.1)
@@ -140,5 +142,568 @@ async def test_multiple_agents():
     assert len(frames) == 10  # Should have 10 frames for 1.0 duration with 0.1 dt
 
 
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+async def test_executor_matches_inline_search(executor):
+    inline = AdvancedPathPlanner((30, 30), seed=42)
+    pooled = AdvancedPathPlanner((30, 30), seed=42, executor=executor, max_workers=2)
+    try:
+        queries = [((0, i), (29, 29 - i)) for i in range(4)]
+        expected = [await inline.find_path(s, g, {'max_cost': 20}) for s, g in queries]
+        results = await asyncio.gather(*[pooled.find_path(s, g, {'max_cost': 20}) for s, g in queries])
+        assert list(results) == expected
+    finally:
+        pooled.close()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+async def test_executor_integrates_flow_fields_on_a_worker(executor):
+    from advanced_pathfinding.planning.flow_field import FlowField
+
+    inline = AdvancedPathPlanner((30, 30), seed=42)
+    pooled = AdvancedPathPlanner((30, 30), seed=42, executor=executor, max_workers=2)
+    try:
+        for planner in (inline, pooled):
+            for i in range(3):
+                planner.add_agent(Agent(f"a{i}", (0, i), (28, 28), 1.0, (0, i), [], {'max_cost': 20}))
+        submitted = []
+        submit = pooled._dispatcher.submit
+        pooled._dispatcher.submit = lambda fn, *args: submitted.append(fn) or submit(fn, *args)
+
+        queries = [((0, i), (28, 27 + i % 2)) for i in range(3)]
+        expected = [await inline.find_path(s, g, {'max_cost': 20}) for s, g in queries]
+        results = await asyncio.gather(*[pooled.find_path(s, g, {'max_cost': 20}) for s, g in queries])
+        assert list(results) == expected
+        # One integration, shared by all three concurrent queries
+        assert submitted == [FlowField] and not pooled._pending_fields
+        assert len(pooled.flow_fields._fields) == 1
+    finally:
+        pooled.close()
+
+
+async def test_background_replan_applied_at_next_tick():
+    planner = AdvancedPathPlanner((20, 20), seed=42, executor="thread")
+    try:
+        agent = Agent(
+            id="bg_agent", start=(0, 0), goal=(19, 19), speed=1.0,
+            position=(0, 0), path=[(5, 5), (6, 6)], constraints={'max_cost': 20}
+        )
+        planner.add_agent(agent)
+        planner.add_dynamic_obstacle(DynamicObstacle("obs1", (5, 5), (0, 0), 1.0))
+
+        await planner.update(0.1)
+        task, goal = planner._pending_replans["bg_agent"]
+        assert goal == (19, 19)
+        assert agent.path == [(5, 5), (6, 6)]  # Not applied mid-tick
+
+        # The next boundary waits for the search instead of skipping it while it runs
+        await planner.update(0.1)
+        assert task.done() and "bg_agent" not in planner._pending_replans
+        assert agent.path[-1] == (19, 19)
+    finally:
+        planner.close()
+
+
+async def test_goal_change_cancels_background_replan():
+    planner = AdvancedPathPlanner((20, 20), seed=42, executor="thread")
+    try:
+        agent = Agent(
+            id="bg_agent", start=(0, 0), goal=(19, 19), speed=1.0,
+            position=(0, 0), path=[(5, 5), (6, 6)], constraints={'max_cost': 20}
+        )
+        planner.add_agent(agent)
+        planner.add_dynamic_obstacle(DynamicObstacle("obs1", (5, 5), (0, 0), 1.0))
+
+        await planner.update(0.1)
+        stale_task, _ = planner._pending_replans["bg_agent"]
+        agent.goal = (0, 19)
+
+        await planner.update(0.1)
+        await asyncio.gather(stale_task, return_exceptions=True)
+        assert stale_task.cancelled()
+        assert agent.path[-1] != (19, 19)
+        assert planner._pending_replans["bg_agent"][1] == (0, 19)
+    finally:
+        planner.close()
+
+
+async def test_incremental_replan_avoids_obstacle_cells():
+    planner = AdvancedPathPlanner((20, 20), seed=42, replan_mode="incremental")
+    agent = Agent(
+        id="inc_agent", start=(0, 0), goal=(19, 19), speed=1.0,
+        position=(0, 0), path=[(5, 5), (6, 6)], constraints={'max_cost': 20}
+    )
+    planner.add_agent(agent)
+    obstacle = DynamicObstacle("obs1", (5, 5), (0, 0), 1.0)
+    planner.add_dynamic_obstacle(obstacle)
+
+    await planner.update(0.1)
+    assert agent.path[-1] == (19, 19)
+    assert not any(obstacle.affects_position(p) for p in agent.path)
+    assert "inc_agent" in planner._incremental
+
+
+async def test_incremental_replans_reject_executors():
+    with pytest.raises(ValueError):
+        AdvancedPathPlanner((10, 10), seed=42, replan_mode="incremental", executor="thread")
+
+
+def _snapshot(planner):
+    return {
+        'time': planner.simulation_time,
+        'obstacles': [(o.id, o.position, o.radius) for o in planner.dynamic_obstacles],
+        'agents': {a.id: (a.position, a.status, a.goal, a.path) for a in planner.agents.values()},
+        'congestion': dict(planner.traffic_manager.congestion)
+    }
+
+
+def _decoded(frame):
+    return {
+        'time': frame['time'],
+        'obstacles': [(o.id, o.position, o.radius) for o in frame['obstacles']],
+        'agents': {a.id: (a.position, a.status, a.goal, a.path) for a in frame['agents'].values()},
+        'congestion': frame['congestion']
+    }
+
+
+async def test_recorded_frames_replay_each_tick():
+    from advanced_pathfinding.planning.recorder import FrameRecorder
+
+    planner = AdvancedPathPlanner((20, 20), seed=42)
+    for i, (start, goal) in enumerate([((0, 0), (19, 19)), ((19, 0), (0, 19)), ((5, 5), (15, 3))]):
+        agent = Agent(id=f"a{i}", start=start, goal=goal, speed=2.0, position=start,
+                      path=[], constraints={'max_cost': 20})
+        planner.add_agent(agent)
+        agent.path = await planner.find_path(start, goal, agent.constraints)
+    planner.add_dynamic_obstacle(DynamicObstacle("obs", (10.5, 10.5), (1.0, 0.5), 1.5, lifetime=4.0))
+
+    recorder = FrameRecorder(planner.grid_size, keyframe_interval=8)
+    ring = FrameRecorder(planner.grid_size, keyframe_interval=8, max_frames=20)
+    expected = []
+    for tick in range(60):
+        if tick == 25:
+            planner.agents["a2"].goal = (2, 18)
+            planner.agents["a2"].path = await planner.find_path((15, 3), (2, 18), {'max_cost': 20})
+        if tick == 29:
+            # Added between captures, in the middle of a keyframe segment
+            planner.add_dynamic_obstacle(DynamicObstacle("late", (3.5, 3.5), (0.0, 0.0), 1.0))
+        await planner.update(0.1)
+        recorder.capture(planner)
+        ring.capture(planner)
+        expected.append(_snapshot(planner))
+
+    # Positions are stored as float32
+    for i in (0, 7, 8, 26, 29, 30, 40, 59):
+        frame = _decoded(recorder[i])
+        want = expected[i]
+        assert frame['time'] == want['time'] and frame['congestion'] == want['congestion']
+        assert [o[0] for o in frame['obstacles']] == [o[0] for o in want['obstacles']]
+        for agent_id, (position, status, goal, path) in want['agents'].items():
+            got = frame['agents'][agent_id]
+            assert got[0] == pytest.approx(position, abs=1e-4)
+            assert got[1:] == (status, goal, path)
+
+    assert 20 <= len(ring) < 28 and ring.dropped == 60 - len(ring)
+    assert _decoded(ring[-1]) == _decoded(recorder[-1])
+
+
+async def test_simulate_stream_decimates_and_applies_backpressure():
+    planner = AdvancedPathPlanner((10, 10), seed=42)
+    agent = Agent(id="a", start=(0, 0), goal=(9, 9), speed=1.0, position=(0, 0),
+                  path=[], constraints={'max_cost': 20})
+    planner.add_agent(agent)
+    agent.path = await planner.find_path(agent.start, agent.goal, agent.constraints)
+
+    times = [frame['time'] async for frame in planner.simulate_stream(2.0, dt=0.1, every=5)]
+    assert times == pytest.approx([0.5, 1.0, 1.5, 2.0])
+
+    start = planner.simulation_time
+    stream = planner.simulate_stream(10.0, dt=0.1, buffer=3)
+    first = await stream.__anext__()
+    await asyncio.sleep(0.05)  # Let the producer run ahead until the buffer is full
+    assert planner.simulation_time - start == pytest.approx(0.5)  # One taken, three queued, one waiting
+    assert first['agents']['a'].position != agent.position
+    await stream.aclose()
+    stopped = planner.simulation_time
+    await asyncio.sleep(0.05)
+    assert planner.simulation_time == stopped
+
+
+async def test_trajectory_file_appends_and_slices(tmp_path, monkeypatch):
+    import numpy as np
+    from advanced_pathfinding.planning import trajectory as trajectory_module
+    from advanced_pathfinding.planning.trajectory import Trajectory, TrajectoryWriter
+
+    monkeypatch.setattr(trajectory_module, "GROW_CHUNK_ROWS", 7)  # Widen 20 old steps in 3 chunks
+
+    planner = AdvancedPathPlanner((20, 20), seed=42)
+    for i, (start, goal) in enumerate([((0, 0), (19, 19)), ((19, 0), (0, 19))]):
+        agent = Agent(id=f"a{i}", start=start, goal=goal, speed=2.0, position=start,
+                      path=[], constraints={'max_cost': 20})
+        planner.add_agent(agent)
+        agent.path = await planner.find_path(start, goal, agent.constraints)
+    planner.add_dynamic_obstacle(DynamicObstacle("obs", (10.5, 10.5), (1.0, 0.5), 1.5, lifetime=1.5))
+
+    path = str(tmp_path / "run.traj")
+    first = await planner.simulate(duration=2.0, dt=0.1, trajectory_path=path)
+    # An agent and an obstacle join between runs, so the reopened file must widen
+    late = Agent(id="a2", start=(0, 19), goal=(19, 0), speed=2.0, position=(0, 19), path=[],
+                 constraints={'max_cost': 20})
+    planner.add_agent(late)
+    late.path = await planner.find_path(late.start, late.goal, late.constraints)
+    planner.add_dynamic_obstacle(DynamicObstacle("late", (5.5, 14.5), (0.0, 0.0), 1.0))
+    second = await planner.simulate(duration=1.0, dt=0.1, trajectory_path=path)
+    trajectory = Trajectory(path)
+    assert len(trajectory) == 30 and isinstance(trajectory.agent_position, np.memmap)
+    assert trajectory.header["max_agents"] == 4 and trajectory.header["max_obstacles"] == 2
+    assert "a2" not in trajectory[19]['agents'] and "a2" in trajectory[20]['agents']
+
+    frames = list(first) + list(second)
+    for i in (0, 9, 10, 14, 15, 20, 29):
+        frame, want = trajectory[i], frames[i]
+        assert frame['time'] == want['time']
+        assert [o.id for o in frame['obstacles']] == [o.id for o in want['obstacles']]
+        for agent_id, agent in want['agents'].items():
+            got = frame['agents'][agent_id]
+            assert got.position == pytest.approx(agent.position, abs=1e-4)
+            assert (got.status, got.goal) == (agent.status, agent.goal)
+    assert trajectory[20]['congestion'] == frames[20]['congestion']
+    # Congestion snapshots keep only changed cells, and rebuild in any order
+    assert len(trajectory.congestion_end) == 3
+    assert len(trajectory.congestion_cell) < sum(len(frames[i]['congestion']) for i in (0, 10, 20))
+    for i in (20, 0, 10, 29, 5):
+        assert trajectory[i]['congestion'] == pytest.approx(frames[i - i % 10]['congestion'])
+
+    window = trajectory.between(0.95, 2.05)  # Ticks 10 to 20
+    assert len(window) == 11 and window.time[0] == pytest.approx(1.0)
+    assert np.shares_memory(window.agent_position, trajectory.agent_position)
+    assert window[-1]['congestion'] == trajectory[19]['congestion']
+
+    stats = planner.analyzer.analyze_trajectory(path)
+    assert [s["id"] for s in stats] == ["a0", "a1", "a2"]
+    assert all(s["distance_traveled"] > 0 for s in stats)
+
+    # Swapping one agent for another keeps the count but must remap columns
+    swapped = str(tmp_path / "swap.traj")
+    with TrajectoryWriter(swapped, planner.grid_size, max_agents=4) as writer:
+        writer.append(planner)
+        planner.fleet.remove(planner.agents.pop("a1"))
+        planner.add_agent(Agent(id="b", start=(5, 5), goal=(5, 5), speed=0.0, position=(5, 5),
+                                path=[], constraints={}))
+        writer.append(planner)
+    steps = Trajectory(swapped)
+    assert "a1" in steps[0]['agents'] and "b" not in steps[0]['agents']
+    assert "a1" not in steps[1]['agents'] and steps[1]['agents']["b"].position == (5.0, 5.0)
+
+    # Columns that were never used have empty files, which must not hide the steps
+    bare, bare_path = AdvancedPathPlanner((5, 5), seed=1), str(tmp_path / "bare.traj")
+    with TrajectoryWriter(bare_path, bare.grid_size, max_agents=0) as writer:
+        writer.append(bare)
+        writer.append(bare)
+    assert len(Trajectory(bare_path)) == 2 and Trajectory(bare_path)[1]['obstacles'] == []
+
+
+async def test_persistent_renderer_updates_artists_in_place():
+    import numpy as np
+    from advanced_pathfinding.visualization.renderer import SimulationRenderer
+
+    planner = AdvancedPathPlanner((10, 10), seed=42)
+    agent = Agent(id="a", start=(0, 0), goal=(9, 9), speed=1.0, position=(0, 0),
+                  path=[], constraints={'max_cost': 20})
+    planner.add_agent(agent)
+    agent.path = await planner.find_path(agent.start, agent.goal, agent.constraints)
+    planner.add_dynamic_obstacle(DynamicObstacle("obs", (2.0, 7.0), (0, 0), 1.0))
+    frames = await planner.simulate(duration=1.0, dt=0.1)
+
+    renderer = SimulationRenderer(planner.grid_size)
+    first = renderer.render_frame(frames[0], planner.grid)
+    images = len(renderer.ax.images)
+    second = renderer.render_frame(frames[5], planner.grid)
+    assert all(a is b for a, b in zip(first, second)) and len(renderer.ax.images) == images
+
+    overlay, obstacles, paths, agents, goals, title = second
+    # Grid x runs down the image, so obstacle centres are drawn at (y, x)
+    assert obstacles.get_offsets().tolist() == [[7.0, 2.0]]
+    x, y = frames[5]['agents']['a'].position
+    assert agents.get_offsets().tolist() == [[y, x]]
+    assert title.get_text() == f"Time: {frames[5]['time']:.1f}s"
+
+
+async def test_headless_export_streams_gif_and_raw_video(tmp_path):
+    import json
+    import numpy as np
+    from PIL import Image
+    from advanced_pathfinding.visualization.export import FrameRasterizer
+
+    planner = AdvancedPathPlanner((10, 10), seed=42)
+    agent = Agent(id="a", start=(0, 0), goal=(9, 9), speed=1.0, position=(0, 0),
+                  path=[], constraints={'max_cost': 20})
+    planner.add_agent(agent)
+    agent.path = await planner.find_path(agent.start, agent.goal, agent.constraints)
+    planner.add_dynamic_obstacle(DynamicObstacle("obs", (2.0, 7.0), (0.5, 0), 1.0))
+    frames = await planner.simulate(duration=1.0, dt=0.1)
+    assert planner.renderer._fig is None  # Simulating never opens a figure
+
+    rasterizer = FrameRasterizer(planner.grid.terrain, scale=4)
+    image = rasterizer.draw(frames[3])
+    x, y = frames[3]['agents']['a'].position
+    assert image.shape == (40, 40, 3)
+    assert image[int((x + 0.5) * 4), int((y + 0.5) * 4)].tolist() == [0, 0, 255]
+
+    gif = str(tmp_path / "run.gif")
+    assert planner.export_animation(frames, gif, scale=4, workers=0, chunk_size=3) == 10
+    with Image.open(gif) as decoded:
+        assert decoded.n_frames == 10 and decoded.size == (40, 40)
+        decoded.seek(3)
+        assert np.array_equal(np.asarray(decoded.convert("RGB")), image)
+
+    raw = str(tmp_path / "run.rgb")
+    assert planner.export_animation(frames, raw, scale=4, workers=1, chunk_size=4) == 10
+    video = np.fromfile(raw, dtype=np.uint8).reshape(10, 40, 40, 3)
+    assert np.array_equal(video[3], image)
+    with open(raw + ".json") as f:
+        assert json.load(f)["frames"] == 10
+
+
+async def test_congestion_decays_windows_and_feeds_costs():
+    import math
+    import numpy as np
+    from advanced_pathfinding.planning.recorder import FrameRecorder
+    from advanced_pathfinding.planning.traffic import TrafficManager
+
+    window = TrafficManager((4, 4), window=2)
+    for cells in ([(1, 1), (1, 1)], [(2, 3)], [(2, 3)]):
+        window.accumulate(np.array(cells))
+    assert dict(window.congestion.items()) == {(2, 3): 2} and window.congestion[(0, 0)] == 0
+    assert sorted(window.changes_since(2).tolist()) == [1 * 4 + 1, 2 * 4 + 3]
+    # Single visits belong to the current tick and expire with it
+    window.update_congestion((0, 2))
+    assert window.congestion[(0, 2)] == 1 and window.changes_since(3).tolist() == [2]
+    window.accumulate(np.zeros((0, 2)))
+    window.accumulate(np.zeros((0, 2)))
+    assert window.congestion[(0, 2)] == 0 and not window.congestion
+
+    # Feedback is on by default
+    default = AdvancedPathPlanner((10, 10), seed=42)
+    parked = Agent(id="p", start=(3, 3), goal=(3, 9), speed=0.0, position=(3, 3),
+                   path=[(3, 9)], constraints={'max_cost': 20})
+    default.add_agent(parked)
+    await default.update(0.1)
+    assert default.grid.congestion[3, 3] == 1
+
+    planner = AdvancedPathPlanner((10, 10), seed=42, congestion_decay=0.5, congestion_feedback=0.5)
+    agent = Agent(id="a", start=(0, 0), goal=(0, 9), speed=0.0, position=(0, 0),
+                  path=[(0, 9)], constraints={'max_cost': 20})
+    planner.add_agent(agent)
+    recorder = FrameRecorder(planner.grid_size, keyframe_interval=4)
+    base = planner.cost_field.snapshot().costs[0, 0]
+    for _ in range(10):
+        await planner.update(0.1)
+        recorder.capture(planner)
+    # A parked agent's cell converges towards 1 / (1 - e^(-decay * dt))
+    level = sum(math.exp(-0.05 * k) for k in range(10))
+    assert planner.traffic_manager.congestion[(0, 0)] == pytest.approx(level)
+    assert recorder[-1]['congestion'] == pytest.approx({(0, 0): level})
+    assert planner.grid.congestion[0, 0] == pytest.approx(level, abs=0.5)
+    assert planner.cost_field.snapshot().costs[0, 0] > base
+
+
+async def test_congestion_pushes_only_logged_cells():
+    import numpy as np
+    from advanced_pathfinding.core.grid import Grid
+    from advanced_pathfinding.planning.traffic import TrafficManager
+
+    traffic = TrafficManager((6, 6), decay=0.7, feedback_threshold=0.3)
+    assert traffic.congestion[(-1, 0)] == 0.0 and traffic.congestion[(6, 2)] == 0.0
+    assert (-1, 0) not in traffic.congestion
+    grid = Grid((6, 6))
+    reference = np.zeros_like(grid.congestion)
+    rng = np.random.default_rng(3)
+    for tick in range(30):
+        cells = rng.integers(0, 6, size=(3, 2)) if tick < 10 else np.zeros((0, 2))
+        traffic.accumulate(cells, dt=0.5)
+        traffic.push_to_grid(grid)
+        delta = np.abs(traffic.levels - reference)
+        reference[delta >= 0.3] = traffic.levels[delta >= 0.3]
+        assert np.array_equal(grid.congestion, reference)
+
+    # Without decay, a tick where nobody moved has nothing to compare
+    still, grid = TrafficManager((6, 6), feedback_threshold=1), Grid((6, 6))
+    still.accumulate(np.array([(1, 2)]))
+    assert still.push_to_grid(grid) == 1
+    still.accumulate(np.zeros((0, 2)))
+    assert still.push_to_grid(grid) == 0 and grid.congestion[1, 2] == 1
+
+
+async def test_reservation_table_claims_releases_and_expires():
+    from advanced_pathfinding.planning.reservations import ReservationTable
+    from advanced_pathfinding.planning.traffic import TrafficManager
+
+    table = ReservationTable((5, 5))
+    assert table.reserve_path("a", [(0, 0), (0, 1), (0, 2)], start_tick=3, hold=2)
+    assert table.owner(4, (0, 1)) == "a" and table.owner(6, (0, 2)) == "a"
+    assert not table.is_reserved(4, (0, 1), agent_id="a")
+    assert not table.reserve("b", 4, (0, 1))
+    # Swapping with a moving agent conflicts even when the target cell is free next tick
+    assert table.move_conflicts(4, (0, 0), (0, 1)) and table.move_conflicts(4, (0, 1), (0, 0))
+    assert not table.move_conflicts(4, (1, 1), (1, 2))
+    assert not table.is_free((0, 2), 5, 7) and table.is_free((0, 2), 8, 20)
+    assert list(table.reservations(4, 4)) == [(4, (0, 1), "a")]
+
+    table.reserve("b", 10, (4, 4))
+    # Claims count cells and the moves between them
+    assert table.release("a", from_tick=5) == 4 and table.owner(4, (0, 1)) == "a"
+    assert table.expire(5) == 3 and table.horizon == 5
+    assert len(table) == 1 and table.agent_reservations("a") == 0
+    assert table.release("b") == 1 and len(table) == 0
+
+    # A hold parks an agent on one cell with no end, until it is replaced or released
+    assert table.hold("a", (2, 2), 8) and not table.hold("b", (2, 2), 50)
+    assert table.owner(7, (2, 2)) is None and table.owner(10 ** 6, (2, 2)) == "a"
+    assert not table.is_free((2, 2), 0, 8, "b") and not table.reserve("b", 9, (2, 2))
+    assert list(table.reservations(8, 8)) == [(8, (2, 2), "a")]
+    assert table.hold("a", (3, 3), 8) and table.owner(9, (2, 2)) is None
+    table.release("a")
+    assert table.owner(9, (3, 3)) is None
+
+    traffic = TrafficManager((5, 5))
+    traffic.reserve_path("a", [(1, 1), (1, 2)], [0.1, 0.2])
+    assert traffic.check_collision((1, 2), 0.2) and not traffic.check_collision((1, 2), 0.1)
+
+
+async def test_cooperative_planning_keeps_agents_apart():
+    planner = AdvancedPathPlanner((5, 5), seed=42, cooperative_window=20)
+    planner.grid.terrain[:] = 0
+    planner.grid.mark_dirty(0, 0, 5, 5)
+    planner.cost_field.refresh()
+    assert planner.cost_field.costs.max() < 1.5  # Urban everywhere, not the generated map
+    # Two agents swap ends of the same row; the urgent one plans first
+    urgent = Agent(id="urgent", start=(2, 0), goal=(2, 4), speed=1.0, position=(2, 0),
+                   path=[], constraints={'priority': 5})
+    other = Agent(id="other", start=(2, 4), goal=(2, 0), speed=1.0, position=(2, 4),
+                  path=[], constraints={})
+    planner.add_agent(other)
+    planner.add_agent(urgent)
+    for _ in range(80):
+        await planner.update(0.1)
+        a, b = urgent.position, other.position
+        assert max(abs(a[0] - b[0]), abs(a[1] - b[1])) >= 0.5
+    assert urgent.status == other.status == "finished"
+    assert planner.cooperative.stats["fallbacks"] == 0
+    assert planner.cooperative.stats["searches"] >= 2
+
+
+async def test_conflict_based_dispatch_is_collision_free():
+    from advanced_pathfinding.planning.cbs import ConflictBasedSearch, schedule_cells
+
+    planner = AdvancedPathPlanner((6, 6), seed=42)
+    planner.grid.terrain[:] = 0
+    planner.cost_field.refresh()
+    # Two pairs swap ends of a row and a column, crossing in the middle
+    trips = [((0, 2), (5, 2)), ((5, 2), (0, 2)), ((2, 0), (2, 5)), ((2, 5), (2, 0))]
+    agents = [Agent(id=f"v{i}", start=start, goal=goal, speed=1.0, position=start, path=[],
+                    constraints={}) for i, (start, goal) in enumerate(trips)]
+
+    fallback = ConflictBasedSearch(planner.cost_field, max_expansions=0).solve(agents)
+    # A fallback that is out of time reports everyone it did not get to
+    out_of_time = ConflictBasedSearch(planner.cost_field, max_expansions=0, fallback_time_limit=0.0).solve(agents)
+    assert out_of_time.fallback and not out_of_time.paths
+    assert out_of_time.unsolved == sorted(agent.id for agent in agents)
+    result = await planner.dispatch_batch(agents, weight=1.5)
+    assert not result.fallback and not result.unsolved
+    assert result.lower_bound <= result.cost <= 1.5 * result.lower_bound + 1e-9
+    assert fallback.fallback and fallback.bound == float('inf')
+    for solution in (result, fallback):
+        occupied = set()
+        for schedule in solution.schedules.values():
+            for tick, cell in schedule_cells(schedule):
+                assert (tick, cell) not in occupied
+                occupied.add((tick, cell))
+
+    for _ in range(150):
+        await planner.update(0.1)
+        cells = [(round(a.position[0]), round(a.position[1])) for a in agents]
+        assert len(set(cells)) == len(agents)
+    assert all(agent.status == "finished" for agent in agents)
+
+
+async def test_instrumented_planner_attributes_queries_and_ticks(tmp_path):
+    import json
+    from advanced_pathfinding.planning.stats import TICK_PHASES
+
+    # Congestion feedback would change costs, and so route cache keys, on every tick
+    planner = AdvancedPathPlanner((30, 30), seed=42, headless=True, congestion_feedback=None)
+    await planner.find_path((0, 0), (20, 5), {})
+    assert planner.stats.queries == 0  # Off by default
+
+    ticks = []
+    planner.stats.enable(on_tick=ticks.append)
+    agent = Agent(id="a", start=(0, 0), goal=(25, 25), speed=1.0, position=(0, 0), path=[], constraints={})
+    planner.add_agent(agent)
+    await planner.route_agent(agent)
+    planner.add_dynamic_obstacle(DynamicObstacle("block", agent.path[2], (0, 0), 1.5))
+    for _ in range(5):
+        await planner.update(0.1)
+
+    stats = planner.stats
+    assert len(ticks) == stats.ticks == 5
+    assert set(ticks[0].phases) == set(TICK_PHASES)
+    assert sum(ticks[0].phases.values()) == pytest.approx(ticks[0].elapsed)
+    # The blocked agent asks for a route every tick and gets the cached one
+    assert all(t.blocked == t.replans == t.queries == 1 for t in ticks)
+    assert stats.sources == {"search": 1, "cache": 5}
+    search = stats.slowest_queries()[0]
+    assert search.source == "search" and search.agent_id == "a" and search.length > 0
+    assert search.expanded > 0 and search.pops >= search.expanded and search.pushes >= search.pops
+    assert list(stats.regions()) == [(1, 1)] and stats.agents()["a"]["queries"] == 6
+
+    stats.save(tmp_path / "stats.json")
+    exported = json.loads((tmp_path / "stats.json").read_text())
+    assert exported["histograms"]["query_ms"]["count"] == stats.queries
+    assert sum(b["count"] for b in exported["histograms"]["tick_ms"]["buckets"]) == 5
+    assert exported["slowest_queries"][0]["agent_id"] == "a"
+
+
+IMPORT_BUDGET = 0.5  # Seconds for a cold import of the package, numpy included
+HEADLESS_SCRIPT = """
+import time
+started = time.perf_counter()
+from advanced_pathfinding import AdvancedPathPlanner, Agent
+elapsed = time.perf_counter() - started
+import asyncio, json, sys
+# numba is only loaded once a search kernel first runs
+lazy = "numba" not in sys.modules
+
+planner = AdvancedPathPlanner((20, 20), seed=1, headless=True)
+planner.add_agent(Agent(id="a", start=(0, 0), goal=(9, 9), speed=1.0, position=(0, 0), path=[],
+                        constraints={}))
+frames = asyncio.run(planner.simulate(duration=1.0))
+try:
+    planner.renderer
+    renderer = True
+except RuntimeError:
+    renderer = False
+heavy = sorted({name.split(".")[0] for name in sys.modules} & {"matplotlib", "rich", "PIL"})
+print(json.dumps({"elapsed": elapsed, "lazy": lazy, "frames": len(frames), "renderer": renderer,
+                  "heavy": heavy}))
+"""
+
+
+async def test_headless_import_stays_within_budget():
+    import json
+    import os
+    import subprocess
+    import sys
+
+    src = os.path.join(os.path.dirname(__file__), os.pardir, "src")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run([sys.executable, "-c", HEADLESS_SCRIPT], env=env, capture_output=True,
+                            text=True, check=True).stdout
+    result = json.loads(output)
+    assert result["heavy"] == [] and not result["renderer"] and result["frames"] == 10
+    assert result["lazy"]
+    assert result["elapsed"] < IMPORT_BUDGET
+
+
 if __name__ == '__main__':
-    pytest.main(['-v', __file__])
\ No newline at end of file
+    pytest.main(['-v', __file__])
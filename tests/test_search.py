@@ -0,0 +1,298 @@
+import random
+
+import pytest
+
+from advanced_pathfinding.core.grid import WeatherCondition, initialize_grid
+from advanced_pathfinding.planning.cost_field import CostField
+from advanced_pathfinding.planning.search import (
+    FlatAStar, ReferenceAStar, create_search_backend
+)
+
+
+def _queries(grid_size, count, seed=0):
+    rng = random.Random(seed)
+    return [
+        ((rng.randrange(grid_size[0]), rng.randrange(grid_size[1])),
+         (rng.randrange(grid_size[0]), rng.randrange(grid_size[1])),
+         rng.choice([2.0, 3.0, 20.0, float('inf')]))
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("use_jit", [True, False])
+def test_flat_astar_matches_reference(use_jit):
+    grid_size = (40, 30)
+    grid = initialize_grid(grid_size, seed=11)
+    grid[12][12].weather = WeatherCondition(0.9, 0.2, 15.0, 18.0)
+    cost_field = CostField(grid)
+    cost_field.refresh()
+
+    reference = ReferenceAStar(grid_size)
+    flat = FlatAStar(grid_size, use_jit=use_jit)
+    for start, goal, max_cost in _queries(grid_size, 60):
+        expected = reference.search(cost_field, start, goal, max_cost)
+        assert flat.search(cost_field, start, goal, max_cost) == expected
+
+
+def test_search_counters_agree_between_loops():
+    import numpy as np
+
+    grid_size = (30, 30)
+    cost_field = CostField(initialize_grid(grid_size, seed=5))
+    cost_field.refresh()
+    compiled, python = np.zeros(4, dtype=np.int64), np.zeros(4, dtype=np.int64)
+    for start, goal, max_cost in _queries(grid_size, 20, seed=3):
+        FlatAStar(grid_size).search(cost_field, start, goal, max_cost, counters=compiled)
+        FlatAStar(grid_size, use_jit=False).search(cost_field, start, goal, max_cost, counters=python)
+    assert compiled.tolist() == python.tolist()
+    expanded, pushes, pops, stale = python.tolist()
+    # Every pop is a stale entry, an expansion or a reached goal
+    assert expanded > 0 and expanded + stale <= pops <= expanded + stale + 20
+    assert pops <= pushes
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        create_search_backend("dijkstra", (10, 10))
+
+
+def test_process_searches_stop_on_their_shared_cancel_flag():
+    from advanced_pathfinding.planning.dispatch import SearchDispatcher, _init_worker, _process_search, _worker
+
+    grid_size = (120, 120)
+    cost_field = CostField(initialize_grid(grid_size, seed=3))
+    dispatcher = SearchDispatcher("process", grid_size)
+    try:
+        # Play the part of a pool worker in this process
+        name = dispatcher._publish(cost_field)
+        _init_worker(grid_size, "flat", dispatcher._cancel_block.name)
+        assert _process_search(name, (0, 0), (119, 119), 20.0, 5) is not None
+        dispatcher._cancel_block.buf[5] = 1
+        assert _process_search(name, (0, 0), (119, 119), 20.0, 5) is None
+        assert _process_search(name, (0, 0), (119, 119), 20.0, 6) is not None
+    finally:
+        _worker.pop("cancel", None)
+        _worker.clear()
+        dispatcher.close()
+
+
+@pytest.mark.asyncio
+async def test_process_searches_retry_when_their_snapshot_is_gone():
+    from advanced_pathfinding.planning.dispatch import SearchDispatcher
+
+    grid_size = (30, 30)
+    cost_field = CostField(initialize_grid(grid_size, seed=3))
+    dispatcher = SearchDispatcher("process", grid_size, max_workers=1)
+    publish = dispatcher._publish
+    names = []
+
+    def publish_evicted_first(field):
+        # The first snapshot is unlinked before the worker can attach to it
+        names.append("gone-snapshot" if not names else publish(field))
+        return names[-1]
+
+    dispatcher._publish = publish_evicted_first
+    try:
+        path = await dispatcher.search(cost_field, (0, 0), (29, 29), 20.0)
+        assert path and path[0] == (0, 0) and path[-1] == (29, 29)
+        assert len(names) == 2
+    finally:
+        dispatcher.close()
+
+
+def _path_cost(costs, path):
+    total = 0.0
+    for a, b in zip(path, path[1:]):
+        step = costs[b]
+        if a[0] != b[0] and a[1] != b[1]:
+            step *= 1.4142
+        total += step
+    return total
+
+
+def test_flow_field_paths_reach_region_no_worse_than_astar():
+    from advanced_pathfinding.planning.flow_field import FlowField
+
+    grid_size = (40, 40)
+    cost_field = CostField(initialize_grid(grid_size, seed=2))
+    goal = (33, 35)
+    field = FlowField(cost_field, (goal[0], goal[1], goal[0] + 1, goal[1] + 1), max_cost=20.0)
+    astar = FlatAStar(grid_size)
+
+    for start in [(0, 0), (5, 30), (39, 0), (20, 20)]:
+        path = field.path_from(start)
+        assert path[0] == start and path[-1] == goal
+        assert all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 for a, b in zip(path, path[1:]))
+        cost = _path_cost(cost_field.costs, path)
+        assert abs(cost - field.distance[start[0] * grid_size[1] + start[1]]) < 1e-9
+        assert cost <= _path_cost(cost_field.costs, astar.search(cost_field, start, goal, 20.0)) + 1e-9
+
+
+def test_flow_field_cache_follows_cost_version():
+    from advanced_pathfinding.planning.flow_field import FlowFieldCache
+
+    grid = initialize_grid((30, 30), seed=2)
+    cache = FlowFieldCache(CostField(grid), region_size=8)
+
+    field = cache.get((20, 21))
+    assert cache.get((17, 22)) is field  # Same 8x8 goal region
+    assert field.contains((16, 16)) and not field.contains((24, 24))
+
+    grid[3][3].congestion = 5
+    assert cache.get((20, 21)) is not field
+
+
+@pytest.mark.asyncio
+async def test_flow_fields_only_used_while_the_cache_has_room():
+    from advanced_pathfinding import AdvancedPathPlanner, Agent
+    from advanced_pathfinding.planning.flow_field import FlowFieldCache
+
+    grid = initialize_grid((30, 30), seed=2)
+    cache = FlowFieldCache(CostField(grid), region_size=8, max_fields=1)
+    assert cache.has_room((20, 21))
+    field = cache.get((20, 21))
+    assert cache.has_room((17, 22)) and not cache.has_room((2, 2))
+    assert cache.has_room((20, 21), reserved=1)  # Its own entry is replaced in place
+    grid[3][3].congestion = 5  # The cached field goes stale and no longer holds a place
+    assert cache.has_room((2, 2)) and len(cache._fields) == 0 and field.version != cache.cost_field.version
+
+    planner = AdvancedPathPlanner((30, 30), seed=2, flow_field_min_agents=2)
+    planner.flow_fields.max_fields = 1
+    goals = [(2, 2), (2, 3), (26, 26), (27, 26)]
+    for i, goal in enumerate(goals):
+        planner.add_agent(Agent(f"a{i}", (15, 15), goal, 1.0, (15, 15), [], {'max_cost': 20}))
+    planner.stats.enable()
+    for goal in goals:
+        assert await planner.find_path((15, 15), goal, {'max_cost': 20})
+    # The second region finds the cache full and falls back to plain A*
+    assert planner.stats.sources == {"flow_field": 2, "search": 2}
+    assert len(planner.flow_fields._fields) == 1
+
+
+def test_route_cache_evicts_by_size_and_age():
+    from advanced_pathfinding.planning.route_cache import RouteCache
+
+    now = [0.0]
+    cache = RouteCache(max_entries=2, max_age=5.0, clock=lambda: now[0])
+    cache.put("a", [(0, 0), (0, 1)])
+    cache.put("b", [(1, 1)])
+    assert cache.get("a") == [(0, 0), (0, 1)]
+    cache.put("c", [(2, 2)])  # "b" is least recently used
+    assert cache.get("b") is None
+
+    now[0] = 10.0
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_planner_route_cache_hits_are_private_copies():
+    from advanced_pathfinding import AdvancedPathPlanner
+
+    planner = AdvancedPathPlanner((20, 20), seed=42)
+    first = await planner.find_path((0, 0), (19, 19), {'max_cost': 20})
+    first.pop(0)
+
+    second = await planner.find_path((0, 0), (19, 19), {'max_cost': 20})
+    assert second[0] == (0, 0)
+    assert planner.route_cache.hits == 1
+
+    planner.grid[10][10].congestion = 50  # New cost-field version
+    await planner.find_path((0, 0), (19, 19), {'max_cost': 20})
+    assert planner.route_cache.misses == 2
+
+
+def test_dstar_lite_repairs_match_fresh_searches():
+    from advanced_pathfinding.planning.incremental import DStarLite
+
+    grid_size = (30, 30)
+    height = grid_size[1]
+    grid = initialize_grid(grid_size, seed=3)
+    cost_field = CostField(grid)
+    goal = (27, 25)
+    search = DStarLite(cost_field, goal, 20.0)
+    rng = random.Random(4)
+
+    path = search.plan((2, 3))
+    obstacles = [(10, 10), (15, 12), (20, 20)]
+    for tick in range(20):
+        obstacles = [(x + rng.choice([-1, 0, 1]), y + rng.choice([-1, 0, 1])) for x, y in obstacles]
+        blocked = {(x + dx) * height + y + dy for x, y in obstacles
+                   for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                   if 0 <= x + dx < grid_size[0] and 0 <= y + dy < grid_size[1]}
+        if tick % 4 == 0:
+            grid[rng.randrange(30)][rng.randrange(30)].congestion = rng.randrange(20)
+
+        position = path[1] if len(path) > 1 else path[0]
+        path = search.plan(position, blocked)
+        fresh = DStarLite(cost_field, goal, 20.0).plan(position, blocked)
+        assert abs(_path_cost(cost_field.costs, path) - _path_cost(cost_field.costs, fresh)) < 1e-9
+        assert path[-1] == goal
+        assert not any(x * height + y in blocked for x, y in path[1:])
+
+
+def test_hierarchical_routes_are_connected_and_near_optimal():
+    from advanced_pathfinding.planning.flow_field import FlowField
+    from advanced_pathfinding.planning.hierarchical import HierarchicalGraph
+
+    grid_size = (80, 80)
+    grid = initialize_grid(grid_size, seed=5)
+    cost_field = CostField(grid)
+    graph = HierarchicalGraph(cost_field, 20.0)
+    goal = (74, 71)
+    optimal = FlowField(cost_field, (goal[0], goal[1], goal[0] + 1, goal[1] + 1), 20.0)
+
+    for start in [(2, 3), (40, 5), (8, 66), (55, 30)]:
+        path = graph.find_route(start, goal).full_path()
+        assert path[0] == start and path[-1] == goal
+        assert all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 for a, b in zip(path, path[1:]))
+        best = optimal.distance[start[0] * grid_size[1] + start[1]]
+        assert _path_cost(cost_field.costs, path) <= 1.15 * best
+
+    built = graph.clusters_built
+    grid[44][44].congestion = 5
+    graph.find_route((2, 3), goal)
+    # Only the touched cluster and its four neighbours are rebuilt
+    assert graph.clusters_built - built <= 5
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor", ["inline", "thread"])
+async def test_planner_refines_long_routes_as_agents_advance(executor):
+    from advanced_pathfinding import AdvancedPathPlanner, Agent
+
+    planner = AdvancedPathPlanner((120, 120), seed=42, hierarchical_min_distance=50, executor=executor)
+    try:
+        submitted = []
+        if executor != "inline":
+            submit = planner._dispatcher.submit
+            planner._dispatcher.submit = lambda fn, *args: submitted.append(fn) or submit(fn, *args)
+        agent = Agent(id="far", start=(2, 2), goal=(115, 110), speed=1.0, position=(2, 2),
+                      path=[], constraints={'max_cost': 20})
+        planner.add_agent(agent)
+        await planner.route_agent(agent)
+        assert agent.path[0] == (2, 2) and agent.path[-1] != agent.goal
+        assert "far" in planner._routes
+
+        visited = []
+        while agent.status == "active":
+            # Step onto the next waypoint so every tick consumes exactly one cell
+            agent.position = agent.path[0]
+            visited.append(agent.path[0])
+            await planner.update(0.1)
+        assert visited[-1] == agent.goal
+        assert all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 for a, b in zip(visited, visited[1:]))
+        assert "far" not in planner._routes
+        # With an executor the abstract search and every refinement ran on a worker
+        assert (len(submitted) > 1) == (executor != "inline")
+    finally:
+        planner.close()
+
+
+def test_hierarchical_routing_is_opt_in():
+    from advanced_pathfinding import AdvancedPathPlanner
+
+    planner = AdvancedPathPlanner((120, 120), seed=42)
+    assert planner.hierarchical_min_distance is None
+    assert not planner._is_long_trip((0, 0), (119, 119))